@@ -5,10 +5,22 @@
 用于连接雷电模拟器并管理应用程序
 """
 
-import subprocess
+import asyncio
+import os
+import re
+import shlex
+import sys
 import json
 import time
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Iterable, Iterator, Optional
+
+# 共享模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from adb_async import AsyncADBClient, AsyncADBPool, AsyncDeviceController
+from adb_client import ADBError, default_adb_client
+
+# 直接通过套接字与ADB服务器通信，不为每次查询启动 adb 进程
+adb_client = default_adb_client
 
 
 def check_adb_available() -> bool:
@@ -18,11 +30,8 @@ def check_adb_available() -> bool:
     Returns:
         bool: adb是否可用
     """
-    try:
-        subprocess.run(['adb', 'version'], capture_output=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+    # ADB服务器未运行时通过 adb start-server 启动一次
+    return adb_client.start_server('adb')
 
 
 def get_connected_devices() -> List[str]:
@@ -33,15 +42,8 @@ def get_connected_devices() -> List[str]:
         List[str]: 设备ID列表
     """
     try:
-        result = subprocess.run(['adb', 'devices'], capture_output=True, text=True, check=True)
-        lines = result.stdout.strip().split('\n')[1:]  # 跳过标题行
-        devices = []
-        for line in lines:
-            if '\tdevice' in line:
-                device_id = line.split('\t')[0]
-                devices.append(device_id)
-        return devices
-    except subprocess.CalledProcessError:
+        return [serial for serial, state in adb_client.devices() if state == 'device']
+    except ADBError:
         return []
 
 
@@ -57,25 +59,309 @@ def connect_ldplayer(port: int = 5555) -> bool:
     """
     try:
         # 连接本地雷电模拟器
-        result = subprocess.run(
-            ['adb', 'connect', f'127.0.0.1:{port}'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
+        message = adb_client.connect(f'127.0.0.1:{port}')
         
-        if 'connected' in result.stdout or 'already connected' in result.stdout:
+        if 'connected' in message or 'already connected' in message:
             print(f"✓ 成功连接雷电模拟器 (端口: {port})")
+            _record_devices([f'127.0.0.1:{port}'])
             return True
         else:
-            print(f"✗ 连接失败: {result.stdout}")
+            print(f"✗ 连接失败: {message}")
             return False
             
-    except subprocess.CalledProcessError as e:
+    except ADBError as e:
         print(f"✗ 连接异常: {e}")
         return False
 
 
+# 雷电/逍遥模拟器多开时各实例的ADB端口：5555, 5557, 5559, ...
+DEFAULT_EMULATOR_PORTS = range(5555, 5555 + 2 * 16, 2)
+
+# 设备登记表：{'last_scan': 扫描时间, 'devices': {地址: {'first_seen': 时间, 'last_seen': 时间}}}
+DEVICE_REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'device_registry.json')
+# 距上次全量扫描超过该时间（秒）后重新扫描端口范围
+REGISTRY_MAX_AGE = 600
+# 超过该时间（秒）未出现的设备从登记表中移除
+REGISTRY_FORGET_AFTER = 7 * 24 * 3600
+
+
+def _load_registry() -> Dict[str, Any]:
+    try:
+        with open(DEVICE_REGISTRY_FILE, 'r', encoding='utf-8') as f:
+            registry = json.load(f)
+    except (OSError, ValueError):
+        registry = {}
+    registry.setdefault('last_scan', 0)
+    registry.setdefault('devices', {})
+    return registry
+
+
+def _save_registry(registry: Dict[str, Any]) -> None:
+    try:
+        with open(DEVICE_REGISTRY_FILE, 'w', encoding='utf-8') as f:
+            json.dump(registry, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        print(f"✗ 保存设备登记表失败: {e}")
+
+
+def _record_devices(addresses: List[str], registry: Optional[Dict[str, Any]] = None,
+                    full_scan: bool = False) -> None:
+    """更新设备登记表中设备的最后出现时间"""
+    registry = registry or _load_registry()
+    now = time.time()
+    for address in addresses:
+        entry = registry['devices'].setdefault(address, {'first_seen': now})
+        entry['last_seen'] = now
+    if full_scan:
+        registry['last_scan'] = now
+    registry['devices'] = {address: entry for address, entry in registry['devices'].items()
+                           if now - entry['last_seen'] < REGISTRY_FORGET_AFTER}
+    _save_registry(registry)
+
+
+def get_device_registry() -> Dict[str, Dict[str, float]]:
+    """
+    获取设备登记表
+    
+    Returns:
+        Dict[str, Dict[str, float]]: 设备地址 -> {'first_seen': 首次发现时间, 'last_seen': 最后出现时间}
+    """
+    return _load_registry()['devices']
+
+
+async def _probe_ports(host: str, ports: Iterable[int], timeout: float) -> List[int]:
+    """并发探测端口，返回可连接的端口"""
+    async def probe(port: int) -> bool:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+    
+    ports = list(ports)
+    results = await asyncio.gather(*(probe(port) for port in ports))
+    return [port for port, is_open in zip(ports, results) if is_open]
+
+
+async def _connect_addresses(addresses: List[str]) -> List[str]:
+    """通过ADB服务器并发连接设备，返回连接成功的地址"""
+    client = AsyncADBClient(adb_client.host, adb_client.port, adb_client.timeout)
+    messages = await asyncio.gather(*(client.connect(address) for address in addresses),
+                                    return_exceptions=True)
+    connected = []
+    for address, message in zip(addresses, messages):
+        if isinstance(message, Exception) or 'connected' not in message:
+            print(f"✗ 连接 {address} 失败: {message}")
+        else:
+            connected.append(address)
+    return connected
+
+
+def discover_ldplayer_instances(host: str = '127.0.0.1', ports: Iterable[int] = DEFAULT_EMULATOR_PORTS,
+                                timeout: float = 0.3, rescan: bool = False) -> List[str]:
+    """
+    发现并连接正在运行的模拟器实例
+    优先只探测登记表中已知的设备；登记表为空、已过期或已知设备都不在线时，
+    并发探测整个端口范围，只连接有响应的端口
+    
+    Args:
+        host (str): 模拟器所在主机
+        ports (Iterable[int]): 端口范围，默认 5555 起的16个实例端口
+        timeout (float): 单个端口的连接超时（秒）
+        rescan (bool): 忽略登记表，强制扫描端口范围
+        
+    Returns:
+        List[str]: 已连接的设备地址
+    """
+    registry = _load_registry()
+    known = [address for address in registry['devices'] if address.startswith(f'{host}:')]
+    fresh = time.time() - registry['last_scan'] < REGISTRY_MAX_AGE
+    
+    async def run(candidate_ports: List[int]) -> List[str]:
+        open_ports = await _probe_ports(host, candidate_ports, timeout)
+        if not open_ports:
+            return []
+        return await _connect_addresses([f'{host}:{port}' for port in open_ports])
+    
+    if known and fresh and not rescan:
+        connected = asyncio.run(run([int(address.rsplit(':', 1)[1]) for address in known]))
+        if connected:
+            _record_devices(connected, registry)
+            print(f"✓ 已连接登记的模拟器: {', '.join(connected)}")
+            return connected
+    
+    connected = asyncio.run(run(list(ports)))
+    _record_devices(connected, registry, full_scan=True)
+    if connected:
+        print(f"✓ 扫描到模拟器: {', '.join(connected)}")
+    return connected
+
+
+# 包信息缓存文件：{设备ID: {包名: 包信息}}，再次运行时只需增量刷新
+INVENTORY_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'package_inventory.json')
+
+# 一次输出所有包的信息
+FULL_DUMP_COMMAND = 'dumpsys package packages'
+# 只输出包名和更新时间行，用于判断哪些包需要重新查询
+TIMESTAMP_COMMAND = "dumpsys package packages | grep -E 'Package \\[|lastUpdateTime='"
+
+_PACKAGE_HEADER = re.compile(r'^(\s*)Package \[([^\]]+)\]')
+
+_inventory_cache: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+
+
+def parse_package_dump(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    逐行解析 dumpsys package 输出，每个包的信息解析完成后立即返回
+    
+    Args:
+        lines (Iterable[str]): 输出行，可以是边接收边产生的数据流
+        
+    Yields:
+        Dict[str, Any]: 包信息，包含包名、应用名、版本、安装/更新时间和是否为系统应用
+    """
+    record = None
+    header_indent = 0
+    seen = set()
+    
+    for line in lines:
+        match = _PACKAGE_HEADER.match(line)
+        if match:
+            if record is not None:
+                yield record
+            name = match.group(2)
+            header_indent = len(match.group(1))
+            # 同一包可能在"Hidden system packages"中再次出现，只取第一次
+            record = None if name in seen else {
+                'package_name': name,
+                # dumpsys 不包含应用标签，与之前一样以包名作为应用名
+                'app_name': name,
+                'version_name': '',
+                'version_code': '',
+                'first_install_time': '',
+                'last_update_time': '',
+                'system': False,
+            }
+            seen.add(name)
+            continue
+        if record is None or not line.strip():
+            continue
+        if len(line) - len(line.lstrip()) <= header_indent:
+            # 缩进回到包标题层级，当前包信息结束
+            yield record
+            record = None
+            continue
+        
+        text = line.strip()
+        if text.startswith('firstInstallTime=') and not record['first_install_time']:
+            record['first_install_time'] = text.split('=', 1)[1]
+        elif text.startswith('lastUpdateTime=') and not record['last_update_time']:
+            record['last_update_time'] = text.split('=', 1)[1]
+        elif text.startswith(('pkgFlags=[', 'flags=[')):
+            record['system'] = record['system'] or ' SYSTEM ' in text
+        else:
+            for token in text.split():
+                key, _, value = token.partition('=')
+                if key == 'versionCode' and not record['version_code']:
+                    record['version_code'] = value
+                elif key == 'versionName' and not record['version_name']:
+                    record['version_name'] = value
+    
+    if record is not None:
+        yield record
+
+
+def _parse_update_times(lines: Iterable[str]) -> Dict[str, str]:
+    """解析 TIMESTAMP_COMMAND 的输出，返回 {包名: 更新时间}"""
+    update_times = {}
+    current = None
+    for line in lines:
+        match = _PACKAGE_HEADER.match(line)
+        if match:
+            current = match.group(2)
+        elif current is not None and 'lastUpdateTime=' in line:
+            update_times.setdefault(current, line.split('=', 1)[1].strip())
+            current = None
+    return update_times
+
+
+def _dump_packages_command(package_names: List[str]) -> str:
+    """一次命令查询多个包的信息"""
+    names = ' '.join(shlex.quote(name) for name in package_names)
+    return f'for p in {names}; do dumpsys package "$p"; done'
+
+
+def _changed_packages(cached: Dict[str, Dict[str, Any]], update_times: Dict[str, str]) -> List[str]:
+    """新安装或更新时间变化的包"""
+    return [name for name, update_time in update_times.items()
+            if name not in cached or cached[name]['last_update_time'] != update_time]
+
+
+def _merge_inventory(cached: Dict[str, Dict[str, Any]], update_times: Dict[str, str],
+                     records: Iterable[Dict[str, Any]], changed: List[str]) -> Dict[str, Dict[str, Any]]:
+    """以缓存为基础，去除已卸载的包并替换重新查询的包"""
+    inventory = {name: record for name, record in cached.items() if name in update_times}
+    wanted = set(changed)
+    for record in records:
+        if record['package_name'] in wanted:
+            inventory[record['package_name']] = record
+    return inventory
+
+
+def _load_inventory_cache() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    global _inventory_cache
+    if _inventory_cache is None:
+        try:
+            with open(INVENTORY_CACHE_FILE, 'r', encoding='utf-8') as f:
+                _inventory_cache = json.load(f)
+        except (OSError, ValueError):
+            _inventory_cache = {}
+    return _inventory_cache
+
+
+def _store_inventory(device_id: Optional[str], inventory: Dict[str, Dict[str, Any]]) -> None:
+    cache = _load_inventory_cache()
+    cache[device_id or ''] = inventory
+    try:
+        with open(INVENTORY_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"✗ 保存包信息缓存失败: {e}")
+
+
+def get_package_inventory(device_id: Optional[str] = None, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    获取设备上所有包的信息（含系统应用）
+    首次调用通过一次 dumpsys 获取全部包信息；之后只比较各包的更新时间，
+    仅重新查询新安装或已更新的包
+    
+    Args:
+        device_id (str, optional): 设备ID
+        refresh (bool): 忽略缓存，重新全量获取
+        
+    Returns:
+        Dict[str, Dict[str, Any]]: 包名 -> 包信息
+    """
+    cached = None if refresh else _load_inventory_cache().get(device_id or '')
+    update_times = {}
+    if cached is not None:
+        update_times = _parse_update_times(adb_client.shell_lines(device_id, TIMESTAMP_COMMAND))
+    
+    if not update_times:
+        # 没有缓存（或设备上没有 grep）时全量获取，边接收边解析
+        records = parse_package_dump(adb_client.shell_lines(device_id, FULL_DUMP_COMMAND))
+        inventory = {record['package_name']: record for record in records}
+    else:
+        changed = _changed_packages(cached, update_times)
+        records = parse_package_dump(adb_client.shell_lines(device_id, _dump_packages_command(changed))) \
+            if changed else []
+        inventory = _merge_inventory(cached, update_times, records, changed)
+    
+    _store_inventory(device_id, inventory)
+    return inventory
+
+
 def get_installed_apps(device_id: Optional[str] = None) -> List[Dict[str, str]]:
     """
     获取已安装应用列表
@@ -84,69 +370,75 @@ def get_installed_apps(device_id: Optional[str] = None) -> List[Dict[str, str]]:
         device_id (str, optional): 设备ID，如果为None则使用默认设备
         
     Returns:
-        List[Dict[str, str]]: 应用信息列表，包含包名和应用名
+        List[Dict[str, str]]: 应用信息列表，包含包名、应用名和版本信息
     """
     try:
-        cmd = ['adb']
-        if device_id:
-            cmd.extend(['-s', device_id])
-        cmd.extend(['shell', 'pm', 'list', 'packages', '-3'])  # -3只显示第三方应用
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        packages = []
-        
-        for line in result.stdout.strip().split('\n'):
-            if line.startswith('package:'):
-                package_name = line.replace('package:', '')
-                app_name = get_app_name(package_name, device_id)
-                packages.append({
-                    'package_name': package_name,
-                    'app_name': app_name
-                })
+        # 只显示第三方应用
+        return [record for record in get_package_inventory(device_id).values() if not record['system']]
         
-        return packages
-        
-    except subprocess.CalledProcessError as e:
+    except ADBError as e:
         print(f"✗ 获取应用列表失败: {e}")
         return []
 
 
+def get_installed_apps_for_devices(device_ids: List[str],
+                                   rate_limit: Optional[float] = None) -> Dict[str, List[Dict[str, str]]]:
+    """
+    并发获取多台设备的已安装应用列表
+    
+    Args:
+        device_ids (List[str]): 设备ID列表
+        rate_limit (float, optional): 每台设备每秒最多执行的命令数
+        
+    Returns:
+        Dict[str, List[Dict[str, str]]]: 设备ID -> 应用信息列表，获取失败的设备为空列表
+    """
+    async def list_apps(device: AsyncDeviceController) -> List[Dict[str, str]]:
+        cached = _load_inventory_cache().get(device.serial)
+        update_times = {}
+        if cached is not None:
+            update_times = _parse_update_times((await device.shell(TIMESTAMP_COMMAND)).split('\n'))
+        if not update_times:
+            output = await device.shell(FULL_DUMP_COMMAND)
+            inventory = {record['package_name']: record for record in parse_package_dump(output.split('\n'))}
+        else:
+            changed = _changed_packages(cached, update_times)
+            output = await device.shell(_dump_packages_command(changed)) if changed else ''
+            inventory = _merge_inventory(cached, update_times, parse_package_dump(output.split('\n')), changed)
+        _store_inventory(device.serial, inventory)
+        return [record for record in inventory.values() if not record['system']]
+    
+    async def run() -> Dict[str, List[Dict[str, str]]]:
+        async with AsyncADBPool(device_ids, host=adb_client.host, port=adb_client.port,
+                                rate_limit=rate_limit) as pool:
+            results = await pool.gather(list_apps)
+        apps = {}
+        for device_id, result in results.items():
+            if isinstance(result, Exception):
+                print(f"✗ 获取 {device_id} 应用列表失败: {result}")
+                result = []
+            apps[device_id] = result
+        return apps
+    
+    return asyncio.run(run())
+
+
 def get_app_name(package_name: str, device_id: Optional[str] = None) -> str:
     """
-    获取应用的显示名称
+    获取应用的显示名称（来自缓存的包信息，不再为单个包执行 pm dump）
     
     Args:
         package_name (str): 包名
         device_id (str, optional): 设备ID
         
     Returns:
-        str: 应用显示名称
+        str: 应用显示名称，未找到时返回包名
     """
     try:
-        cmd = ['adb']
-        if device_id:
-            cmd.extend(['-s', device_id])
-        cmd.extend(['shell', 'dumpsys', 'package', package_name, '|', 'grep', '-A', '1', 'applicationInfo'])
-        
-        # 由于grep命令在某些系统上可能不可用，我们简化处理
-        cmd = ['adb']
-        if device_id:
-            cmd.extend(['-s', device_id])
-        cmd.extend(['shell', 'pm', 'dump', package_name])
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        # 简单提取应用名，如果失败则返回包名
-        lines = result.stdout.split('\n')
-        for line in lines:
-            if 'versionName=' in line:
-                # 这里可以添加更复杂的解析逻辑
-                break
-                
-        return package_name  # 简化处理，直接返回包名
-        
-    except:
+        record = get_package_inventory(device_id).get(package_name)
+    except ADBError:
         return package_name
+    return record['app_name'] if record else package_name
 
 
 def print_apps_list(apps: List[Dict[str, str]]) -> None:
@@ -183,8 +475,8 @@ def main():
     
     print("✓ ADB工具检查通过")
     
-    # 连接雷电模拟器
-    if not connect_ldplayer():
+    # 连接雷电模拟器（并发探测多开实例的端口，未发现时尝试默认端口）
+    if not discover_ldplayer_instances() and not connect_ldplayer():
         print("✗ 无法连接雷电模拟器，请确保模拟器已启动")
         return
     
@@ -200,8 +492,14 @@ def main():
     print(f"✓ 找到设备: {', '.join(devices)}")
     
     # 获取应用列表
-    device_id = devices[0] if len(devices) == 1 else None
-    apps = get_installed_apps(device_id)
+    if len(devices) > 1:
+        # 多台设备并发获取
+        for device_id, apps in get_installed_apps_for_devices(devices).items():
+            print(f"\n设备: {device_id}")
+            print_apps_list(apps)
+        return
+    
+    apps = get_installed_apps(devices[0])
     
     # 显示应用列表
     print_apps_list(apps)
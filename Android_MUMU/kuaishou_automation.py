@@ -6,19 +6,32 @@
 """
 
 import time
-import cv2
 import numpy as np
-import pyautogui
 import subprocess
 import os
 import json
 import logging
 import psutil
+import sys
 from typing import Tuple, Optional, List, Dict, Any
 
+# 共享模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from screen_change import AdaptivePoller, settle_report, wait_until_stable
+from screen_capture import get_default_backend
+from template_cache import shared_template_cache
+from template_matcher import convert_frame, match_template, resolve_color_mode
+from tracing import FIND, INPUT, traced
+
+try:
+    import pyautogui
+except Exception:  # 无显示器环境下导入会失败，此时只能使用自定义截图后端
+    pyautogui = None
+
 # 禁用pyautogui安全检查，允许鼠标移动到屏幕角落
-pyautogui.FAILSAFE = False
-pyautogui.PAUSE = 1
+if pyautogui:
+    pyautogui.FAILSAFE = False
+    pyautogui.PAUSE = 1
 
 class ConfigManager:
     """配置管理器"""
@@ -228,39 +241,40 @@ class ImageRecognition:
     """图像识别工具类"""
     
     @staticmethod
-    def find_image_on_screen(template_path: str, confidence: float = 0.8) -> Optional[Tuple[int, int]]:
+    @traced(FIND)
+    def find_image_on_screen(template_path: str, confidence: float = 0.8,
+                             screenshot: Optional[np.ndarray] = None,
+                             color_mode: Optional[str] = None) -> Optional[Tuple[int, int]]:
         """
         在屏幕上查找指定图像
         :param template_path: 模板图像路径
         :param confidence: 匹配置信度
+        :param screenshot: 已截取的屏幕图像（BGR/BGRA/灰度），为None时重新截图
+        :param color_mode: 匹配颜色模式，None 时按模板指定的模式，默认灰度
         :return: 找到的位置坐标 (x, y)
         """
         try:
-            # 截取当前屏幕
-            screenshot = pyautogui.screenshot()
-            screenshot_np = np.array(screenshot)
-            screenshot_gray = cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2GRAY)
-            
-            # 读取模板图像
+            # 读取模板图像（已缓存时不再解码）
             if not os.path.exists(template_path):
                 print(f"模板图像不存在: {template_path}")
                 return None
-                
-            template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+            
+            color_mode = resolve_color_mode(template_path, color_mode, 'gray')
+            template = shared_template_cache.get(template_path, color_mode)
             if template is None:
                 print(f"无法读取模板图像: {template_path}")
                 return None
             
-            # 模板匹配
-            result = cv2.matchTemplate(screenshot_gray, template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            # 截取当前屏幕
+            if screenshot is None:
+                screenshot = get_default_backend().grab()
             
-            if max_val >= confidence:
+            # 模板匹配
+            found = match_template(convert_frame(screenshot, color_mode), template, confidence)
+            if found:
                 # 返回模板中心点坐标
-                h, w = template.shape
-                center_x = max_loc[0] + w // 2
-                center_y = max_loc[1] + h // 2
-                return (center_x, center_y)
+                x, y, w, h = found
+                return (x + w // 2, y + h // 2)
             else:
                 return None
                 
@@ -277,12 +291,16 @@ class ImageRecognition:
         :param confidence: 匹配置信度
         :return: 找到的位置坐标
         """
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            position = ImageRecognition.find_image_on_screen(template_path, confidence)
-            if position:
-                return position
-            time.sleep(1)
+        deadline = time.time() + timeout
+        # 画面未变化时跳过匹配，轮询间隔随画面变化自适应调整
+        poller = AdaptivePoller(1.0)
+        while time.time() < deadline:
+            screenshot = get_default_backend().grab()
+            if poller.should_check(screenshot):
+                position = ImageRecognition.find_image_on_screen(template_path, confidence, screenshot)
+                if position:
+                    return position
+            poller.sleep(deadline)
         print(f"等待图像超时: {template_path}")
         return None
 
@@ -292,14 +310,26 @@ class KuaishouAutomation:
     def __init__(self):
         self.image_recognition = ImageRecognition()
     
+    @staticmethod
+    def _button_region(position: Tuple[int, int], radius: int = 80) -> Tuple[int, int, int, int]:
+        """按钮周围的检测区域（视频本身一直在播放，只检测按钮附近的变化）"""
+        return (max(0, position[0] - radius), max(0, position[1] - radius), radius * 2, radius * 2)
+    
+    @staticmethod
+    @traced(INPUT)
+    def _click(position: Tuple[int, int]) -> None:
+        """点击屏幕坐标，不做 pyautogui.PAUSE 暂停（点击后由 wait_until_stable 等待画面稳定）"""
+        pyautogui.click(position, _pause=False)
+    
     def open_kuaishou(self) -> bool:
         """打开快手应用"""
         try:
             # 查找快手图标
             kuaishou_icon = self.image_recognition.wait_for_image("templates/kuaishou_icon.png", timeout=10)
             if kuaishou_icon:
-                pyautogui.click(kuaishou_icon)
-                time.sleep(3)
+                before = get_default_backend().grab()
+                self._click(kuaishou_icon)
+                wait_until_stable(None, 3, flow="打开快手", before=before)
                 return True
             else:
                 print("未找到快手图标")
@@ -328,8 +358,10 @@ class KuaishouAutomation:
         try:
             like_button = self.image_recognition.find_image_on_screen("templates/like_button.png")
             if like_button:
-                pyautogui.click(like_button)
-                time.sleep(1)
+                region = self._button_region(like_button)
+                before = get_default_backend().grab(region)
+                self._click(like_button)
+                wait_until_stable(region, 1, flow="点赞", before=before)
                 return True
             return False
         except Exception as e:
@@ -341,8 +373,10 @@ class KuaishouAutomation:
         try:
             follow_button = self.image_recognition.find_image_on_screen("templates/follow_button.png")
             if follow_button:
-                pyautogui.click(follow_button)
-                time.sleep(1)
+                region = self._button_region(follow_button)
+                before = get_default_backend().grab(region)
+                self._click(follow_button)
+                wait_until_stable(region, 1, flow="关注", before=before)
                 return True
             return False
         except Exception as e:
@@ -426,6 +460,7 @@ def main():
     except Exception as e:
         print(f"运行错误: {e}")
     
+    print(settle_report.summary())
     print("脚本执行完成")
 
 if __name__ == "__main__":
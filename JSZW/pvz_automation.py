@@ -4,26 +4,47 @@
 使用pyautogui、opencv和win32gui实现游戏自动化
 """
 
+import os
+import sys
 import time
 import cv2
 import numpy as np
-import pyautogui
-import win32gui
-import win32con
 from typing import Tuple, Optional, List
 
+# 共享模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from screen_capture import CaptureBackend, CaptureThread, get_default_backend
+from template_cache import shared_template_cache
+from screen_change import wait_until_stable
+from template_matcher import convert_frame, match_template, resolve_color_mode
+from tracing import FIND, INPUT, traced
+
+try:
+    import pyautogui
+except Exception:  # 无显示器环境下导入会失败，此时只能使用自定义截图后端
+    pyautogui = None
+
+try:
+    import win32gui
+    import win32con
+except ImportError:  # 非Windows系统
+    win32gui = win32con = None
+
 
 class PVZAutomation:
     """植物大战僵尸自动化控制类"""
     
-    def __init__(self):
+    def __init__(self, capture_backend: Optional[CaptureBackend] = None):
         self.window_title = "Plants vs. Zombies"
         self.window_handle = None
         self.game_region = None
+        self.capture_backend = capture_backend or get_default_backend()
+        self.capture_thread: Optional[CaptureThread] = None
         
         # 游戏设置
-        pyautogui.PAUSE = 0.1
-        pyautogui.FAILSAFE = True
+        if pyautogui:
+            pyautogui.PAUSE = 0.1
+            pyautogui.FAILSAFE = True
         
     def find_game_window(self) -> bool:
         """查找游戏窗口"""
@@ -48,9 +69,17 @@ class PVZAutomation:
                 return False
         
         try:
+            # 窗口已在前台时画面不会切换，无需等待
+            was_foreground = win32gui.GetForegroundWindow() == self.window_handle
+            left, top, right, bottom = win32gui.GetWindowRect(self.window_handle)
+            before = None if was_foreground else self.capture_backend.grab((left, top, right - left, bottom - top))
             win32gui.SetForegroundWindow(self.window_handle)
             win32gui.ShowWindow(self.window_handle, win32con.SW_RESTORE)
-            time.sleep(0.5)
+            if not was_foreground:
+                # 窗口重绘完成即返回，最多等待0.5秒
+                left, top, right, bottom = win32gui.GetWindowRect(self.window_handle)
+                wait_until_stable((left, top, right - left, bottom - top), 0.5,
+                                  grab=self.capture_backend.grab, flow="激活窗口", before=before)
             return True
         except:
             return False
@@ -67,36 +96,66 @@ class PVZAutomation:
         except:
             return None
     
+    def start_background_capture(self, fps: float = 10.0) -> None:
+        """启动后台截图线程，之后 take_screenshot 直接取最新帧，不再阻塞等待截图"""
+        if self.capture_thread and self.capture_thread.running:
+            return
+        if not self.game_region:
+            self.get_game_region()
+        region = None
+        if self.game_region:
+            left, top, right, bottom = self.game_region
+            region = (left, top, right - left, bottom - top)
+        self.capture_thread = CaptureThread(self.capture_backend, fps=fps, region=region).start()
+    
+    def stop_background_capture(self) -> None:
+        """停止后台截图线程"""
+        if self.capture_thread:
+            self.capture_thread.stop()
+            self.capture_thread = None
+    
     def take_screenshot(self) -> np.ndarray:
         """截取游戏屏幕"""
+        if self.capture_thread and self.capture_thread.running:
+            # 后台线程已有帧时直接取最新帧；刚启动时等待第一帧
+            latest = self.capture_thread.latest(copy=True) or self.capture_thread.wait_newer(0, timeout=1.0, copy=True)
+            if latest:
+                return latest[0]
+        
         if not self.game_region:
             self.get_game_region()
         
         if self.game_region:
-            screenshot = pyautogui.screenshot(region=self.game_region)
-        else:
-            screenshot = pyautogui.screenshot()
-        
-        return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+            left, top, right, bottom = self.game_region
+            return self.capture_backend.grab_bgr((left, top, right - left, bottom - top))
+        return self.capture_backend.grab_bgr()
     
-    def find_template(self, template_path: str, threshold: float = 0.8) -> Optional[Tuple[int, int]]:
-        """使用模板匹配查找图像"""
-        screenshot = self.take_screenshot()
-        template = cv2.imread(template_path)
+    @traced(FIND)
+    def find_template(self, template_path: str, threshold: float = 0.8,
+                      color_mode: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        """使用模板匹配查找图像
+        Args:
+            template_path: 模板图像路径
+            threshold: 匹配阈值
+            color_mode: 匹配颜色模式 ('bgr', 'gray', 'b', 'g', 'r')，None 时按模板指定的模式，默认彩色
+        """
+        color_mode = resolve_color_mode(template_path, color_mode)
+        template = shared_template_cache.get(template_path, color_mode)
         
         if template is None:
             return None
         
-        result = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        screenshot = convert_frame(self.take_screenshot(), color_mode)
+        found = match_template(screenshot, template, threshold)
         
-        if max_val >= threshold:
+        if found:
             offset_x = self.game_region[0] if self.game_region else 0
             offset_y = self.game_region[1] if self.game_region else 0
-            return (max_loc[0] + offset_x, max_loc[1] + offset_y)
+            return (found[0] + offset_x, found[1] + offset_y)
         
         return None
     
+    @traced(INPUT)
     def click_at_position(self, x: int, y: int) -> None:
         """在指定位置点击"""
         pyautogui.click(x, y)
@@ -134,10 +193,14 @@ class PVZAutomation:
         self.click_at_position(x, y)
         return True
     
-    def collect_sun(self) -> int:
-        """收集阳光"""
+    def collect_sun(self, screenshot: Optional[np.ndarray] = None) -> int:
+        """收集阳光
+        Args:
+            screenshot: 已截取的游戏画面，None 时重新截图
+        """
         collected = 0
-        screenshot = self.take_screenshot()
+        if screenshot is None:
+            screenshot = self.take_screenshot()
         
         # 使用颜色检测查找阳光 (黄色)
         hsv = cv2.cvtColor(screenshot, cv2.COLOR_BGR2HSV)
@@ -164,9 +227,13 @@ class PVZAutomation:
         
         return collected
     
-    def detect_zombies(self) -> List[Tuple[int, int]]:
-        """检测僵尸位置"""
-        screenshot = self.take_screenshot()
+    def detect_zombies(self, screenshot: Optional[np.ndarray] = None) -> List[Tuple[int, int]]:
+        """检测僵尸位置
+        Args:
+            screenshot: 已截取的游戏画面，None 时重新截图
+        """
+        if screenshot is None:
+            screenshot = self.take_screenshot()
         zombies = []
         
         # 使用颜色检测查找僵尸 (灰绿色)
@@ -213,9 +280,9 @@ class PVZAutomation:
                 if self.place_plant(row, col):
                     time.sleep(0.5)
     
-    def auto_defense(self) -> None:
+    def auto_defense(self, screenshot: Optional[np.ndarray] = None) -> None:
         """自动防御"""
-        zombies = self.detect_zombies()
+        zombies = self.detect_zombies(screenshot)
         
         if zombies:
             # 如果发现僵尸，优先种植攻击植物
@@ -230,39 +297,52 @@ class PVZAutomation:
                     if self.place_plant(row, col):
                         break
     
-    def run_automation(self) -> None:
-        """运行自动化脚本"""
+    def run_automation(self, background_capture: bool = True, capture_fps: float = 10.0) -> None:
+        """运行自动化脚本
+        Args:
+            background_capture: 是否启用后台截图线程，使截图与识别、点击并行进行
+            capture_fps: 后台截图帧率
+        """
         if not self.focus_game_window():
             print("未找到游戏窗口")
             return
         
         print("开始自动化脚本...")
+        if background_capture:
+            self.start_background_capture(capture_fps)
         
-        # 初始化植物布局
-        time.sleep(2)
-        self.auto_plant_sunflowers()
-        time.sleep(1)
-        self.auto_plant_peashooters()
-        
-        # 主游戏循环
-        while True:
-            try:
-                # 收集阳光
-                collected = self.collect_sun()
-                if collected > 0:
-                    print(f"收集了 {collected} 个阳光")
+        # 初始化和主循环中的任何中断或异常都要停止后台截图线程
+        try:
+            # 初始化植物布局
+            time.sleep(2)
+            self.auto_plant_sunflowers()
+            time.sleep(1)
+            self.auto_plant_peashooters()
+        
+            # 主游戏循环
+            while True:
+                try:
+                    # 每轮只截一帧，阳光和僵尸检测共用
+                    screenshot = self.take_screenshot()
+                
+                    # 收集阳光
+                    collected = self.collect_sun(screenshot)
+                    if collected > 0:
+                        print(f"收集了 {collected} 个阳光")
                 
-                # 自动防御
-                self.auto_defense()
+                    # 自动防御
+                    self.auto_defense(screenshot)
                 
-                time.sleep(1)
+                    time.sleep(1)
                 
-            except KeyboardInterrupt:
-                print("自动化脚本已停止")
-                break
-            except Exception as e:
-                print(f"错误: {e}")
-                time.sleep(2)
+                except KeyboardInterrupt:
+                    print("自动化脚本已停止")
+                    break
+                except Exception as e:
+                    print(f"错误: {e}")
+                    time.sleep(2)
+        finally:
+            self.stop_background_capture()
 
 
 def main():
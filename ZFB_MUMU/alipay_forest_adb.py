@@ -4,19 +4,77 @@ import cv2
 import numpy as np
 import time
 import os
+import re
+import sys
 import tempfile
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional, List, Union
+
+# 共享模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from adb_client import ADBClient, ADBError, default_adb_client
+from adb_input import InputBatch
+from adb_screencap import RawFrame, Region, ScreencapFormatError, clip_region
+from adb_shell import ADBShellError, ADBShellSession
+from adb_stream import ScreenRecordStream
+from adb_ui import UIDumpError, UILocator
+from flow_engine import Flow, FlowEngine, Transition
+from screen_change import settle_report, wait_until_stable
+from template_cache import shared_template_cache
+from template_matcher import (LocationPrior, MultiScaleMatcher, convert_frame, match_template_all,
+                              resolve_color_mode)
+from tracing import CAPTURE, COMMAND, FIND, INPUT, traced
+
+# 记录各模板上次出现的位置，优先在附近搜索
+location_prior = LocationPrior()
+# 批量点击能量球时两次点击之间的设备端等待（秒）
+ENERGY_TAP_INTERVAL = 0.1
+# 多尺度匹配器，调用 enable_multi_scale() 后启用
+scale_matcher: Optional[MultiScaleMatcher] = None
+
+
+def enable_multi_scale(reference_size: Tuple[int, int]) -> None:
+    """启用多尺度匹配
+    Args:
+        reference_size: 截取模板时模拟器的分辨率 (width, height)，当前分辨率不同时按比例预测模板尺度
+    """
+    global scale_matcher
+    scale_matcher = MultiScaleMatcher(reference_size)
 
 class LeiDianADBController:
     """雷电模拟器ADB控制器"""
     
-    def __init__(self, adb_path: str = "adb", device_port: str = "5555"):
+    # 原始截图连续失败该次数后才改用PNG截图，偶发的超时或连接中断只影响当次截图
+    RAW_FAILURE_LIMIT = 3
+    
+    def __init__(self, adb_path: str = "adb", device_port: str = "5555", capture_mode: str = "raw",
+                 persistent_shell: bool = True, use_adb_server: bool = True,
+                 adb_client: Optional[ADBClient] = None):
+        """
+        Args:
+            adb_path: adb 可执行文件路径
+            device_port: 模拟器ADB端口
+            capture_mode: 截图方式，'raw' 通过 exec-out 直接读取原始帧缓冲，'png' 为截图到设备后 pull
+            persistent_shell: 点击、滑动等 shell 命令复用常驻 shell 会话，否则每条命令启动新的 adb 进程
+            use_adb_server: 连接、截图和shell会话直接通过套接字与ADB服务器通信，不启动 adb 进程
+            adb_client: 自定义ADB服务器客户端（如连接其他主机或模拟服务器）
+        """
         self.adb_path = adb_path
         self.device = f"127.0.0.1:{device_port}"
         self.connected = False
+        self.capture_mode = capture_mode
+        self.raw_failures = 0
+        self.adb_client = (adb_client or default_adb_client) if use_adb_server else None
+        self.shell_session = ADBShellSession(adb_path, self.device, client=self.adb_client) \
+            if persistent_shell else None
+        self.screen_stream: Optional[ScreenRecordStream] = None
+        # 视频流输出尺寸与设备分辨率不同时，取到的帧放大回该尺寸，保证坐标可直接用于点击
+        self.stream_device_size: Optional[Tuple[int, int]] = None
+        self.ui_locator: Optional[UILocator] = None
         
     def connect(self) -> bool:
         """连接到雷电模拟器"""
+        if self.adb_client is not None:
+            return self._connect_via_server()
         try:
             result = subprocess.run([self.adb_path, "connect", self.device], 
                                   capture_output=True, text=True)
@@ -31,6 +89,24 @@ class LeiDianADBController:
             print(f"ADB连接出错: {e}")
             return False
     
+    def _connect_via_server(self) -> bool:
+        """通过ADB服务器协议连接，服务器未运行时先启动"""
+        if not self.adb_client.start_server(self.adb_path):
+            print("ADB服务器未运行且无法启动")
+            return False
+        try:
+            message = self.adb_client.connect(self.device)
+        except ADBError as e:
+            print(f"ADB连接出错: {e}")
+            return False
+        if "connected" in message:
+            self.connected = True
+            print(f"成功连接到雷电模拟器: {self.device}")
+            return True
+        print(f"连接失败: {message}")
+        return False
+    
+    @traced(COMMAND)
     def execute_command(self, command: List[str]) -> Optional[str]:
         """执行ADB命令"""
         if not self.connected:
@@ -45,19 +121,188 @@ class LeiDianADBController:
             print(f"执行命令出错: {e}")
             return None
     
+    @traced(COMMAND)
+    def shell(self, command: str, timeout: Optional[float] = None) -> Optional[str]:
+        """执行shell命令，优先通过常驻shell会话发送
+        Args:
+            command: shell 命令字符串
+            timeout: 超时秒数（仅常驻会话有效）
+        Returns:
+            命令输出，失败时返回 None
+        """
+        if not self.connected:
+            print("未连接到设备")
+            return None
+        if self.shell_session is None:
+            return self.execute_command(["shell", command])
+        
+        try:
+            code, output = self.shell_session.run(command, timeout)
+            if code != 0:
+                print(f"命令返回 {code}: {command}")
+            return output
+        except ADBShellError as e:
+            print(f"执行命令出错: {e}")
+            return None
+    
+    def close(self) -> None:
+        """关闭常驻shell会话和视频流"""
+        self.stop_screen_stream()
+        if self.shell_session is not None:
+            self.shell_session.close()
+    
+    def start_screen_stream(self, bit_rate: int = 4_000_000, size: Optional[Tuple[int, int]] = None,
+                            timeout: float = 5.0) -> bool:
+        """启动 screenrecord 视频流，之后 get_screenshot 直接返回最新解码帧
+        Args:
+            bit_rate: 码率（bit/s）
+            size: 输出尺寸，缩小可降低带宽和解码耗时；取到的帧会放大回设备分辨率，
+                  识别得到的坐标与原始截图一致，可直接用于点击
+            timeout: 等待首帧的超时（秒）
+        Returns:
+            是否在超时前收到首帧
+        """
+        if self.adb_client is None:
+            print("视频流需要通过ADB服务器连接 (use_adb_server=True)")
+            return False
+        self.stream_device_size = None
+        if size is not None:
+            device_size = self.get_device_size()
+            if device_size is None:
+                print("无法获取设备分辨率，不能使用指定尺寸的视频流")
+                return False
+            if sorted(device_size) != sorted(size):
+                self.stream_device_size = device_size
+        if self.screen_stream is None or not self.screen_stream.running:
+            try:
+                self.screen_stream = ScreenRecordStream(self.device, self.adb_client, bit_rate, size).start()
+            except RuntimeError as e:
+                print(f"无法启动视频流: {e}")
+                return False
+        return self.screen_stream.wait_newer(0, timeout) is not None
+    
+    def get_device_size(self) -> Optional[Tuple[int, int]]:
+        """通过 wm size 获取设备分辨率 (width, height)，有 Override size 时以其为准"""
+        sizes = re.findall(r'size:\s*(\d+)x(\d+)', self.shell("wm size") or '')
+        if not sizes:
+            return None
+        width, height = sizes[-1]
+        return int(width), int(height)
+    
+    def _stream_active(self) -> bool:
+        return self.screen_stream is not None and self.screen_stream.healthy
+    
+    def _from_stream(self, frame: np.ndarray) -> np.ndarray:
+        """将视频流帧放大回设备分辨率（按帧的横竖方向匹配设备尺寸）"""
+        if self.stream_device_size is None:
+            return frame
+        width, height = self.stream_device_size
+        if (frame.shape[1] > frame.shape[0]) != (width > height):
+            width, height = height, width
+        if (frame.shape[1], frame.shape[0]) == (width, height):
+            return frame
+        return cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+    
+    def stop_screen_stream(self) -> None:
+        """停止视频流"""
+        if self.screen_stream is not None:
+            self.screen_stream.stop()
+            self.screen_stream = None
+    
+    @traced(INPUT)
     def tap(self, x: int, y: int) -> bool:
         """点击屏幕指定位置"""
-        result = self.execute_command(["shell", "input", "tap", str(x), str(y)])
+        result = self.shell(f"input tap {x} {y}")
         return result is not None
     
+    @traced(INPUT)
     def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> bool:
         """滑动屏幕"""
-        result = self.execute_command(["shell", "input", "swipe", 
-                                     str(x1), str(y1), str(x2), str(y2), str(duration)])
+        result = self.shell(f"input swipe {x1} {y1} {x2} {y2} {duration}")
         return result is not None
     
     def get_screenshot(self) -> Optional[np.ndarray]:
-        """获取屏幕截图"""
+        """获取屏幕截图（BGR）"""
+        if self._stream_active():
+            item = self.screen_stream.latest(copy=True)
+            if item is not None:
+                return self._from_stream(item[0])
+        if self.capture_mode == "raw":
+            image = self.get_screenshot_raw()
+            self._record_raw_result(image is not None)
+            if image is not None:
+                return image
+        return self.get_screenshot_png()
+    
+    def _record_raw_result(self, success: bool) -> None:
+        """记录原始截图结果，连续失败 RAW_FAILURE_LIMIT 次（设备不支持）时改用PNG截图"""
+        if success:
+            self.raw_failures = 0
+            return
+        self.raw_failures += 1
+        if self.raw_failures >= self.RAW_FAILURE_LIMIT:
+            print(f"原始截图连续失败 {self.raw_failures} 次，改用PNG截图")
+            self.capture_mode = "png"
+        else:
+            print("原始截图失败，本次改用PNG截图")
+    
+    def get_screenshot_raw(self) -> Optional[np.ndarray]:
+        """通过 exec-out 读取 screencap 原始输出并直接解析为图像
+        只需一次进程调用，无需设备端PNG编码、临时文件和解码
+        """
+        frame = self.get_raw_frame()
+        return frame.to_bgr() if frame is not None else None
+    
+    def get_frame(self) -> Optional[Union[np.ndarray, RawFrame]]:
+        """获取用于图像识别的帧
+        视频流运行时返回最新解码帧；原始截图模式下返回 RawFrame，识别时只转换需要的区域；
+        否则返回BGR截图
+        """
+        if self.capture_mode == "raw" and not self._stream_active():
+            frame = self.get_raw_frame()
+            self._record_raw_result(frame is not None)
+            if frame is not None:
+                return frame
+            return self.get_screenshot_png()
+        return self.get_screenshot()
+    
+    def grab_region(self, region: Optional[Region] = None) -> Optional[np.ndarray]:
+        """截取区域的灰度图（用于等待画面稳定），原始截图模式下只转换该区域的像素"""
+        frame = self.get_frame()
+        if frame is None:
+            return None
+        return _prepare_frame(frame, 'gray', region)[0]
+    
+    @traced(CAPTURE)
+    def get_raw_frame(self) -> Optional[RawFrame]:
+        """读取 screencap 原始输出，不做颜色转换"""
+        if not self.connected:
+            print("未连接到设备")
+            return None
+        
+        try:
+            if self.adb_client is not None:
+                return RawFrame.from_bytes(self.adb_client.exec_out(self.device, "screencap"))
+            # exec-out 不经过终端，输出不会被换行符转换破坏
+            result = subprocess.run([self.adb_path, "-s", self.device, "exec-out", "screencap"],
+                                    capture_output=True)
+            if result.returncode != 0:
+                print(f"原始截图命令失败: {result.stderr.decode(errors='replace').strip()}")
+                return None
+            return RawFrame.from_bytes(result.stdout)
+        except ScreencapFormatError as e:
+            print(f"解析原始截图出错: {e}")
+            return None
+        except ADBError as e:
+            print(f"原始截图命令失败: {e}")
+            return None
+        except Exception as e:
+            print(f"获取截图出错: {e}")
+            return None
+    
+    @traced(CAPTURE)
+    def get_screenshot_png(self) -> Optional[np.ndarray]:
+        """截图保存到设备后 pull 到本地读取"""
         try:
             with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
                 tmp_path = tmp_file.name
@@ -77,76 +322,199 @@ class LeiDianADBController:
             print(f"获取截图出错: {e}")
             return None
     
+    @traced(INPUT)
+    def run_input_batch(self, batch: InputBatch, timeout: Optional[float] = None) -> bool:
+        """一次发送整个输入序列，在设备端按顺序执行
+        Args:
+            batch: 输入操作序列
+            timeout: 超时秒数，默认按序列中的等待时间和操作数估算
+        """
+        if not batch:
+            return True
+        if timeout is None:
+            timeout = 10 + batch.delay + len(batch) * 0.5
+        result = self.shell(batch.to_script(), timeout)
+        return result is not None
+    
+    def find_ui(self, text: Optional[str] = None, resource_id: Optional[str] = None,
+                desc: Optional[str] = None, contains: bool = False,
+                refresh: bool = False) -> Optional[Tuple[int, int]]:
+        """通过控件树查找控件，返回点击坐标
+        控件树按前台窗口缓存，窗口未变化时不重新 dump
+        Args:
+            text: 控件文本
+            resource_id: 完整或短 resource-id
+            desc: content-desc
+            contains: 文本和 desc 按包含匹配
+            refresh: 强制重新 dump
+        """
+        if not self.connected:
+            print("未连接到设备")
+            return None
+        if self.ui_locator is None:
+            self.ui_locator = UILocator(self.device, self.adb_client or default_adb_client, shell=self.shell)
+        try:
+            return self.ui_locator.find(text, resource_id, desc, contains, refresh)
+        except (UIDumpError, ADBError) as e:
+            print(f"获取控件树出错: {e}")
+            return None
+    
     def start_app(self, package_name: str) -> bool:
         """启动应用"""
-        result = self.execute_command(["shell", "monkey", "-p", package_name, "-v", "1"])
+        result = self.shell(f"monkey -p {package_name} -v 1")
         return result is not None
 
-def find_image_in_screenshot(screenshot: np.ndarray, template_path: str, 
-                           confidence: float = 0.8) -> Optional[Tuple[int, int]]:
-    """在截图中查找模板图像"""
+def _prepare_frame(screenshot: Union[np.ndarray, RawFrame], color_mode: str,
+                   region: Optional[Region]) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """裁剪识别区域并转换颜色模式，返回 (图像, 区域左上角偏移)
+    裁剪只取视图不复制；RawFrame 只转换区域内的像素
+    """
+    if region is None:
+        if isinstance(screenshot, RawFrame):
+            return screenshot.convert(color_mode), (0, 0)
+        return convert_frame(screenshot, color_mode), (0, 0)
+    x0, y0, x1, y1 = clip_region(region, screenshot.shape[1], screenshot.shape[0])
+    if isinstance(screenshot, RawFrame):
+        return screenshot.convert(color_mode, region), (x0, y0)
+    return convert_frame(screenshot[y0:y1, x0:x1], color_mode), (x0, y0)
+
+@traced(FIND)
+def find_image_in_screenshot(screenshot: Union[np.ndarray, RawFrame], template_path: str, 
+                           confidence: float = 0.8, color_mode: Optional[str] = None,
+                           region: Optional[Region] = None) -> Optional[Tuple[int, int]]:
+    """在截图中查找模板图像
+    color_mode 为匹配颜色模式 ('bgr', 'gray', 'b', 'g', 'r')，None 时按模板指定的模式，默认彩色
+    region 为识别区域 (x, y, width, height)，只在该区域内匹配，返回的坐标仍为整个屏幕的坐标
+    """
     try:
-        template = cv2.imread(template_path)
+        color_mode = resolve_color_mode(template_path, color_mode)
+        template = shared_template_cache.get(template_path, color_mode)
         if template is None:
             print(f"无法加载模板图像: {template_path}")
             return None
         
-        result = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
-        
-        if max_val >= confidence:
-            center_x = max_loc[0] + template.shape[1] // 2
-            center_y = max_loc[1] + template.shape[0] // 2
-            return (center_x, center_y)
+        target_size = (screenshot.shape[1], screenshot.shape[0])
+        screenshot, (offset_x, offset_y) = _prepare_frame(screenshot, color_mode, region)
+        if scale_matcher:
+            # 以截图分辨率作为目标标识，记录每种分辨率上次成功的尺度
+            found = scale_matcher.match(screenshot, template_path, target_size, confidence, color_mode,
+                                        frame_size=target_size)
+        else:
+            key = template_path if region is None else (template_path, tuple(region))
+            found = location_prior.match(screenshot, template, key, confidence)
+        if found:
+            x, y, w, h = found
+            return (offset_x + x + w // 2, offset_y + y + h // 2)
         return None
     except Exception as e:
         print(f"图像识别出错: {e}")
         return None
 
+@traced(FIND)
+def find_all_images_in_screenshot(screenshot: Union[np.ndarray, RawFrame], template_path: str,
+                                  confidence: float = 0.8, color_mode: Optional[str] = None,
+                                  region: Optional[Region] = None) -> List[Tuple[int, int]]:
+    """在截图中查找模板的所有出现位置
+    Returns:
+        各匹配位置的中心点（整个屏幕的坐标），按匹配得分从高到低排列
+    """
+    try:
+        color_mode = resolve_color_mode(template_path, color_mode)
+        template = shared_template_cache.get(template_path, color_mode)
+        if template is None:
+            print(f"无法加载模板图像: {template_path}")
+            return []
+        
+        screenshot, (offset_x, offset_y) = _prepare_frame(screenshot, color_mode, region)
+        return [(offset_x + x, offset_y + y)
+                for x, y in (match.center for match in match_template_all(screenshot, template, confidence))]
+    except Exception as e:
+        print(f"图像识别出错: {e}")
+        return []
+
 def wait_and_click(controller: LeiDianADBController, template_path: str, 
-                  confidence: float = 0.8, timeout: int = 10) -> bool:
-    """等待并点击指定图像"""
+                  confidence: float = 0.8, timeout: int = 10, region: Optional[Region] = None,
+                  settle_wait: float = 0.0, flow: str = "点击图像") -> bool:
+    """等待并点击指定图像，region 为识别区域 (x, y, width, height)
+    settle_wait 大于0时点击后以命中的截图为操作前画面，等待界面切换完成，最多 settle_wait 秒
+    """
     start_time = time.time()
     while time.time() - start_time < timeout:
-        screenshot = controller.get_screenshot()
+        screenshot = controller.get_frame()
         if screenshot is None:
             continue
             
-        pos = find_image_in_screenshot(screenshot, template_path, confidence)
+        pos = find_image_in_screenshot(screenshot, template_path, confidence, region=region)
         if pos:
             controller.tap(pos[0], pos[1])
             print(f"点击位置: {pos}")
+            if settle_wait > 0:
+                settle(controller, settle_wait, flow, before=screenshot)
             return True
         time.sleep(0.5)
     
     print(f"未找到图像: {template_path}")
     return False
 
+def wait_and_click_ui(controller: LeiDianADBController, text: Optional[str] = None,
+                      resource_id: Optional[str] = None, desc: Optional[str] = None,
+                      contains: bool = False, timeout: int = 10) -> bool:
+    """等待并点击控件（按文本、resource-id 或 content-desc 定位）"""
+    start_time = time.time()
+    # 第一次查询可复用缓存的控件树，之后页面内容可能已变化，每次重新 dump
+    refresh = False
+    while time.time() - start_time < timeout:
+        pos = controller.find_ui(text, resource_id, desc, contains, refresh)
+        if pos:
+            controller.tap(pos[0], pos[1])
+            print(f"点击控件: {text or desc or resource_id} {pos}")
+            return True
+        refresh = True
+        time.sleep(0.5)
+    return False
+
+def settle(controller: LeiDianADBController, max_wait: float, flow: str,
+           region: Optional[Region] = None,
+           before: Optional[Union[np.ndarray, RawFrame]] = None) -> bool:
+    """等待界面切换完成并稳定，最多等待 max_wait 秒（代替操作后的固定等待）
+    before 为操作前的整帧截图（get_frame 的返回值），用于识别在第一次检测前就已完成的切换
+    """
+    if before is not None:
+        before = _prepare_frame(before, 'gray', region)[0]
+    return wait_until_stable(region, max_wait, grab=controller.grab_region, flow=flow, before=before)
+
+def _flow_engine(controller: LeiDianADBController) -> FlowEngine:
+    """创建在控制器截图上执行流程的引擎"""
+    return FlowEngine(controller.get_screenshot, controller.tap,
+                      location_prior=location_prior, scale_matcher=scale_matcher)
+
+def _ui_transition(controller: LeiDianADBController, text: str, target: str, delay: float = 0.0) -> Transition:
+    """按控件文本定位的跳转"""
+    return Transition(None, target, probe=lambda frame: controller.find_ui(text=text),
+                      delay=delay, name=f"控件:{text}")
+
 def open_alipay_app(controller: LeiDianADBController) -> bool:
     """打开支付宝APP"""
     print("正在打开支付宝APP...")
     
     # 方法1: 直接启动支付宝包名
+    before = controller.get_frame()
     if controller.start_app("com.eg.android.AlipayGphone"):
-        time.sleep(3)
+        settle(controller, 3, "打开支付宝", before=before)
         return True
     
-    # 方法2: 通过桌面图标点击
+    # 方法2/3: 桌面图标和应用列表在同一帧上同时查找，命中哪个走哪个
     alipay_icon = "images/alipay_icon.png"
-    if os.path.exists(alipay_icon):
-        if wait_and_click(controller, alipay_icon, confidence=0.8, timeout=5):
-            time.sleep(3)
-            return True
-    
-    # 方法3: 通过应用列表查找
-    app_drawer = "images/app_drawer.png"
-    if os.path.exists(app_drawer):
-        if wait_and_click(controller, app_drawer, confidence=0.8, timeout=5):
-            time.sleep(2)
-            alipay_icon = "images/alipay_icon.png"
-            if wait_and_click(controller, alipay_icon, confidence=0.8, timeout=5):
-                time.sleep(3)
-                return True
+    flow = (Flow("打开支付宝", "desktop", ["alipay"], state_timeout=5)
+            .add("desktop",
+                 _ui_transition(controller, "支付宝", "alipay", delay=3),
+                 Transition(alipay_icon, "alipay", delay=3),
+                 Transition("images/app_drawer.png", "drawer", delay=2))
+            .add("drawer", Transition(alipay_icon, "alipay", delay=3)))
+    result = _flow_engine(controller).run(flow)
+    print(result.report())
+    if result:
+        return True
     
     print("无法打开支付宝APP")
     return False
@@ -155,33 +523,30 @@ def navigate_to_ant_forest(controller: LeiDianADBController) -> bool:
     """导航到蚂蚁森林"""
     print("正在进入蚂蚁森林...")
     
-    # 点击更多功能
-    more_button = "images/more_button.png"
-    if os.path.exists(more_button):
-        if wait_and_click(controller, more_button, confidence=0.8, timeout=10):
-            time.sleep(2)
-            
-            # 查找蚂蚁森林图标
-            ant_forest_icon = "images/ant_forest_icon.png"
-            if os.path.exists(ant_forest_icon):
-                if wait_and_click(controller, ant_forest_icon, confidence=0.8, timeout=10):
-                    time.sleep(3)
-                    return True
-    
-    # 尝试搜索功能
-    search_button = "images/search_button.png"
-    if os.path.exists(search_button):
-        if wait_and_click(controller, search_button, confidence=0.8, timeout=5):
-            time.sleep(1)
-            # 输入搜索内容
-            controller.execute_command(["shell", "input", "text", "蚂蚁森林"])
-            time.sleep(1)
-            
-            ant_forest_result = "images/ant_forest_search_result.png"
-            if os.path.exists(ant_forest_result):
-                if wait_and_click(controller, ant_forest_result, confidence=0.8, timeout=5):
-                    time.sleep(3)
-                    return True
+    def search(pos: Tuple[int, int]) -> None:
+        controller.tap(pos[0], pos[1])
+        time.sleep(1)
+        # 输入搜索内容
+        controller.shell("input text 蚂蚁森林")
+    
+    # 首页入口、更多功能和搜索三条路径同时查找
+    ant_forest_icon = "images/ant_forest_icon.png"
+    search_button = Transition("images/search_button.png", "search", action=search, delay=1)
+    flow = (Flow("进入蚂蚁森林", "home", ["forest"])
+            .add("home",
+                 _ui_transition(controller, "蚂蚁森林", "forest", delay=3),
+                 Transition(ant_forest_icon, "forest", delay=3),
+                 Transition("images/more_button.png", "more", delay=2),
+                 search_button)
+            .add("more",
+                 _ui_transition(controller, "蚂蚁森林", "forest", delay=3),
+                 Transition(ant_forest_icon, "forest", delay=3),
+                 search_button)
+            .add("search", Transition("images/ant_forest_search_result.png", "forest", delay=3)))
+    result = _flow_engine(controller).run(flow)
+    print(result.report())
+    if result:
+        return True
     
     print("无法进入蚂蚁森林")
     return False
@@ -199,24 +564,25 @@ def collect_energy(controller: LeiDianADBController) -> int:
     
     # 收集自己的能量
     for _ in range(10):  # 最多尝试10次
-        screenshot = controller.get_screenshot()
+        screenshot = controller.get_frame()
         if screenshot is None:
             continue
             
-        pos = find_image_in_screenshot(screenshot, energy_ball, confidence=0.7)
-        if pos:
-            controller.tap(pos[0], pos[1])
-            collect_count += 1
-            print(f"收集能量球 {collect_count}")
-            time.sleep(0.5)
+        positions = find_all_images_in_screenshot(screenshot, energy_ball, confidence=0.7)
+        if positions:
+            # 本帧所有能量球的点击一次发送，等待在设备端完成
+            batch = InputBatch().taps(positions, interval=ENERGY_TAP_INTERVAL).sleep(0.5)
+            if controller.run_input_batch(batch):
+                collect_count += len(positions)
+                print(f"收集能量球 {collect_count}")
         else:
             break
     
     # 访问好友收集能量
     friends_button = "images/friends_button.png"
     if os.path.exists(friends_button):
-        if wait_and_click(controller, friends_button, confidence=0.8, timeout=5):
-            time.sleep(2)
+        if wait_and_click(controller, friends_button, confidence=0.8, timeout=5,
+                          settle_wait=2, flow="进入好友列表"):
             friend_energy_count = collect_friends_energy(controller)
             collect_count += friend_energy_count
     
@@ -238,32 +604,32 @@ def collect_friends_energy(controller: LeiDianADBController) -> int:
     
     # 访问可收集的好友
     for _ in range(5):  # 最多访问5个好友
-        screenshot = controller.get_screenshot()
+        screenshot = controller.get_frame()
         if screenshot is None:
             continue
             
         pos = find_image_in_screenshot(screenshot, collectable_friend, confidence=0.7)
         if pos:
             controller.tap(pos[0], pos[1])
-            time.sleep(2)
+            settle(controller, 2, "进入好友主页", before=screenshot)
             
             # 收集该好友的能量
-            for _ in range(5):  # 每个好友最多收集5个能量球
-                screenshot = controller.get_screenshot()
+            for _ in range(5):  # 每个好友最多收集5轮
+                screenshot = controller.get_frame()
                 if screenshot is None:
                     continue
                     
-                pos = find_image_in_screenshot(screenshot, energy_ball, confidence=0.7)
-                if pos:
-                    controller.tap(pos[0], pos[1])
-                    friend_collect_count += 1
-                    time.sleep(0.5)
+                positions = find_all_images_in_screenshot(screenshot, energy_ball, confidence=0.7)
+                if positions:
+                    batch = InputBatch().taps(positions, interval=ENERGY_TAP_INTERVAL).sleep(0.5)
+                    if controller.run_input_batch(batch):
+                        friend_collect_count += len(positions)
                 else:
                     break
             
             # 返回好友列表
-            if wait_and_click(controller, back_button, confidence=0.8, timeout=3):
-                time.sleep(1)
+            wait_and_click(controller, back_button, confidence=0.8, timeout=3,
+                           settle_wait=1, flow="返回好友列表")
         else:
             break
     
@@ -294,8 +660,10 @@ def main(adb_path: str = "adb", device_port: str = "5555") -> bool:
     
     # 收集能量
     total_energy = collect_energy(controller)
+    controller.close()
     
     print(f"自动化完成！总共收集了 {total_energy} 个能量球")
+    print(settle_report.summary())
     return True
 
 if __name__ == "__main__":
@@ -5,44 +5,70 @@ import numpy as np
 import time
 import subprocess
 import os
+import sys
 from typing import Tuple, Optional
 
+# 共享模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flow_engine import Flow, FlowEngine, Transition
+from screen_capture import get_default_backend
+from screen_change import settle_report, wait_until_stable
+from template_cache import shared_template_cache
+from template_matcher import convert_frame, match_template, resolve_color_mode
+from tracing import CAPTURE, FIND, INPUT, span, traced
+
 pyautogui.PAUSE = 0.5
 pyautogui.FAILSAFE = True
 
-def find_image_on_screen(template_path: str, confidence: float = 0.8) -> Optional[Tuple[int, int]]:
+@traced(INPUT)
+def click(x: int, y: int, pause: bool = True) -> None:
+    """点击屏幕坐标
+    
+    Args:
+        x, y: 屏幕坐标
+        pause: 点击后是否按 pyautogui.PAUSE 暂停；随后由 wait_until_stable 等待画面时传 False
+    """
+    pyautogui.click(x, y, _pause=pause)
+
+# 导航流程：每轮截一帧，同时评估当前状态的所有候选路径
+flow_engine = FlowEngine(lambda: get_default_backend().grab_bgr(), click)
+
+@traced(FIND)
+def find_image_on_screen(template_path: str, confidence: float = 0.8,
+                         color_mode: Optional[str] = None) -> Optional[Tuple[int, int]]:
     """
     在屏幕上查找指定图像的位置
     
     Args:
         template_path: 模板图像路径
         confidence: 匹配置信度 (0-1)
+        color_mode: 匹配颜色模式 ('bgr', 'gray', 'b', 'g', 'r')，None 时按模板指定的模式，默认彩色
     
     Returns:
         匹配位置的坐标 (x, y)，未找到返回 None
     """
     try:
-        screenshot = pyautogui.screenshot()
-        screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-        
-        template = cv2.imread(template_path)
+        color_mode = resolve_color_mode(template_path, color_mode)
+        template = shared_template_cache.get(template_path, color_mode)
         if template is None:
             print(f"无法加载模板图像: {template_path}")
             return None
-            
-        result = cv2.matchTemplate(screenshot_cv, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
         
-        if max_val >= confidence:
-            center_x = max_loc[0] + template.shape[1] // 2
-            center_y = max_loc[1] + template.shape[0] // 2
-            return (center_x, center_y)
+        with span(CAPTURE):
+            screenshot = pyautogui.screenshot()
+        screenshot_cv = convert_frame(cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR), color_mode)
+        
+        found = match_template(screenshot_cv, template, confidence)
+        if found:
+            x, y, w, h = found
+            return (x + w // 2, y + h // 2)
         return None
     except Exception as e:
         print(f"图像识别出错: {e}")
         return None
 
-def click_if_found(template_path: str, confidence: float = 0.8, timeout: int = 10) -> bool:
+def click_if_found(template_path: str, confidence: float = 0.8, timeout: int = 10,
+                   settle_wait: float = 0.0, flow: str = "点击图像") -> bool:
     """
     查找并点击指定图像
     
@@ -50,6 +76,8 @@ def click_if_found(template_path: str, confidence: float = 0.8, timeout: int = 1
         template_path: 模板图像路径
         confidence: 匹配置信度
         timeout: 超时时间(秒)
+        settle_wait: 大于0时点击后等待界面切换完成并稳定，最多等待的秒数
+        flow: 计入等待统计的流程名
     
     Returns:
         是否成功点击
@@ -58,8 +86,12 @@ def click_if_found(template_path: str, confidence: float = 0.8, timeout: int = 1
     while time.time() - start_time < timeout:
         pos = find_image_on_screen(template_path, confidence)
         if pos:
-            pyautogui.click(pos[0], pos[1])
+            # 点击前的画面，用于确认界面确实发生了切换
+            before = get_default_backend().grab() if settle_wait > 0 else None
+            click(pos[0], pos[1], pause=settle_wait <= 0)
             print(f"点击位置: {pos}")
+            if settle_wait > 0:
+                wait_until_stable(None, settle_wait, flow=flow, before=before)
             return True
         time.sleep(0.5)
     print(f"未找到图像: {template_path}")
@@ -84,30 +116,32 @@ def start_leidian_simulator():
         print(f"启动模拟器出错: {e}")
         return False
 
+def _type_after_click(text: str):
+    """点击输入框后输入文本的跳转动作"""
+    def action(pos: Tuple[int, int]) -> None:
+        click(pos[0], pos[1])
+        with span(INPUT):
+            pyautogui.write(text)
+    return action
+
 def open_alipay_app():
     """
     打开支付宝APP
     """
     print("正在打开支付宝APP...")
     
-    # 方法1: 通过桌面图标点击
+    # 桌面图标和应用列表同时查找，应用列表中再通过搜索找到支付宝
     alipay_icon = "images/alipay_icon.png"  # 需要准备支付宝图标截图
-    if click_if_found(alipay_icon, confidence=0.8, timeout=5):
-        time.sleep(3)
-        return True
-    
-    # 方法2: 通过应用列表查找
     app_drawer = "images/app_drawer.png"  # 应用列表图标
-    if click_if_found(app_drawer, confidence=0.8, timeout=5):
-        time.sleep(2)
-        # 搜索支付宝
-        search_bar = "images/search_bar.png"
-        if click_if_found(search_bar, confidence=0.8, timeout=5):
-            pyautogui.write("支付宝")
-            time.sleep(1)
-            if click_if_found(alipay_icon, confidence=0.8, timeout=5):
-                time.sleep(3)
-                return True
+    search_bar = "images/search_bar.png"
+    flow = (Flow("打开支付宝", "desktop", ["alipay"], state_timeout=5)
+            .add("desktop", Transition(alipay_icon, "alipay", delay=3), Transition(app_drawer, "drawer", delay=2))
+            .add("drawer", Transition(search_bar, "search", action=_type_after_click("支付宝"), delay=1))
+            .add("search", Transition(alipay_icon, "alipay", delay=3)))
+    result = flow_engine.run(flow)
+    print(result.report())
+    if result:
+        return True
     
     print("无法打开支付宝APP")
     return False
@@ -118,26 +152,17 @@ def navigate_to_ant_forest():
     """
     print("正在进入蚂蚁森林...")
     
-    # 点击更多功能
-    more_button = "images/more_button.png"
-    if click_if_found(more_button, confidence=0.8, timeout=10):
-        time.sleep(2)
-        
-        # 查找蚂蚁森林图标
-        ant_forest_icon = "images/ant_forest_icon.png"
-        if click_if_found(ant_forest_icon, confidence=0.8, timeout=10):
-            time.sleep(3)
-            return True
-    
-    # 如果在首页没找到，尝试搜索
-    search_button = "images/search_button.png"
-    if click_if_found(search_button, confidence=0.8, timeout=5):
-        pyautogui.write("蚂蚁森林")
-        time.sleep(1)
-        ant_forest_result = "images/ant_forest_search_result.png"
-        if click_if_found(ant_forest_result, confidence=0.8, timeout=5):
-            time.sleep(3)
-            return True
+    # 更多功能和搜索两条路径同时查找
+    ant_forest_icon = "images/ant_forest_icon.png"
+    search = Transition("images/search_button.png", "search", action=_type_after_click("蚂蚁森林"), delay=1)
+    flow = (Flow("进入蚂蚁森林", "home", ["forest"])
+            .add("home", Transition("images/more_button.png", "more", delay=2), search)
+            .add("more", Transition(ant_forest_icon, "forest", delay=3), search)
+            .add("search", Transition("images/ant_forest_search_result.png", "forest", delay=3)))
+    result = flow_engine.run(flow)
+    print(result.report())
+    if result:
+        return True
     
     print("无法进入蚂蚁森林")
     return False
@@ -163,8 +188,7 @@ def collect_energy():
     
     # 访问好友收集能量
     friends_button = "images/friends_button.png"
-    if click_if_found(friends_button, confidence=0.8, timeout=5):
-        time.sleep(2)
+    if click_if_found(friends_button, confidence=0.8, timeout=5, settle_wait=2, flow="进入好友列表"):
         
         # 收集好友能量
         friend_energy_count = collect_friends_energy()
@@ -184,8 +208,7 @@ def collect_friends_energy():
     collectable_friend = "images/collectable_friend.png"
     
     for i in range(5):  # 最多访问5个好友
-        if click_if_found(collectable_friend, confidence=0.7, timeout=3):
-            time.sleep(2)
+        if click_if_found(collectable_friend, confidence=0.7, timeout=3, settle_wait=2, flow="进入好友主页"):
             
             # 收集该好友的能量
             energy_ball = "images/energy_ball.png"
@@ -198,8 +221,7 @@ def collect_friends_energy():
             
             # 返回好友列表
             back_button = "images/back_button.png"
-            if click_if_found(back_button, confidence=0.8, timeout=3):
-                time.sleep(1)
+            click_if_found(back_button, confidence=0.8, timeout=3, settle_wait=1, flow="返回好友列表")
         else:
             break
     
@@ -229,6 +251,7 @@ def main():
     total_energy = collect_energy()
     
     print(f"自动化完成！总共收集了 {total_energy} 个能量球")
+    print(settle_report.summary())
     return True
 
 if __name__ == "__main__":
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+异步多设备 ADB 控制器
+基于 asyncio 直接与 ADB 服务器通信，每台设备一个命令队列：同一设备上的命令按顺序执行，
+不同设备之间并发执行，一台设备的慢命令不会阻塞其他设备；支持每台设备独立限速，
+并通过 gather 将同一操作分发到多台设备
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from adb_client import DEFAULT_HOST, DEFAULT_PORT, ADBConnectionError, ADBError
+from adb_input import InputBatch
+from adb_screencap import decode_screencap
+
+# 读取服务输出时每次读取的最大字节数
+READ_CHUNK = 64 * 1024
+
+
+async def _read_exact(reader: asyncio.StreamReader, size: int) -> bytes:
+    try:
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise ADBConnectionError("连接被关闭")
+
+
+async def _send_request(writer: asyncio.StreamWriter, request: str) -> None:
+    payload = request.encode('utf-8')
+    writer.write(b'%04x' % len(payload) + payload)
+    await writer.drain()
+
+
+async def _check_status(reader: asyncio.StreamReader) -> None:
+    status = await _read_exact(reader, 4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        length = int(await _read_exact(reader, 4), 16)
+        raise ADBError((await _read_exact(reader, length)).decode('utf-8', errors='replace'))
+    raise ADBError(f"未知响应: {status!r}")
+
+
+class RateLimiter:
+    """令牌桶限速器"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: 每秒允许的操作数
+            burst: 允许连续执行的最大操作数
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncADBClient:
+    """ADB 服务器异步客户端"""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ADBConnectionError(f"无法连接ADB服务器 {self.host}:{self.port}: {e}")
+
+    async def _host_query(self, request: str) -> str:
+        reader, writer = await self._connect()
+        try:
+            await _send_request(writer, request)
+            await _check_status(reader)
+            length = int(await _read_exact(reader, 4), 16)
+            return (await _read_exact(reader, length)).decode('utf-8', errors='replace')
+        finally:
+            writer.close()
+
+    async def devices(self) -> List[Tuple[str, str]]:
+        """返回 [(序列号, 状态)]"""
+        devices = []
+        for line in (await self._host_query('host:devices')).splitlines():
+            if '\t' in line:
+                serial, state = line.split('\t', 1)
+                devices.append((serial, state.strip()))
+        return devices
+
+    async def connect(self, address: str) -> str:
+        return await self._host_query(f'host:connect:{address}')
+
+    async def run_service(self, serial: str, service: str, timeout: Optional[float] = None) -> bytes:
+        """在设备上打开服务并读取全部输出
+        Args:
+            serial: 设备序列号
+            service: 服务名，如 'shell:ls'
+            timeout: 等待下一块输出的最长时间（秒），默认使用客户端超时；
+                     按每次读取计算，持续输出的大量数据（如完整的 dumpsys package）不会被截断
+        """
+        timeout = self.timeout if timeout is None else timeout
+        reader, writer = await self._connect()
+        try:
+            await _send_request(writer, f'host:transport:{serial}')
+            await _check_status(reader)
+            await _send_request(writer, service)
+            await _check_status(reader)
+            chunks = []
+            while True:
+                chunk = await asyncio.wait_for(reader.read(READ_CHUNK), timeout)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        except asyncio.TimeoutError:
+            raise ADBError(f"命令超时: {service}")
+        finally:
+            writer.close()
+
+
+class AsyncDeviceController:
+    """单台设备的异步控制器
+    命令进入设备队列，由后台任务按顺序执行
+    """
+
+    def __init__(self, serial: str, client: Optional[AsyncADBClient] = None,
+                 rate_limit: Optional[float] = None, burst: int = 1):
+        """
+        Args:
+            serial: 设备序列号
+            client: 异步 ADB 客户端
+            rate_limit: 每秒最多执行的命令数，None 表示不限速
+            burst: 限速时允许连续执行的命令数
+        """
+        self.serial = serial
+        self.client = client or AsyncADBClient()
+        self.limiter = RateLimiter(rate_limit, burst) if rate_limit else None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.executed = 0
+        self.busy_seconds = 0.0
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        """等待队列中的命令执行完毕后停止"""
+        if self._worker is None:
+            return
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            factory, future = item
+            if future.cancelled():
+                continue
+            if self.limiter is not None:
+                await self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                result = await factory()
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self.executed += 1
+                self.busy_seconds += time.perf_counter() - start
+
+    def submit(self, factory: Callable[[], Awaitable[Any]]) -> 'asyncio.Future':
+        """将操作加入设备队列，返回其结果的 Future"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((factory, future))
+        return future
+
+    async def shell(self, command: str, timeout: Optional[float] = None) -> str:
+        data = await self.submit(lambda: self.client.run_service(self.serial, f'shell:{command}', timeout))
+        return data.decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+    async def exec_out(self, command: str, timeout: Optional[float] = None) -> bytes:
+        return await self.submit(lambda: self.client.run_service(self.serial, f'exec:{command}', timeout))
+
+    async def screenshot(self) -> np.ndarray:
+        """原始截图，解析和颜色转换在线程中完成，不阻塞事件循环"""
+        data = await self.exec_out('screencap')
+        return await asyncio.get_running_loop().run_in_executor(None, decode_screencap, data)
+
+    async def tap(self, x: int, y: int) -> None:
+        await self.shell(f"input tap {int(x)} {int(y)}")
+
+    async def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> None:
+        await self.shell(f"input swipe {int(x1)} {int(y1)} {int(x2)} {int(y2)} {int(duration)}")
+
+    async def run_input_batch(self, batch: InputBatch) -> None:
+        if batch:
+            await self.shell(batch.to_script(), self.client.timeout + batch.delay + len(batch) * 0.5)
+
+    def stats(self) -> dict:
+        return {'executed': self.executed, 'busy_seconds': self.busy_seconds,
+                'queued': self._queue.qsize() if self._queue is not None else 0}
+
+
+class AsyncADBPool:
+    """多设备异步控制器池
+
+    用法:
+        async with AsyncADBPool(rate_limit=5) as pool:
+            await pool.discover()
+            frames = await pool.gather(lambda device: device.screenshot())
+    """
+
+    def __init__(self, serials: Iterable[str] = (), host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 rate_limit: Optional[float] = None, burst: int = 1, timeout: float = 10.0):
+        self.client = AsyncADBClient(host, port, timeout)
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.devices: Dict[str, AsyncDeviceController] = {}
+        for serial in serials:
+            self.add(serial)
+
+    def add(self, serial: str, rate_limit: Optional[float] = None) -> AsyncDeviceController:
+        """添加设备，rate_limit 为该设备单独的限速（默认使用池的限速）"""
+        if serial not in self.devices:
+            self.devices[serial] = AsyncDeviceController(serial, self.client, rate_limit or self.rate_limit,
+                                                         self.burst)
+        return self.devices[serial]
+
+    async def discover(self) -> List[str]:
+        """添加ADB服务器上所有在线设备，返回其序列号"""
+        serials = [serial for serial, state in await self.client.devices() if state == 'device']
+        for serial in serials:
+            self.add(serial)
+        return serials
+
+    def __getitem__(self, serial: str) -> AsyncDeviceController:
+        return self.devices[serial]
+
+    async def gather(self, operation: Callable[[AsyncDeviceController], Awaitable[Any]],
+                     serials: Optional[Iterable[str]] = None,
+                     return_exceptions: bool = True) -> Dict[str, Any]:
+        """在多台设备上并发执行同一操作
+        Args:
+            operation: 接收设备控制器并返回协程的函数
+            serials: 目标设备，默认全部
+            return_exceptions: 为 True 时单台设备的异常作为结果返回，不影响其他设备
+        Returns:
+            {序列号: 结果或异常}
+        """
+        serials = list(self.devices) if serials is None else list(serials)
+        results = await asyncio.gather(*(operation(self.devices[serial]) for serial in serials),
+                                       return_exceptions=return_exceptions)
+        return dict(zip(serials, results))
+
+    async def close(self) -> None:
+        await asyncio.gather(*(device.close() for device in self.devices.values()))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
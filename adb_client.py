@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+ADB 服务器协议客户端
+直接通过套接字与 ADB 服务器（默认 127.0.0.1:5037）通信，无需为每次调用启动 adb 进程
+
+协议格式:
+    请求: 4位十六进制长度 + 请求内容，如 '000Chost:version'
+    响应: 'OKAY' 或 'FAIL' + 4位十六进制长度 + 错误信息
+    设备服务需先发送 host:transport:<序列号> 切换到设备，再发送 shell:/exec:/sync: 等服务，
+    之后连接即为该服务的数据流
+    sync 服务的每个请求为 4字节ID + 4字节小端长度 + 数据
+"""
+
+import socket
+import struct
+import subprocess
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5037
+SYNC_CHUNK = 64 * 1024
+
+
+class ADBError(RuntimeError):
+    """ADB 服务器返回错误或通信失败"""
+
+
+class ADBConnectionError(ADBError):
+    """与 ADB 服务器的连接失败或被关闭"""
+
+
+def _read_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ADBConnectionError("连接被关闭")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _read_all(sock: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = sock.recv(SYNC_CHUNK)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+def _send_request(sock: socket.socket, request: str) -> None:
+    payload = request.encode('utf-8')
+    sock.sendall(b'%04x' % len(payload) + payload)
+
+
+def _read_hex_block(sock: socket.socket) -> bytes:
+    length = int(_read_exact(sock, 4), 16)
+    return _read_exact(sock, length)
+
+
+def _check_status(sock: socket.socket) -> None:
+    status = _read_exact(sock, 4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        raise ADBError(_read_hex_block(sock).decode('utf-8', errors='replace'))
+    raise ADBError(f"未知响应: {status!r}")
+
+
+class SyncConnection:
+    """sync 服务连接（文件传输），可在多次文件操作间复用"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.lock = threading.Lock()
+
+    def _send(self, request_id: bytes, data: bytes) -> None:
+        self.sock.sendall(request_id + struct.pack('<I', len(data)) + data)
+
+    def _read_header(self) -> Tuple[bytes, int]:
+        header = _read_exact(self.sock, 8)
+        request_id, length = header[:4], struct.unpack('<I', header[4:])[0]
+        if request_id == b'FAIL':
+            raise ADBError(_read_exact(self.sock, length).decode('utf-8', errors='replace'))
+        return request_id, length
+
+    def stat(self, path: str) -> Tuple[int, int, int]:
+        """返回 (mode, size, mtime)，文件不存在时 mode 为 0"""
+        with self.lock:
+            self._send(b'STAT', path.encode('utf-8'))
+            response = _read_exact(self.sock, 16)
+            if response[:4] != b'STAT':
+                raise ADBError(f"STAT 响应错误: {response[:4]!r}")
+            return struct.unpack('<III', response[4:])
+
+    def pull(self, path: str) -> bytes:
+        """读取设备文件内容"""
+        with self.lock:
+            self._send(b'RECV', path.encode('utf-8'))
+            chunks = []
+            while True:
+                request_id, length = self._read_header()
+                if request_id == b'DONE':
+                    return b''.join(chunks)
+                if request_id != b'DATA':
+                    raise ADBError(f"RECV 响应错误: {request_id!r}")
+                chunks.append(_read_exact(self.sock, length))
+
+    def push(self, data: bytes, path: str, mode: int = 0o644, mtime: Optional[int] = None) -> None:
+        """写入设备文件"""
+        with self.lock:
+            self._send(b'SEND', f'{path},{mode}'.encode('utf-8'))
+            for offset in range(0, len(data), SYNC_CHUNK):
+                self._send(b'DATA', data[offset:offset + SYNC_CHUNK])
+            mtime = int(time.time()) if mtime is None else mtime
+            self.sock.sendall(b'DONE' + struct.pack('<I', mtime))
+            request_id, length = self._read_header()
+            if request_id != b'OKAY':
+                raise ADBError(f"SEND 响应错误: {request_id!r}")
+
+    def close(self) -> None:
+        try:
+            self.sock.sendall(b'QUIT' + struct.pack('<I', 0))
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ADBClient:
+    """ADB 服务器客户端
+    shell/exec 服务在协议上每条命令占用一个连接（由服务器转发，不启动本地进程），
+    sync 连接按设备缓存复用；需要连续执行命令时配合 ADBShellSession(client=...) 使用常驻会话
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sync: Dict[Optional[str], SyncConnection] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        try:
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise ADBConnectionError(f"无法连接ADB服务器 {self.host}:{self.port}: {e}")
+
+    def _host_query(self, request: str) -> str:
+        """发送 host: 请求并读取带长度前缀的响应"""
+        with self._connect() as sock:
+            try:
+                _send_request(sock, request)
+                _check_status(sock)
+                return _read_hex_block(sock).decode('utf-8', errors='replace')
+            except OSError as e:
+                raise ADBConnectionError(f"请求 {request} 失败: {e}")
+
+    def server_version(self) -> Optional[int]:
+        """ADB 服务器版本，服务器未运行时返回 None"""
+        try:
+            return int(self._host_query('host:version'), 16)
+        except (ADBError, ValueError):
+            return None
+
+    def start_server(self, adb_path: str = 'adb') -> bool:
+        """服务器未运行时通过 adb start-server 启动（仅需一次）"""
+        if self.server_version() is not None:
+            return True
+        try:
+            subprocess.run([adb_path, 'start-server'], capture_output=True, timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return self.server_version() is not None
+
+    def devices(self) -> List[Tuple[str, str]]:
+        """返回 [(序列号, 状态)]，状态如 'device'、'offline'、'unauthorized'"""
+        devices = []
+        for line in self._host_query('host:devices').splitlines():
+            if '\t' in line:
+                serial, state = line.split('\t', 1)
+                devices.append((serial, state.strip()))
+        return devices
+
+    def connect(self, address: str) -> str:
+        """连接网络设备，返回服务器消息（如 'connected to 127.0.0.1:5555'）"""
+        return self._host_query(f'host:connect:{address}')
+
+    def disconnect(self, address: str) -> str:
+        return self._host_query(f'host:disconnect:{address}')
+
+    def open_stream(self, serial: Optional[str], service: str) -> socket.socket:
+        """切换到设备并打开服务，返回服务数据流连接
+        Args:
+            serial: 设备序列号，None 时使用唯一连接的设备
+            service: 服务名，如 'shell:ls'、'exec:screencap'、'sync:'
+        """
+        sock = self._connect()
+        try:
+            _send_request(sock, f'host:transport:{serial}' if serial else 'host:transport-any')
+            _check_status(sock)
+            _send_request(sock, service)
+            _check_status(sock)
+        except (ADBError, OSError) as e:
+            sock.close()
+            if isinstance(e, ADBError):
+                raise
+            raise ADBConnectionError(f"打开服务 {service} 失败: {e}")
+        return sock
+
+    def exec_out(self, serial: Optional[str], command: str, timeout: Optional[float] = None) -> bytes:
+        """执行命令并返回原始二进制输出（exec: 服务，不经过终端转换）"""
+        with self.open_stream(serial, f'exec:{command}') as sock:
+            sock.settimeout(self.timeout if timeout is None else timeout)
+            try:
+                return _read_all(sock)
+            except OSError as e:
+                raise ADBConnectionError(f"读取命令输出失败: {e}")
+
+    def shell(self, serial: Optional[str], command: str, timeout: Optional[float] = None) -> str:
+        """执行 shell 命令并返回文本输出"""
+        with self.open_stream(serial, f'shell:{command}') as sock:
+            sock.settimeout(self.timeout if timeout is None else timeout)
+            try:
+                data = _read_all(sock)
+            except OSError as e:
+                raise ADBConnectionError(f"读取命令输出失败: {e}")
+        return data.decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+    def shell_lines(self, serial: Optional[str], command: str,
+                    timeout: Optional[float] = None) -> Iterator[str]:
+        """执行 shell 命令，按行逐步返回输出（边接收边处理，适合大量输出）"""
+        with self.open_stream(serial, f'shell:{command}') as sock:
+            sock.settimeout(self.timeout if timeout is None else timeout)
+            try:
+                with sock.makefile('rb') as stream:
+                    for raw in stream:
+                        yield raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            except OSError as e:
+                raise ADBConnectionError(f"读取命令输出失败: {e}")
+
+    def sync(self, serial: Optional[str]) -> SyncConnection:
+        """获取设备的 sync 连接（缓存复用）"""
+        with self._lock:
+            connection = self._sync.get(serial)
+            if connection is None:
+                connection = SyncConnection(self.open_stream(serial, 'sync:'))
+                self._sync[serial] = connection
+            return connection
+
+    def _sync_call(self, serial: Optional[str], method: str, *args):
+        """执行 sync 操作，连接失效时丢弃并重建一次"""
+        for attempt in range(2):
+            connection = self.sync(serial)
+            try:
+                return getattr(connection, method)(*args)
+            except (ADBConnectionError, OSError) as e:
+                with self._lock:
+                    if self._sync.get(serial) is connection:
+                        del self._sync[serial]
+                connection.close()
+                if attempt:
+                    raise ADBConnectionError(f"sync 连接失败: {e}")
+
+    def stat(self, serial: Optional[str], path: str) -> Tuple[int, int, int]:
+        return self._sync_call(serial, 'stat', path)
+
+    def pull(self, serial: Optional[str], path: str) -> bytes:
+        return self._sync_call(serial, 'pull', path)
+
+    def push(self, serial: Optional[str], data: bytes, path: str, mode: int = 0o644) -> None:
+        self._sync_call(serial, 'push', data, path, mode)
+
+    def close(self) -> None:
+        """关闭缓存的 sync 连接"""
+        with self._lock:
+            connections, self._sync = list(self._sync.values()), {}
+        for connection in connections:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# 默认客户端
+default_adb_client = ADBClient()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+ADB 批量输入
+将点击、滑动、按键、文本输入和短暂等待组合成一个 shell 脚本，一次发送到设备按顺序执行，
+N 次点击只需一次传输往返（设备端每条 input 命令仍需启动输入进程）
+"""
+
+import shlex
+from typing import List, Union
+
+
+class InputBatch:
+    """输入操作序列
+
+    用法:
+        batch = InputBatch().tap(100, 200).sleep(0.3).swipe(500, 1500, 500, 500).keyevent('KEYCODE_BACK')
+        controller.run_input_batch(batch)
+    """
+
+    def __init__(self):
+        self.steps: List[str] = []
+        self.delay = 0.0
+
+    def tap(self, x: int, y: int) -> 'InputBatch':
+        self.steps.append(f"input tap {int(x)} {int(y)}")
+        return self
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> 'InputBatch':
+        """滑动，duration 为毫秒"""
+        self.steps.append(f"input swipe {int(x1)} {int(y1)} {int(x2)} {int(y2)} {int(duration)}")
+        self.delay += duration / 1000
+        return self
+
+    def keyevent(self, key: Union[int, str]) -> 'InputBatch':
+        """按键，key 为键码（如 4）或名称（如 'KEYCODE_BACK'）"""
+        if isinstance(key, int):
+            key = str(key)
+        elif not key.replace('_', '').isalnum():
+            raise ValueError(f"无效的按键: {key}")
+        self.steps.append(f"input keyevent {key}")
+        return self
+
+    def text(self, text: str) -> 'InputBatch':
+        """输入文本（空格按 input text 的约定转义为 %s）"""
+        self.steps.append(f"input text {shlex.quote(text.replace(' ', '%s'))}")
+        return self
+
+    def sleep(self, seconds: float) -> 'InputBatch':
+        """在设备端等待"""
+        if seconds > 0:
+            self.steps.append(f"sleep {seconds:g}")
+            self.delay += seconds
+        return self
+
+    def taps(self, points, interval: float = 0.0) -> 'InputBatch':
+        """依次点击多个坐标，interval 为两次点击之间的等待秒数"""
+        for index, (x, y) in enumerate(points):
+            if index and interval > 0:
+                self.sleep(interval)
+            self.tap(x, y)
+        return self
+
+    def to_script(self) -> str:
+        """生成按顺序执行的 shell 脚本"""
+        return '\n'.join(self.steps)
+
+    def clear(self) -> None:
+        self.steps.clear()
+        self.delay = 0.0
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __bool__(self) -> bool:
+        return bool(self.steps)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+ADB 原始截图解析
+解析 `adb exec-out screencap`（不带 -p）输出的原始帧缓冲：
+    旧版本: width(u32) height(u32) format(u32) + 像素
+    Android 9+: width(u32) height(u32) format(u32) dataspace(u32) + 像素
+像素数据直接包装为 NumPy 数组（不复制），无需临时文件和 PNG 编解码；
+RawFrame 在原始像素上按区域取视图，只对需要的区域做颜色转换
+"""
+
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+Region = Tuple[int, int, int, int]
+
+# 帧缓冲像素格式 -> (每像素字节数, 转为 BGR 的 cv2 颜色转换码, 转为灰度的转换码)
+PIXEL_FORMATS = {
+    1: (4, cv2.COLOR_RGBA2BGR, cv2.COLOR_RGBA2GRAY),      # RGBA_8888
+    2: (4, cv2.COLOR_RGBA2BGR, cv2.COLOR_RGBA2GRAY),      # RGBX_8888
+    3: (3, cv2.COLOR_RGB2BGR, cv2.COLOR_RGB2GRAY),        # RGB_888
+    4: (2, cv2.COLOR_BGR5652BGR, cv2.COLOR_BGR5652GRAY),  # RGB_565
+    5: (4, cv2.COLOR_BGRA2BGR, cv2.COLOR_BGRA2GRAY),      # BGRA_8888
+}
+
+# 像素格式 -> 原始数据中 B、G、R 通道的下标（RGB_565 需先转换）
+_CHANNEL_INDEX = {
+    1: {'b': 2, 'g': 1, 'r': 0},
+    2: {'b': 2, 'g': 1, 'r': 0},
+    3: {'b': 2, 'g': 1, 'r': 0},
+    5: {'b': 0, 'g': 1, 'r': 2},
+}
+
+
+class ScreencapFormatError(ValueError):
+    """原始截图数据无法解析"""
+
+
+def parse_screencap(data: bytes) -> Tuple[np.ndarray, int]:
+    """解析原始截图，返回像素数组视图（不复制数据）
+    Args:
+        data: screencap 原始输出
+    Returns:
+        (pixels, pixel_format)，pixels 形状为 (height, width, channels)，
+        RGB_565 时为 (height, width, 2)
+    """
+    if len(data) < 12:
+        raise ScreencapFormatError(f"截图数据过短: {len(data)} 字节")
+    width, height, pixel_format = struct.unpack_from('<III', data, 0)
+    if pixel_format not in PIXEL_FORMATS:
+        raise ScreencapFormatError(f"不支持的像素格式: {pixel_format}")
+    bpp = PIXEL_FORMATS[pixel_format][0]
+    size = width * height * bpp
+    # 根据数据长度判断头部是否包含 dataspace 字段
+    for header_size in (16, 12):
+        if len(data) >= header_size + size:
+            break
+    else:
+        raise ScreencapFormatError(f"截图数据不完整: {width}x{height} 需要 {size} 字节，实际 {len(data) - 12} 字节")
+    pixels = np.frombuffer(data, dtype=np.uint8, count=size, offset=header_size)
+    return pixels.reshape(height, width, bpp), pixel_format
+
+
+def raw_to_bgr(pixels: np.ndarray, pixel_format: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """将原始像素转换为 BGR 图像
+    Args:
+        pixels: parse_screencap 返回的像素数组
+        pixel_format: 像素格式
+        out: 可选的输出缓冲区
+    """
+    code = PIXEL_FORMATS[pixel_format][1]
+    return cv2.cvtColor(pixels, code, dst=out)
+
+
+def clip_region(region: Region, width: int, height: int) -> Tuple[int, int, int, int]:
+    """将区域裁剪到画面内，返回 (x0, y0, x1, y1)"""
+    x, y, w, h = region
+    x0, y0 = min(max(0, int(x)), width), min(max(0, int(y)), height)
+    x1, y1 = max(x0, min(width, int(x + w))), max(y0, min(height, int(y + h)))
+    return x0, y0, x1, y1
+
+
+class RawFrame:
+    """原始截图帧
+    保存 screencap 原始数据上的像素视图，按区域裁剪时只取跨步视图（不复制内存），
+    颜色转换只作用于请求的区域
+    """
+
+    def __init__(self, pixels: np.ndarray, pixel_format: int):
+        self.pixels = pixels
+        self.pixel_format = pixel_format
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RawFrame':
+        return cls(*parse_screencap(data))
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(width, height)"""
+        return self.pixels.shape[1], self.pixels.shape[0]
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        """转换为 BGR 后的形状，与普通截图一致"""
+        return self.pixels.shape[0], self.pixels.shape[1], 3
+
+    def roi(self, region: Optional[Region] = None) -> np.ndarray:
+        """返回区域内原始像素的视图（不复制）
+        Args:
+            region: (x, y, width, height)，超出画面的部分被裁掉；None 表示整帧
+        """
+        if region is None:
+            return self.pixels
+        x0, y0, x1, y1 = clip_region(region, *self.size)
+        return self.pixels[y0:y1, x0:x1]
+
+    def convert(self, color_mode: str = 'bgr', region: Optional[Region] = None) -> np.ndarray:
+        """将区域转换为指定颜色模式
+        Args:
+            color_mode: 'bgr'、'gray'、'b'、'g'、'r'
+            region: (x, y, width, height)，None 表示整帧
+        """
+        pixels = self.roi(region)
+        _, bgr_code, gray_code = PIXEL_FORMATS[self.pixel_format]
+        if color_mode == 'bgr':
+            return cv2.cvtColor(pixels, bgr_code)
+        if color_mode == 'gray':
+            return cv2.cvtColor(pixels, gray_code)
+        if color_mode in ('b', 'g', 'r'):
+            channels = _CHANNEL_INDEX.get(self.pixel_format)
+            if channels is None:
+                return cv2.extractChannel(cv2.cvtColor(pixels, bgr_code), 'bgr'.index(color_mode))
+            return cv2.extractChannel(pixels, channels[color_mode])
+        raise ValueError(f"未知的颜色模式: {color_mode}")
+
+    def to_bgr(self, region: Optional[Region] = None) -> np.ndarray:
+        return self.convert('bgr', region)
+
+    def to_gray(self, region: Optional[Region] = None) -> np.ndarray:
+        return self.convert('gray', region)
+
+
+def decode_screencap(data: bytes) -> np.ndarray:
+    """解析原始截图并转换为 BGR 图像"""
+    pixels, pixel_format = parse_screencap(data)
+    return raw_to_bgr(pixels, pixel_format)
+
+
+def encode_screencap(image: np.ndarray, pixel_format: int = 1, dataspace: Optional[int] = 0) -> bytes:
+    """将 BGR 图像编码为 screencap 原始格式（用于模拟设备输出和基准测试）
+    Args:
+        image: BGR 图像
+        pixel_format: 目标像素格式，支持 1 (RGBA_8888) 和 5 (BGRA_8888)
+        dataspace: 头部 dataspace 字段，None 时生成旧版 12 字节头部
+    """
+    height, width = image.shape[:2]
+    if pixel_format == 5:
+        pixels = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    elif pixel_format == 1:
+        pixels = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+    else:
+        raise ScreencapFormatError(f"不支持编码的像素格式: {pixel_format}")
+    header = struct.pack('<III', width, height, pixel_format)
+    if dataspace is not None:
+        header += struct.pack('<I', dataspace)
+    return header + pixels.tobytes()
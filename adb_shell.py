@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+常驻 ADB shell 会话
+每台设备保持一个长期运行的 `adb shell` 进程，命令通过 stdin 发送，
+每条命令后追加带唯一标记的 echo 以分隔输出并取得退出码，避免每条命令都启动新进程
+"""
+
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from adb_client import ADBClient, ADBError
+
+
+class ADBShellError(RuntimeError):
+    """shell 会话出错（进程退出、连接断开等）"""
+
+
+class ADBShellTimeout(ADBShellError):
+    """命令执行超时"""
+
+
+class ADBShellSession:
+    """常驻 shell 会话
+    进程退出或写入失败时自动重新启动；命令超时后会话状态未知，结束进程并在下次调用时重建
+    提供 client 时直接通过 ADB 服务器的 'shell:sh' 数据流通信，不启动本地 adb 进程
+    """
+
+    def __init__(self, adb_path: str = "adb", device: Optional[str] = None, timeout: float = 10.0,
+                 command: Optional[List[str]] = None, client: Optional[ADBClient] = None):
+        """
+        Args:
+            adb_path: adb 可执行文件路径
+            device: 设备序列号，如 '127.0.0.1:5555'
+            timeout: 默认命令超时（秒）
+            command: 自定义启动命令（默认 adb -s <device> shell），如本地测试时使用 ['sh']
+            client: ADB 服务器客户端，提供时通过套接字打开会话
+        """
+        if command is None:
+            command = [adb_path] + (["-s", device] if device else []) + ["shell"]
+        self.command = command
+        self.device = device
+        self.client = client
+        self.timeout = timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._socket = None
+        self._stdin = None
+        self._eof = threading.Event()
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._marker = f"__ADB_SHELL_{os.getpid()}_{id(self):x}"
+        self._sequence = 0
+        self._started = False
+        self.commands = 0
+        self.restarts = 0
+
+    def alive(self) -> bool:
+        """会话是否在运行"""
+        if self._stdin is None or self._eof.is_set():
+            return False
+        return self._process is None or self._process.poll() is None
+
+    def _start(self) -> None:
+        if self._started:
+            self.restarts += 1
+        self._started = True
+        self._kill()
+        self._lines = queue.Queue()
+        self._eof = threading.Event()
+        if self.client is not None:
+            try:
+                # 带命令的 shell 服务不分配终端，输入不会被回显
+                self._socket = self.client.open_stream(self.device, 'shell:sh')
+            except ADBError as e:
+                raise ADBShellError(f"无法打开shell会话: {e}")
+            self._socket.settimeout(None)
+            self._stdin = self._socket.makefile('wb', buffering=0)
+            stdout = self._socket.makefile('rb')
+        else:
+            self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                             stderr=subprocess.DEVNULL, bufsize=0)
+            self._stdin = self._process.stdin
+            stdout = self._process.stdout
+        reader = threading.Thread(target=self._read_loop, args=(stdout, self._lines, self._eof), daemon=True)
+        reader.start()
+
+    @staticmethod
+    def _read_loop(stdout, lines: "queue.Queue[Optional[str]]", eof: threading.Event) -> None:
+        """后台读取输出行，会话结束时放入 None
+        输出流由本线程在读到结束后关闭：若由其他线程提前关闭，文件描述符可能被新会话的管道复用，
+        本线程的下一次读取就会读走新会话的输出
+        """
+        try:
+            for raw in iter(stdout.readline, b''):
+                lines.put(raw.decode('utf-8', errors='replace').rstrip('\r\n'))
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                stdout.close()
+            except Exception:
+                pass
+        eof.set()
+        lines.put(None)
+
+    def _kill(self) -> None:
+        process, self._process = self._process, None
+        sock, self._socket = self._socket, None
+        stdin, self._stdin = self._stdin, None
+        if process is not None:
+            try:
+                process.kill()
+                process.wait(timeout=2)
+            except Exception:
+                pass
+        if sock is not None:
+            try:
+                # 唤醒阻塞在读取上的后台线程
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        # 进程的输出流由读取线程关闭（进程结束后读取线程会读到 EOF）
+        streams = [stdin, sock]
+        for stream in streams:
+            try:
+                if stream is not None:
+                    stream.close()
+            except Exception:
+                pass
+
+    def run(self, command: str, timeout: Optional[float] = None) -> Tuple[int, str]:
+        """执行一条 shell 命令
+        Args:
+            command: shell 命令（不要从 stdin 读取数据）
+            timeout: 超时秒数，默认使用会话超时
+        Returns:
+            (退出码, 输出)，输出包含 stderr
+        Raises:
+            ADBShellTimeout: 命令超时
+            ADBShellError: 会话断开
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._sequence += 1
+            sentinel = f"{self._marker}_{self._sequence}__"
+            payload = f"{{ {command}\n}} 2>&1\necho {sentinel} $?\n".encode('utf-8')
+            # 命令尚未发出时写入失败可安全重试一次
+            for attempt in range(2):
+                if not self.alive():
+                    self._start()
+                try:
+                    self._stdin.write(payload)
+                    self._stdin.flush()
+                    break
+                except OSError:
+                    self._kill()
+                    if attempt:
+                        raise ADBShellError("无法写入shell会话")
+            self.commands += 1
+            return self._collect(sentinel, time.monotonic() + timeout)
+
+    def _collect(self, sentinel: str, deadline: float) -> Tuple[int, str]:
+        output = []
+        lines = self._lines
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                line = lines.get(timeout=max(remaining, 0)) if remaining > 0 else lines.get_nowait()
+            except queue.Empty:
+                self._kill()
+                raise ADBShellTimeout("命令执行超时")
+            if line is None:
+                self._kill()
+                raise ADBShellError("shell会话已断开")
+            index = line.find(sentinel)
+            if index < 0:
+                output.append(line)
+                continue
+            # 命令输出末尾没有换行时标记会接在同一行
+            if index:
+                output.append(line[:index])
+            try:
+                code = int(line[index + len(sentinel):].strip())
+            except ValueError:
+                code = -1
+            return code, '\n'.join(output)
+
+    def close(self) -> None:
+        """结束会话进程"""
+        with self._lock:
+            if self.alive():
+                try:
+                    self._stdin.write(b"exit\n")
+                    self._stdin.flush()
+                    if self._process is not None:
+                        self._process.wait(timeout=1)
+                except Exception:
+                    pass
+            self._kill()
+
+    def stats(self) -> dict:
+        return {'commands': self.commands, 'restarts': self.restarts, 'alive': self.alive()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
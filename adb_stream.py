@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+ADB 屏幕视频流
+通过 exec-out 读取 `screenrecord --output-format=h264 -` 输出的视频流，后台线程解码后写入
+环形缓冲区，提供与 CaptureThread 相同的最新帧接口（latest / wait_newer / stats）。
+screenrecord 只在画面变化时输出新帧，且单次录制有时长上限，结束后自动重新启动
+
+H.264 解码依赖 PyAV（pip install av），未安装时无法启动视频流
+"""
+
+import socket
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from adb_client import ADBClient, default_adb_client
+from screen_capture import FrameRingBuffer
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+def screenrecord_command(bit_rate: int = 4_000_000, size: Optional[Tuple[int, int]] = None,
+                         time_limit: int = 180) -> str:
+    """生成 screenrecord 命令
+    Args:
+        bit_rate: 码率（bit/s）
+        size: 输出尺寸 (width, height)，None 时使用设备分辨率
+        time_limit: 单次录制时长上限（秒），多数系统最大为180
+    """
+    command = f"screenrecord --output-format=h264 --bit-rate {int(bit_rate)} --time-limit {int(time_limit)}"
+    if size:
+        command += f" --size {int(size[0])}x{int(size[1])}"
+    return command + " -"
+
+
+class ScreenRecordStream:
+    """screenrecord 视频流截图源"""
+
+    def __init__(self, serial: Optional[str] = None, client: Optional[ADBClient] = None,
+                 bit_rate: int = 4_000_000, size: Optional[Tuple[int, int]] = None,
+                 slots: int = 3, restart_delay: float = 0.5, read_size: int = 64 * 1024):
+        """
+        Args:
+            serial: 设备序列号，None 时使用唯一连接的设备
+            client: ADB 服务器客户端
+            bit_rate: 码率（bit/s），越低带宽越小但画质越差
+            size: 输出尺寸 (width, height)，缩小尺寸可降低编码和解码耗时
+            slots: 环形缓冲区槽位数
+            restart_delay: 录制结束或出错后重新启动前的等待（秒）
+            read_size: 每次从连接读取的字节数
+        """
+        self.serial = serial
+        self.client = client or default_adb_client
+        self.bit_rate = bit_rate
+        self.size = size
+        self.restart_delay = restart_delay
+        self.read_size = read_size
+        self.buffer = FrameRingBuffer(slots)
+        self.errors = 0
+        self.restarts = 0
+        # 连续失败（出错或没有输出任何帧）的录制次数，收到新帧时清零
+        self.consecutive_failures = 0
+        self.bytes_received = 0
+        self.decode_seconds = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sock = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def healthy(self) -> bool:
+        """线程在运行且最近一次录制没有失败
+        录制反复失败、线程不断重启时 running 仍为 True，但缓冲区里只有失败前的旧帧，不应再使用
+        """
+        return self.running and self.consecutive_failures == 0
+
+    def start(self) -> 'ScreenRecordStream':
+        """启动视频流线程"""
+        if av is None:
+            raise RuntimeError("视频流解码需要安装 PyAV: pip install av")
+        if not self.running:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='screenrecord', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """停止视频流线程"""
+        self._stop_event.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                # 唤醒阻塞在读取上的线程
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        command = screenrecord_command(self.bit_rate, self.size)
+        started = False
+        while not self._stop_event.is_set():
+            if started:
+                self.restarts += 1
+            started = True
+            frames = self.buffer.count
+            try:
+                self._stream_once(command)
+                failed = self.buffer.count == frames
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+                self.errors += 1
+                failed = True
+                print(f"视频流出错: {e}")
+            if failed:
+                self.consecutive_failures += 1
+            self._stop_event.wait(self.restart_delay)
+
+    def _stream_once(self, command: str) -> None:
+        """读取一次 screenrecord 输出直到结束"""
+        codec = av.CodecContext.create('h264', 'r')
+        try:
+            # 按片并行解码，不引入帧级延迟
+            codec.thread_type = 'SLICE'
+        except (AttributeError, ValueError):
+            pass
+        self._sock = self.client.open_stream(self.serial, f'exec:{command}')
+        self._sock.settimeout(None)
+        try:
+            while not self._stop_event.is_set():
+                data = self._sock.recv(self.read_size)
+                if not data:
+                    break
+                self.bytes_received += len(data)
+                self._decode(codec, data)
+            # 输出剩余帧
+            self._decode(codec, None)
+        finally:
+            sock, self._sock = self._sock, None
+            sock.close()
+
+    def _decode(self, codec, data: Optional[bytes]) -> None:
+        start = time.perf_counter()
+        for packet in codec.parse(data):
+            for frame in codec.decode(packet):
+                image = frame.to_ndarray(format='bgr24')
+                np.copyto(self.buffer.next_slot(image.shape, image.dtype), image)
+                self.buffer.publish(time.monotonic())
+                self.consecutive_failures = 0
+        self.decode_seconds += time.perf_counter() - start
+
+    def latest(self, copy: bool = False) -> Optional[Tuple[np.ndarray, float]]:
+        """非阻塞获取最新帧（BGR），见 FrameRingBuffer.latest"""
+        return self.buffer.latest(copy)
+
+    def wait_newer(self, timestamp: float, timeout: Optional[float] = None,
+                   copy: bool = False) -> Optional[Tuple[np.ndarray, float]]:
+        """等待比 timestamp 更新的帧（BGR），见 FrameRingBuffer.wait_newer"""
+        return self.buffer.wait_newer(timestamp, timeout, copy)
+
+    def stats(self) -> dict:
+        """获取解码帧数、出错和重启次数、接收字节数与平均解码耗时"""
+        frames = self.buffer.count
+        return {
+            'frames': frames,
+            'errors': self.errors,
+            'restarts': self.restarts,
+            'consecutive_failures': self.consecutive_failures,
+            'bytes_received': self.bytes_received,
+            'avg_decode_seconds': self.decode_seconds / frames if frames else 0.0,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Android 控件定位
+通过 exec-out 读取 `uiautomator dump /dev/tty` 输出的控件树，边接收边解析为按文本、resource-id
+和 content-desc 建立的索引，直接返回控件中心坐标用于点击，无需截图和模板匹配。
+控件树在前台窗口（Activity 或弹窗）变化前一直缓存复用，查询窗口焦点只需一条 dumpsys 命令，
+比重新 dump 快得多
+"""
+
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+from adb_client import ADBClient, default_adb_client
+
+DUMP_COMMAND = "uiautomator dump /dev/tty"
+# 当前焦点窗口与前台 Activity，任一变化时重新 dump
+FOCUS_COMMAND = "dumpsys window 2>/dev/null | grep -E 'mCurrentFocus|mFocusedApp' || true"
+
+_BOUNDS_PATTERN = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+_ROOT_START = b'<hierarchy'
+_ROOT_END = b'</hierarchy>'
+
+
+class UIDumpError(RuntimeError):
+    """控件树获取或解析失败"""
+
+
+class UINode:
+    """控件树中的一个节点"""
+
+    __slots__ = ('text', 'resource_id', 'content_desc', 'class_name', 'package', 'bounds',
+                 'clickable', 'enabled')
+
+    def __init__(self, text: str, resource_id: str, content_desc: str, class_name: str, package: str,
+                 bounds: Tuple[int, int, int, int], clickable: bool = False, enabled: bool = True):
+        self.text = text
+        self.resource_id = resource_id
+        self.content_desc = content_desc
+        self.class_name = class_name
+        self.package = package
+        self.bounds = bounds
+        self.clickable = clickable
+        self.enabled = enabled
+
+    @classmethod
+    def from_attributes(cls, attrs: Dict[str, str]) -> 'UINode':
+        match = _BOUNDS_PATTERN.match(attrs.get('bounds', ''))
+        bounds = tuple(int(v) for v in match.groups()) if match else (0, 0, 0, 0)
+        return cls(attrs.get('text', ''), attrs.get('resource-id', ''), attrs.get('content-desc', ''),
+                   attrs.get('class', ''), attrs.get('package', ''), bounds,
+                   attrs.get('clickable') == 'true', attrs.get('enabled', 'true') == 'true')
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        x1, y1, x2, y2 = self.bounds
+        return ((x1 + x2) // 2, (y1 + y2) // 2)
+
+    @property
+    def visible(self) -> bool:
+        x1, y1, x2, y2 = self.bounds
+        return x2 > x1 and y2 > y1
+
+    def __repr__(self):
+        label = self.text or self.content_desc or self.resource_id or self.class_name
+        return f"UINode({label!r}, bounds={self.bounds})"
+
+
+class UIIndex:
+    """控件索引：按文本、resource-id（完整或去掉包名前缀的短 id）和 content-desc 查找"""
+
+    def __init__(self, nodes: Iterable[UINode] = ()):
+        self.nodes: List[UINode] = []
+        self.by_text: Dict[str, List[UINode]] = {}
+        self.by_resource_id: Dict[str, List[UINode]] = {}
+        self.by_desc: Dict[str, List[UINode]] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: UINode) -> None:
+        self.nodes.append(node)
+        if node.text:
+            self.by_text.setdefault(node.text, []).append(node)
+        if node.resource_id:
+            self.by_resource_id.setdefault(node.resource_id, []).append(node)
+            short_id = node.resource_id.split(':id/', 1)[-1]
+            if short_id != node.resource_id:
+                self.by_resource_id.setdefault(short_id, []).append(node)
+        if node.content_desc:
+            self.by_desc.setdefault(node.content_desc, []).append(node)
+
+    def find(self, text: Optional[str] = None, resource_id: Optional[str] = None,
+             desc: Optional[str] = None, contains: bool = False) -> List[UINode]:
+        """查找同时满足所有给定条件的可见控件
+        Args:
+            text: 控件文本
+            resource_id: 完整 id（如 'com.xx:id/title'）或短 id（如 'title'）
+            desc: content-desc
+            contains: 为 True 时文本和 desc 按包含匹配（需遍历全部节点），否则精确匹配走索引
+        """
+        if text is None and resource_id is None and desc is None:
+            return []
+        if contains:
+            candidates = self.by_resource_id.get(resource_id, []) if resource_id is not None else self.nodes
+            result = [node for node in candidates
+                      if (text is None or text in node.text) and (desc is None or desc in node.content_desc)]
+        else:
+            candidate_lists = []
+            if text is not None:
+                candidate_lists.append(self.by_text.get(text, []))
+            if resource_id is not None:
+                candidate_lists.append(self.by_resource_id.get(resource_id, []))
+            if desc is not None:
+                candidate_lists.append(self.by_desc.get(desc, []))
+            # 从最短的候选列表出发，其余条件用集合判断
+            candidate_lists.sort(key=len)
+            others = [set(map(id, nodes)) for nodes in candidate_lists[1:]]
+            result = [node for node in candidate_lists[0] if all(id(node) in other for other in others)]
+        return [node for node in result if node.visible]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+def parse_ui_dump(chunks: Iterable[bytes]) -> UIIndex:
+    """边接收边解析 uiautomator dump 输出
+    输出前后可能夹带提示文字（如 'UI hierchary dumped to: /dev/tty'），只解析 <hierarchy> 部分
+    Args:
+        chunks: 输出数据块
+    Raises:
+        UIDumpError: 输出中没有完整的控件树
+    """
+    parser = XMLPullParser(events=('start',))
+    index = UIIndex()
+    started = finished = False
+    pending = b''
+    try:
+        for chunk in chunks:
+            data = pending + chunk
+            if not started:
+                start = data.find(_ROOT_START)
+                if start < 0:
+                    # 保留可能被截断的开头标记
+                    pending = data[-len(_ROOT_START):]
+                    continue
+                data, started = data[start:], True
+            end = data.find(_ROOT_END)
+            if end >= 0:
+                data, finished = data[:end + len(_ROOT_END)], True
+                pending = b''
+            else:
+                # 结束标记可能跨数据块，留到下一块一起判断
+                data, pending = data[:-len(_ROOT_END)], data[-len(_ROOT_END):]
+            parser.feed(data)
+            for _, element in parser.read_events():
+                if element.tag == 'node':
+                    index.add(UINode.from_attributes(element.attrib))
+            if finished:
+                break
+        if not finished:
+            raise UIDumpError("未获取到完整的控件树")
+        parser.close()
+    except ParseError as e:
+        raise UIDumpError(f"解析控件树失败: {e}")
+    return index
+
+
+class UILocator:
+    """带缓存的控件定位器
+
+    用法:
+        locator = UILocator('127.0.0.1:5555')
+        pos = locator.find(text='蚂蚁森林')
+        if pos:
+            controller.tap(*pos)
+    """
+
+    def __init__(self, serial: Optional[str] = None, client: Optional[ADBClient] = None,
+                 shell: Optional[Callable[[str], Optional[str]]] = None, dump_timeout: float = 15.0):
+        """
+        Args:
+            serial: 设备序列号，None 时使用唯一连接的设备
+            client: ADB 服务器客户端
+            shell: 查询窗口焦点用的 shell 函数（如控制器的常驻会话），默认通过 client 执行
+            dump_timeout: dump 控件树的超时（秒）
+        """
+        self.serial = serial
+        self.client = client or default_adb_client
+        self._shell = shell
+        self.dump_timeout = dump_timeout
+        self._index: Optional[UIIndex] = None
+        self._signature: Optional[str] = None
+        self.dumps = 0
+        self.cache_hits = 0
+        self.dump_seconds = 0.0
+
+    def window_signature(self) -> str:
+        """当前焦点窗口和前台 Activity 的描述"""
+        if self._shell is not None:
+            output = self._shell(FOCUS_COMMAND)
+        else:
+            output = self.client.shell(self.serial, FOCUS_COMMAND)
+        return ' '.join((output or '').split())
+
+    def dump(self) -> UIIndex:
+        """重新 dump 控件树并更新缓存"""
+        start = time.perf_counter()
+        sock = self.client.open_stream(self.serial, f'exec:{DUMP_COMMAND}')
+        try:
+            sock.settimeout(self.dump_timeout)
+            try:
+                self._index = parse_ui_dump(iter(lambda: sock.recv(64 * 1024), b''))
+            except OSError as e:
+                raise UIDumpError(f"读取控件树失败: {e}")
+        finally:
+            sock.close()
+        self.dumps += 1
+        self.dump_seconds += time.perf_counter() - start
+        return self._index
+
+    def index(self, refresh: bool = False) -> UIIndex:
+        """获取控件索引，窗口未变化时直接返回缓存
+        Args:
+            refresh: 强制重新 dump（同一窗口内内容变化时使用）
+        """
+        signature = self.window_signature()
+        if refresh or self._index is None or signature != self._signature:
+            self._signature = None
+            self.dump()
+            self._signature = signature
+        else:
+            self.cache_hits += 1
+        return self._index
+
+    def invalidate(self) -> None:
+        """丢弃缓存，下次查询时重新 dump"""
+        self._index = None
+        self._signature = None
+
+    def find_all(self, text: Optional[str] = None, resource_id: Optional[str] = None,
+                 desc: Optional[str] = None, contains: bool = False, refresh: bool = False) -> List[UINode]:
+        """查找所有匹配控件，条件含义见 UIIndex.find"""
+        return self.index(refresh).find(text, resource_id, desc, contains)
+
+    def find(self, text: Optional[str] = None, resource_id: Optional[str] = None,
+             desc: Optional[str] = None, contains: bool = False,
+             refresh: bool = False) -> Optional[Tuple[int, int]]:
+        """查找控件并返回点击坐标，多个匹配时优先可点击的控件
+        Returns:
+            控件中心坐标，未找到时返回 None
+        """
+        nodes = self.find_all(text, resource_id, desc, contains, refresh)
+        if not nodes:
+            return None
+        nodes.sort(key=lambda node: not (node.clickable and node.enabled))
+        return nodes[0].center
+
+    def wait_for(self, text: Optional[str] = None, resource_id: Optional[str] = None,
+                 desc: Optional[str] = None, contains: bool = False, timeout: float = 10.0,
+                 interval: float = 0.5) -> Optional[Tuple[int, int]]:
+        """等待控件出现，第一次查询可使用缓存，之后每次重新 dump
+        Returns:
+            控件中心坐标，超时返回 None
+        """
+        deadline = time.monotonic() + timeout
+        refresh = False
+        while True:
+            pos = self.find(text, resource_id, desc, contains, refresh)
+            if pos is not None or time.monotonic() >= deadline:
+                return pos
+            refresh = True
+            time.sleep(interval)
+
+    def stats(self) -> dict:
+        """获取 dump 次数、缓存命中次数和平均 dump 耗时"""
+        return {
+            'dumps': self.dumps,
+            'cache_hits': self.cache_hits,
+            'avg_dump_seconds': self.dump_seconds / self.dumps if self.dumps else 0.0,
+        }
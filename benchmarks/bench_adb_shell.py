@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+ADB 输入命令基准测试
+对比每条命令启动一个 adb 进程与常驻 shell 会话的每秒点击数
+
+用法:
+    python benchmarks/bench_adb_shell.py --device 127.0.0.1:5555 --taps 50
+    python benchmarks/bench_adb_shell.py --local
+      （无设备时用本地 sh 代替 adb shell，只测量进程启动与会话通信开销）
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from adb_shell import ADBShellSession
+
+
+def run(adb_path: str, device: str, taps: int, local: bool) -> None:
+    if local:
+        spawn_prefix = ['sh', '-c']
+        session = ADBShellSession(command=['sh'])
+        tap_command = 'true'
+    else:
+        spawn_prefix = [adb_path, '-s', device, 'shell']
+        session = ADBShellSession(adb_path, device)
+        # 点击屏幕左上角空白处
+        tap_command = 'input tap 1 1'
+
+    results = []
+    start = time.perf_counter()
+    for _ in range(taps):
+        subprocess.run(spawn_prefix + [tap_command], capture_output=True)
+    results.append(('每条命令启动进程', time.perf_counter() - start))
+
+    with session:
+        # 预先启动会话，不计入耗时
+        session.run('true')
+        start = time.perf_counter()
+        for _ in range(taps):
+            session.run(tap_command)
+        results.append(('常驻shell会话', time.perf_counter() - start))
+
+    target = '本地 sh' if local else device
+    print(f"目标: {target}  点击次数: {taps}")
+    print(f"{'方式':<16} {'每次耗时(ms)':>12} {'每秒点击':>10}")
+    for name, seconds in results:
+        print(f"{name:<16} {seconds / taps * 1000:>12.1f} {taps / seconds:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ADB 输入命令基准测试')
+    parser.add_argument('--adb', default='adb', help='adb 可执行文件路径')
+    parser.add_argument('--device', default='127.0.0.1:5555')
+    parser.add_argument('--taps', type=int, default=50)
+    parser.add_argument('--local', action='store_true', help='使用本地 sh 代替设备')
+    args = parser.parse_args()
+    run(args.adb, args.device, args.taps, args.local)
+
+
+if __name__ == '__main__':
+    main()
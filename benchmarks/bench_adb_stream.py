@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+ADB 截图方式基准测试
+对比 screencap 轮询（LeiDianADBController.get_screenshot）与 screenrecord 视频流的
+端到端帧延迟和吞吐量
+
+用法:
+    python benchmarks/bench_adb_stream.py --fake --size 720x1280 --fps 30
+      （模拟ADB服务器：设备画面按帧率切换，帧序号编码在画面中，
+        延迟 = 帧被读取的时间 - 该帧出现在设备屏幕上的时间；
+        --screencap-delay 模拟设备端截图耗时）
+    python benchmarks/bench_adb_stream.py --device 127.0.0.1:5555 --tap 100 200
+      （真实设备：吞吐量为每秒得到的新帧数；指定 --tap 时测量点击后首个变化帧的到达延迟，
+        点击位置应能引起画面变化）
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ZFB_MUMU'))
+from adb_client import ADBClient
+from adb_screencap import encode_screencap
+from adb_stream import ScreenRecordStream, av
+from alipay_forest_adb import LeiDianADBController
+from benchmarks.synthetic import make_screen, read_index, stamp_index
+from fake_adb_server import FakeADBServer, FakeDevice
+from screen_change import frame_signature, signature_difference
+
+
+def encode_frames(width: int, height: int, count: int, fps: int, bit_rate: int):
+    """生成带帧序号的合成画面并编码为 H.264 (Annex B)"""
+    encoder = av.CodecContext.create('libx264', 'w')
+    encoder.width, encoder.height = width, height
+    encoder.pix_fmt = 'yuv420p'
+    encoder.bit_rate = bit_rate
+    encoder.framerate = fps
+    encoder.options = {'preset': 'ultrafast', 'tune': 'zerolatency'}
+    base = make_screen(width, height)
+    frames, packets = [], []
+    for index in range(count):
+        frame = base.copy()
+        # 移动的方块，模拟画面变化
+        x = (index * 17) % max(1, width - 80)
+        cv2.rectangle(frame, (x, height // 2), (x + 80, height // 2 + 80), (0, 0, 255), -1)
+        stamp_index(frame, index)
+        frames.append(frame)
+        video_frame = av.VideoFrame.from_ndarray(frame, format='bgr24')
+        packets.append(b''.join(bytes(p) for p in encoder.encode(video_frame)))
+    tail = b''.join(bytes(p) for p in encoder.encode(None))
+    packets[-1] += tail
+    return frames, packets
+
+
+def report(name: str, frames: int, seconds: float, latencies) -> None:
+    if latencies:
+        latencies = sorted(latencies)
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0] * 1000
+        latency_text = f"{p50:>10.1f} {p95:>10.1f}"
+    else:
+        latency_text = f"{'-':>10} {'-':>10}"
+    print(f"{name:<12} {frames / seconds:>10.1f} {latency_text}")
+
+
+def run_fake(width: int, height: int, fps: int, seconds: float, bit_rate: int,
+             screencap_delay: float) -> None:
+    count = int(fps * seconds)
+    frames, packets = encode_frames(width, height, count, fps, bit_rate)
+    # 每帧在"设备屏幕"上出现的时间
+    shown_at = {}
+    current = {'index': 0}
+
+    def play():
+        """按帧率切换设备画面，生成器逐帧返回帧序号"""
+        start = time.monotonic()
+        for index in range(count):
+            delay = start + index / fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            shown_at[index] = time.monotonic()
+            current['index'] = index
+            yield index
+
+    def screenrecord(command):
+        for index in play():
+            yield packets[index]
+
+    def screencap(command):
+        # 设备在收到命令时截取画面，编码和传输耗时之后才返回
+        data = encode_screencap(frames[current['index']])
+        time.sleep(screencap_delay)
+        return data
+
+    def measure(get_frame):
+        """持续取帧，统计不同帧的数量及每帧从出现到被读取的延迟"""
+        latencies, seen = [], set()
+        start = time.monotonic()
+        while time.monotonic() - start < seconds + 1 and len(seen) < count:
+            item = get_frame()
+            if item is None:
+                continue
+            frame, received = item
+            index = read_index(frame)
+            if index in shown_at and index not in seen:
+                seen.add(index)
+                latencies.append(received - shown_at[index])
+        return len(seen), time.monotonic() - start, latencies
+
+    with FakeADBServer() as server:
+        server.add_device(FakeDevice('fake', handlers={'screenrecord': screenrecord, 'screencap': screencap}))
+        client = server.client()
+        print(f"模拟设备  画面: {width}x{height}  帧率: {fps}  时长: {seconds}s  码率: {bit_rate}  "
+              f"screencap耗时: {screencap_delay * 1000:.0f}ms")
+        print(f"{'方式':<12} {'每秒新帧':>10} {'延迟P50(ms)':>10} {'延迟P95(ms)':>10}")
+
+        # 视频流
+        with ScreenRecordStream('fake', client, bit_rate=bit_rate) as stream:
+            state = {'timestamp': 0.0}
+
+            def next_stream_frame():
+                item = stream.wait_newer(state['timestamp'], timeout=1.0)
+                if item is not None:
+                    state['timestamp'] = item[1]
+                return item
+
+            report('screenrecord', *measure(next_stream_frame))
+
+        # screencap 轮询：后台按帧率切换画面，截图返回调用时的当前画面
+        shown_at.clear()
+        player = threading.Thread(target=lambda: list(play()), daemon=True)
+        controller = LeiDianADBController(device_port='0', adb_client=client, persistent_shell=False)
+        controller.device = 'fake'
+        controller.connected = True
+        player.start()
+        report('screencap', *measure(lambda: (controller.get_screenshot(), time.monotonic())))
+        player.join()
+
+
+def run_device(serial: str, seconds: float, bit_rate: int, size, tap) -> None:
+    client = ADBClient()
+    controller = LeiDianADBController(device_port='0', adb_client=client)
+    controller.device = serial
+    controller.connected = True
+    print(f"设备: {serial}  时长: {seconds}s  码率: {bit_rate}  尺寸: {size or '设备分辨率'}")
+    print(f"{'方式':<12} {'每秒帧数':>10} {'延迟P50(ms)':>10} {'延迟P95(ms)':>10}")
+
+    def tap_latency(get_frame, trials=5):
+        """点击后等待画面变化的时间"""
+        latencies = []
+        for _ in range(trials):
+            before = frame_signature(get_frame())
+            start = time.monotonic()
+            controller.tap(*tap)
+            while time.monotonic() - start < 5:
+                if signature_difference(frame_signature(get_frame()), before) > 2.0:
+                    latencies.append(time.monotonic() - start)
+                    break
+            time.sleep(1)
+        return latencies
+
+    with ScreenRecordStream(serial, client, bit_rate=bit_rate, size=size) as stream:
+        stream.wait_newer(0, timeout=5)
+        first = stream.buffer.count
+        start = time.monotonic()
+        time.sleep(seconds)
+        frames = stream.buffer.count - first
+        elapsed = time.monotonic() - start
+        latencies = tap_latency(lambda: stream.wait_newer(0, timeout=5)[0].copy()) if tap else []
+        report('screenrecord', frames, elapsed, latencies)
+
+    count = 0
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        controller.get_screenshot()
+        count += 1
+    elapsed = time.monotonic() - start
+    latencies = tap_latency(controller.get_screenshot) if tap else []
+    report('screencap', count, elapsed, latencies)
+    controller.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ADB 截图方式基准测试')
+    parser.add_argument('--fake', action='store_true', help='使用模拟ADB服务器')
+    parser.add_argument('--device', help='真实设备序列号')
+    parser.add_argument('--size', default='720x1280', help='画面尺寸 WxH（真实设备为视频流输出尺寸）')
+    parser.add_argument('--fps', type=int, default=30, help='模拟设备的输出帧率')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--bit-rate', type=int, default=4_000_000)
+    parser.add_argument('--screencap-delay', type=float, default=0.0,
+                        help='模拟设备端 screencap 的耗时（秒），真实设备通常为0.1~0.3秒')
+    parser.add_argument('--tap', type=int, nargs=2, metavar=('X', 'Y'), help='测量点击到画面变化的延迟')
+    args = parser.parse_args()
+    if av is None:
+        print("需要安装 PyAV: pip install av")
+        return
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    if args.device:
+        run_device(args.device, args.seconds, args.bit_rate, (width, height), args.tap)
+    else:
+        run_fake(width, height, args.fps, args.seconds, args.bit_rate, args.screencap_delay)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+颜色模式基准测试
+对比 bgr / gray / 单通道 匹配的耗时（含截图颜色转换）、命中率与误报率
+
+用法:
+    python benchmarks/bench_color_modes.py --resolution 1080p
+    python benchmarks/bench_color_modes.py --templates gamedemo/templates --screen screenshot.png
+      （使用实际模板：每个模板放置到合成屏幕或给定截图上测试，命中位置以放置位置为准）
+"""
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from template_cache import TemplateCache
+from template_matcher import COLOR_MODES, convert_frame, match_template
+from benchmarks.synthetic import RESOLUTIONS, make_screen, make_template, plant
+
+
+def load_templates(template_dir, count):
+    """返回 [(名称, 模板路径)]；未指定目录时生成合成模板"""
+    if template_dir:
+        paths = sorted(glob.glob(os.path.join(template_dir, '*.png')))
+        return [(os.path.basename(path), path) for path in paths]
+    out_dir = tempfile.mkdtemp(prefix='bench_templates_')
+    templates = []
+    for index in range(count):
+        path = os.path.join(out_dir, f'template_{index}.png')
+        cv2.imwrite(path, make_template(40 + index * 16, 32 + index * 8, seed=index))
+        templates.append((os.path.basename(path), path))
+    return templates
+
+
+def run(resolution, screen_path, template_dir, trials, threshold):
+    cache = TemplateCache()
+    templates = load_templates(template_dir, count=5)
+    if not templates:
+        print(f"目录中没有模板: {template_dir}")
+        return
+    if screen_path:
+        base_screen = cv2.imread(screen_path)
+    else:
+        width, height = RESOLUTIONS[resolution]
+        base_screen = make_screen(width, height)
+
+    stats = {mode: {'seconds': 0.0, 'runs': 0, 'hits': 0, 'false_positives': 0, 'negatives': 0}
+             for mode in COLOR_MODES}
+    for trial in range(trials):
+        for index, (_, path) in enumerate(templates):
+            template = cache.get(path)
+            frame = base_screen.copy()
+            (px, py), = plant(frame, template, seed=trial * 100 + index)
+            # 未放置的模板用于统计误报
+            _, absent_path = templates[(index + 1) % len(templates)]
+            for mode in COLOR_MODES:
+                tmpl = cache.get(path, mode)
+                start = time.perf_counter()
+                found = match_template(convert_frame(frame, mode), tmpl, threshold)
+                stats[mode]['seconds'] += time.perf_counter() - start
+                stats[mode]['runs'] += 1
+                if found and abs(found[0] - px) <= 1 and abs(found[1] - py) <= 1:
+                    stats[mode]['hits'] += 1
+                if len(templates) > 1:
+                    absent = cache.get(absent_path, mode)
+                    stats[mode]['negatives'] += 1
+                    if match_template(convert_frame(base_screen, mode), absent, threshold):
+                        stats[mode]['false_positives'] += 1
+
+    height, width = base_screen.shape[:2]
+    base = stats['bgr']['seconds'] / stats['bgr']['runs']
+    print(f"屏幕: {width}x{height}  模板数: {len(templates)}  试验次数: {trials}  阈值: {threshold}")
+    print(f"{'模式':<6} {'平均耗时(ms)':>12} {'加速比':>8} {'命中率':>8} {'误报率':>8}")
+    for mode in COLOR_MODES:
+        item = stats[mode]
+        avg = item['seconds'] / item['runs']
+        fp_rate = item['false_positives'] / item['negatives'] if item['negatives'] else 0.0
+        print(f"{mode:<6} {avg * 1000:>12.1f} {base / avg:>8.1f} "
+              f"{item['hits'] / item['runs']:>8.0%} {fp_rate:>8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='颜色模式匹配基准测试')
+    parser.add_argument('--resolution', choices=sorted(RESOLUTIONS), default='1080p')
+    parser.add_argument('--screen', help='使用实际截图作为背景')
+    parser.add_argument('--templates', help='使用目录中的实际模板 (*.png)')
+    parser.add_argument('--trials', type=int, default=2)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    args = parser.parse_args()
+    run(args.resolution, args.screen, args.templates, args.trials, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+金字塔匹配基准测试
+对比全图匹配与金字塔匹配（不同层数/候选数）的耗时与命中准确率
+
+用法:
+    python benchmarks/bench_pyramid.py --resolution 4k --trials 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from template_matcher import match_template, match_template_pyramid
+from benchmarks.synthetic import RESOLUTIONS, make_screen, make_template, plant
+
+
+TEMPLATE_SIZES = [(48, 48), (96, 64), (160, 80)]
+
+
+def run(resolution: str, trials: int, levels_list, candidates: int) -> None:
+    width, height = RESOLUTIONS[resolution]
+    modes = [('exhaustive', 0)] + [(f'pyramid L{levels}', levels) for levels in levels_list]
+    stats = {name: {'seconds': 0.0, 'hits': 0, 'runs': 0} for name, _ in modes}
+
+    for trial in range(trials):
+        screen = make_screen(width, height, seed=trial)
+        for size_index, (tw, th) in enumerate(TEMPLATE_SIZES):
+            template = make_template(tw, th, seed=trial * 10 + size_index)
+            frame = screen.copy()
+            (px, py), = plant(frame, template, seed=trial * 10 + size_index)
+            for name, levels in modes:
+                start = time.perf_counter()
+                if levels:
+                    found = match_template_pyramid(frame, template, 0.8, levels, candidates)
+                else:
+                    found = match_template(frame, template, 0.8)
+                stats[name]['seconds'] += time.perf_counter() - start
+                stats[name]['runs'] += 1
+                if found and abs(found[0] - px) <= 1 and abs(found[1] - py) <= 1:
+                    stats[name]['hits'] += 1
+
+    base = stats['exhaustive']['seconds'] / stats['exhaustive']['runs']
+    print(f"分辨率: {resolution} ({width}x{height})  试验次数: {trials}  候选数: {candidates}")
+    print(f"{'模式':<16} {'平均耗时(ms)':>12} {'加速比':>8} {'命中率':>8}")
+    for name, _ in modes:
+        item = stats[name]
+        avg = item['seconds'] / item['runs']
+        print(f"{name:<16} {avg * 1000:>12.1f} {base / avg:>8.1f} {item['hits'] / item['runs']:>8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='金字塔模板匹配基准测试')
+    parser.add_argument('--resolution', choices=sorted(RESOLUTIONS), default='4k')
+    parser.add_argument('--trials', type=int, default=3)
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--candidates', type=int, default=3)
+    args = parser.parse_args()
+    run(args.resolution, args.trials, args.levels, args.candidates)
+
+
+if __name__ == '__main__':
+    main()
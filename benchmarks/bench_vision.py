@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+图像识别基准测试（无需显示器）
+在 1080p / 1440p / 4K 合成屏幕上放置模板，通过模拟截图后端、模拟输入和模拟ADB服务器
+测量以下函数的耗时与识别正确性：
+    DesktopAutomation.find_image_on_screen（冷启动 / 位置先验命中）
+    DesktopAutomation.find_all_images_on_screen
+    alipay_forest_adb.find_image_in_screenshot（RawFrame 整帧 / 识别区域，以及模拟设备截图）
+    PVZAutomation.collect_sun / detect_zombies
+结果写入 JSON 文件，每项附带回归阈值（中位数 × (1 + tolerance)）；
+指定 --baseline 时与之前的结果比较，耗时超过基线阈值或识别结果错误时以退出码 1 结束
+
+用法:
+    python benchmarks/bench_vision.py                # 结果写入 benchmarks/vision_benchmark.json
+    python benchmarks/bench_vision.py --resolutions 1080p --repeat 5 --baseline baseline.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ZFB_MUMU'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'JSZW'))
+import alipay_forest_adb
+import desktop_automation
+import pvz_automation
+import tracing
+from adb_screencap import encode_screencap
+from alipay_forest_adb import LeiDianADBController, find_image_in_screenshot
+from benchmarks.synthetic import RESOLUTIONS, make_screen, make_template, plant
+from desktop_automation import DesktopAutomation
+from fake_adb_server import FakeADBServer, FakeDevice
+from pvz_automation import PVZAutomation
+from screen_capture import FakeCaptureBackend
+from template_cache import TemplateCache, shared_template_cache
+
+
+TEMPLATE_SIZE = (64, 48)
+FIND_ALL_COUNT = 5
+SUN_COUNT = 4
+ZOMBIE_COUNT = 3
+# 阳光：黄色圆形（HSV 色调约 23，面积约 1100）；僵尸：灰绿色矩形（HSV 色调 60）
+SUN_COLOR = (0, 200, 255)
+SUN_RADIUS = 19
+ZOMBIE_COLOR = (60, 160, 60)
+ZOMBIE_SIZE = (40, 80)
+# 默认结果文件放在 benchmarks 目录下（已加入 .gitignore），不受当前工作目录影响
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vision_benchmark.json')
+
+
+class FakeInput:
+    """模拟 pyautogui：只记录点击位置，不操作鼠标"""
+
+    FAILSAFE = False
+    PAUSE = 0.0
+
+    def __init__(self):
+        self.clicks = []
+
+    def click(self, x=None, y=None, **kwargs):
+        self.clicks.append((x, y))
+
+    def reset(self):
+        self.clicks.clear()
+
+
+def measure(func, repeat, setup=None):
+    """预热一次后执行 repeat 次，返回 (每次耗时列表, 最后一次的返回值)
+    setup 在每次执行前调用且不计时；func 可返回 (结果, 需要扣除的秒数)
+    """
+    if setup:
+        setup()
+    func()
+    durations, result = [], None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result, excluded = func()
+        durations.append(time.perf_counter() - start - excluded)
+    return durations, result
+
+
+def untimed(func):
+    """包装没有需要扣除耗时的函数"""
+    return lambda: (func(), 0.0)
+
+
+def sleep_excluded(func):
+    """扣除函数内 time.sleep 的耗时（由 tracing 记录），只统计识别与点击本身"""
+    def wrapper():
+        before = tracing.histograms().get(tracing.SLEEP, {}).get('total_seconds', 0.0)
+        result = func()
+        after = tracing.histograms().get(tracing.SLEEP, {}).get('total_seconds', 0.0)
+        return result, after - before
+    return wrapper
+
+
+def near(position, expected, tolerance=2):
+    return abs(position[0] - expected[0]) <= tolerance and abs(position[1] - expected[1]) <= tolerance
+
+
+def build_screen(width, height, single_path, repeated_path, seed):
+    """生成合成屏幕：右下区域放置单个模板，左上区域放置多个重复模板
+    Returns:
+        (屏幕, 期望位置字典)
+    """
+    screen = make_screen(width, height, seed)
+    tw, th = TEMPLATE_SIZE
+    single = make_template(tw, th, seed=seed)
+    repeated = make_template(tw, th, seed=seed + 1)
+    cv2.imwrite(single_path, single)
+    cv2.imwrite(repeated_path, repeated)
+    # 识别区域取右下四分之一
+    x, y = width * 3 // 4 + 40, height * 3 // 4 + 40
+    screen[y:y + th, x:x + tw] = single
+    region = (width // 2, height // 2, width - width // 2, height - height // 2)
+    quarter = screen[:height // 2, :width // 2]
+    positions = plant(quarter, repeated, FIND_ALL_COUNT, seed=seed)
+    return screen, {
+        'single': (x, y),
+        'center': (x + tw // 2, y + th // 2),
+        'region': region,
+        'repeated': positions,
+    }
+
+
+def build_game_screen(width, height, seed):
+    """生成游戏画面：去色的合成背景上放置黄色阳光和灰绿色僵尸
+    颜色检测按色调和饱和度筛选，背景去色后只有放置的目标会被检测到
+    Returns:
+        (画面, 阳光中心列表, 僵尸中心列表)
+    """
+    gray = cv2.cvtColor(make_screen(width, height, seed), cv2.COLOR_BGR2GRAY)
+    screen = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    rng = np.random.default_rng(seed + 3000)
+    cell_w, cell_h = width // 8, height // 4
+    cells = rng.permutation(32)[:SUN_COUNT + ZOMBIE_COUNT]
+    suns, zombies = [], []
+    zw, zh = ZOMBIE_SIZE
+    for index, cell in enumerate(cells):
+        cx = int(cell % 8) * cell_w + cell_w // 2
+        cy = int(cell // 8) * cell_h + cell_h // 2
+        if index < SUN_COUNT:
+            cv2.circle(screen, (cx, cy), SUN_RADIUS, SUN_COLOR, -1)
+            suns.append((cx, cy))
+        else:
+            left, top = cx - zw // 2, cy - zh // 2
+            cv2.rectangle(screen, (left, top), (left + zw - 1, top + zh - 1), ZOMBIE_COLOR, -1)
+            zombies.append((left + zw // 2, top + zh // 2))
+    return screen, suns, zombies
+
+
+def bench_resolution(name, repeat, fake_input, server, device):
+    width, height = RESOLUTIONS[name]
+    template_dir = tempfile.mkdtemp(prefix='bench_vision_')
+    template_path = os.path.join(template_dir, f'single_{name}.png')
+    repeated_path = os.path.join(template_dir, f'repeated_{name}.png')
+    screen, expected = build_screen(width, height, template_path, repeated_path, seed=len(name))
+    results = []
+
+    def add(case, variant, durations, correct, detail=''):
+        results.append({
+            'case': case,
+            'variant': variant,
+            'resolution': name,
+            'size': [width, height],
+            'runs': len(durations),
+            'min_seconds': min(durations),
+            'median_seconds': statistics.median(durations),
+            'mean_seconds': statistics.mean(durations),
+            'correct': bool(correct),
+            'detail': detail,
+        })
+
+    # 桌面：模拟截图后端，每次调用都经过 grab()
+    backend = FakeCaptureBackend([screen], loop=True)
+    automation = DesktopAutomation(template_cache=TemplateCache(), capture_backend=backend)
+    automation.template_cache.get(template_path)
+    automation.template_cache.get(repeated_path)
+
+    durations, found = measure(untimed(lambda: automation.find_image_on_screen(template_path)), repeat,
+                               setup=automation.location_prior.forget)
+    add('desktop.find_image_on_screen', 'cold', durations,
+        found is not None and near(found, expected['single']), f'found={found}')
+    durations, found = measure(untimed(lambda: automation.find_image_on_screen(template_path)), repeat)
+    add('desktop.find_image_on_screen', 'prior', durations,
+        found is not None and near(found, expected['single']), f'found={found}')
+
+    durations, matches = measure(untimed(lambda: automation.find_all_images_on_screen(repeated_path)), repeat)
+    positions = [(match.x, match.y) for match in matches]
+    hits = sum(any(near(p, e) for p in positions) for e in expected['repeated'])
+    add('desktop.find_all_images_on_screen', 'full', durations,
+        hits == FIND_ALL_COUNT and len(positions) == FIND_ALL_COUNT,
+        f'hits={hits}/{FIND_ALL_COUNT} results={len(positions)}')
+
+    # ADB：模拟设备返回原始帧缓冲，控制器读取为 RawFrame
+    device.handlers['screencap'] = lambda command, data=encode_screencap(screen): data
+    controller = LeiDianADBController(device_port='0', adb_client=server.client(), persistent_shell=False)
+    controller.device = device.serial
+    controller.connected = True
+    shared_template_cache.get(template_path)
+
+    durations, frame = measure(untimed(controller.get_frame), repeat)
+    add('adb.get_frame', 'raw', durations, frame is not None and frame.shape[:2] == (height, width))
+    durations, found = measure(untimed(lambda: find_image_in_screenshot(frame, template_path)), repeat,
+                               setup=alipay_forest_adb.location_prior.forget)
+    add('adb.find_image_in_screenshot', 'cold', durations,
+        found is not None and near(found, expected['center']), f'found={found}')
+    durations, found = measure(
+        untimed(lambda: find_image_in_screenshot(frame, template_path, region=expected['region'])), repeat,
+        setup=alipay_forest_adb.location_prior.forget)
+    add('adb.find_image_in_screenshot', 'region', durations,
+        found is not None and near(found, expected['center']), f'found={found}')
+    durations, found = measure(
+        untimed(lambda: find_image_in_screenshot(controller.get_frame(), template_path)), repeat,
+        setup=alipay_forest_adb.location_prior.forget)
+    add('adb.find_image_in_screenshot', 'capture+cold', durations,
+        found is not None and near(found, expected['center']), f'found={found}')
+
+    # 植物大战僵尸：通过模拟截图后端截图，点击交给模拟输入（扣除每次点击后的固定等待）
+    game_screen, suns, zombie_positions = build_game_screen(width, height, seed=len(name))
+    game = PVZAutomation(capture_backend=FakeCaptureBackend([game_screen], loop=True))
+    durations, collected = measure(sleep_excluded(game.collect_sun), repeat, setup=fake_input.reset)
+    hits = sum(any(near(click, sun, SUN_RADIUS // 2) for click in fake_input.clicks) for sun in suns)
+    add('pvz.collect_sun', 'capture', durations, hits == SUN_COUNT,
+        f'hits={hits}/{SUN_COUNT} clicks={collected}')
+    durations, zombies = measure(untimed(game.detect_zombies), repeat)
+    hits = sum(any(near(z, e, 2) for z in zombies) for e in zombie_positions)
+    add('pvz.detect_zombies', 'capture', durations, hits == ZOMBIE_COUNT,
+        f'hits={hits}/{ZOMBIE_COUNT} detected={len(zombies)}')
+
+    for path in (template_path, repeated_path):
+        os.remove(path)
+    os.rmdir(template_dir)
+    return results
+
+
+def result_key(item):
+    return f"{item['case']}[{item['variant']}]@{item['resolution']}"
+
+
+def compare(results, baseline_path):
+    """与基线比较，返回回归项列表"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {result_key(item): item for item in json.load(f)['results']}
+    regressions = []
+    for item in results:
+        base = baseline.get(result_key(item))
+        if base is None:
+            continue
+        item['baseline_median_seconds'] = base['median_seconds']
+        if item['median_seconds'] > base['threshold_seconds']:
+            regressions.append(f"{result_key(item)}: {item['median_seconds'] * 1000:.1f}ms "
+                               f"> 阈值 {base['threshold_seconds'] * 1000:.1f}ms")
+        if base['correct'] and not item['correct']:
+            regressions.append(f"{result_key(item)}: 识别结果错误 ({item['detail']})")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'项目':<44} {'分辨率':>6} {'中位数(ms)':>10} {'最小(ms)':>10} {'基线(ms)':>10} {'正确':>4}")
+    for item in results:
+        base = item.get('baseline_median_seconds')
+        base_text = f"{base * 1000:>10.1f}" if base is not None else f"{'-':>10}"
+        print(f"{item['case'] + '[' + item['variant'] + ']':<44} {item['resolution']:>6} "
+              f"{item['median_seconds'] * 1000:>10.1f} {item['min_seconds'] * 1000:>10.1f} {base_text} "
+              f"{'是' if item['correct'] else '否':>4}")
+
+
+def run(resolutions, repeat, output, baseline, tolerance) -> int:
+    fake_input = FakeInput()
+    original_inputs = desktop_automation.pyautogui, pvz_automation.pyautogui
+    desktop_automation.pyautogui = pvz_automation.pyautogui = fake_input
+    # 只用直方图统计 time.sleep 的耗时
+    tracing.enable(record_events=False, trace_sleep=True)
+    results = []
+    try:
+        with FakeADBServer() as server:
+            device = server.add_device(FakeDevice('bench'))
+            for name in resolutions:
+                print(f"测试 {name} ({RESOLUTIONS[name][0]}x{RESOLUTIONS[name][1]}) ...")
+                results.extend(bench_resolution(name, repeat, fake_input, server, device))
+    finally:
+        tracing.disable()
+        desktop_automation.pyautogui, pvz_automation.pyautogui = original_inputs
+
+    for item in results:
+        item['threshold_seconds'] = item['median_seconds'] * (1 + tolerance)
+    regressions = compare(results, baseline) if baseline else []
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'repeat': repeat,
+            'tolerance': tolerance,
+            'baseline': baseline,
+        },
+        'results': results,
+        'regressions': regressions,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print_table(results)
+    print(f"结果已写入: {output}")
+    failures = [result_key(item) for item in results if not item['correct']]
+    if failures:
+        print(f"识别结果错误: {', '.join(failures)}")
+    if regressions:
+        print("性能回归:")
+        for line in regressions:
+            print(f"  {line}")
+    # 识别错误即使没有基线也视为失败
+    return 1 if failures or regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图像识别基准测试（无需显示器）')
+    parser.add_argument('--resolutions', nargs='+', choices=sorted(RESOLUTIONS),
+                        default=['1080p', '1440p', '4k'])
+    parser.add_argument('--repeat', type=int, default=3, help='每项测量次数（另有一次预热）')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='结果 JSON 文件')
+    parser.add_argument('--baseline', help='之前的结果文件，超过其中阈值时视为回归')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='回归阈值相对中位数的放宽比例，写入结果供下次比较')
+    args = parser.parse_args()
+    sys.exit(run(args.resolutions, args.repeat, args.output, args.baseline, args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
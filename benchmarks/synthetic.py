@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+合成测试屏幕
+生成带纹理的屏幕图像，并在指定位置放置模板（用于无显示器环境下的基准测试）
+"""
+
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '1440p': (2560, 1440),
+    '4k': (3840, 2160),
+}
+
+
+def make_screen(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """生成类似桌面的合成屏幕（平滑背景 + 随机色块 + 文字）
+    Args:
+        width, height: 屏幕尺寸
+        seed: 随机种子
+    Returns:
+        BGR图像
+    """
+    rng = np.random.default_rng(seed)
+    # 低频背景：小尺寸噪声放大
+    small = rng.integers(0, 256, (height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8)
+    screen = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    # 随机矩形模拟窗口和按钮
+    for _ in range(width * height // 20000):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(10, 200)), int(rng.integers(10, 120))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(screen, (x, y), (x + w, y + h), color, -1 if rng.random() < 0.5 else 2)
+    # 随机文字
+    for _ in range(width * height // 50000):
+        x, y = int(rng.integers(0, width)), int(rng.integers(20, height))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.putText(screen, f"item {int(rng.integers(0, 1000))}", (x, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 1, cv2.LINE_AA)
+    return screen
+
+
+def make_template(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """生成有明显特征的模板图像（模拟图标/按钮）"""
+    rng = np.random.default_rng(seed + 1000)
+    template = np.full((height, width, 3), rng.integers(0, 256, 3), dtype=np.uint8)
+    for _ in range(6):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        radius = int(rng.integers(3, max(4, min(width, height) // 2)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(template, center, radius, color, -1)
+    cv2.putText(template, 'OK', (width // 4, height * 2 // 3),
+                cv2.FONT_HERSHEY_SIMPLEX, max(0.3, height / 60), (255, 255, 255), 2)
+    return template
+
+
+def plant(screen: np.ndarray, template: np.ndarray, count: int = 1,
+          seed: int = 0) -> List[Tuple[int, int]]:
+    """在屏幕随机位置放置模板
+    Returns:
+        放置位置列表 [(x, y), ...]
+    """
+    rng = np.random.default_rng(seed + 2000)
+    h, w = template.shape[:2]
+    screen_h, screen_w = screen.shape[:2]
+    positions = []
+    while len(positions) < count:
+        x, y = int(rng.integers(0, screen_w - w)), int(rng.integers(0, screen_h - h))
+        if any(abs(x - px) < w and abs(y - py) < h for px, py in positions):
+            continue
+        screen[y:y + h, x:x + w] = template
+        positions.append((x, y))
+    return positions
+
+
+def stamp_index(frame: np.ndarray, index: int, bits: int = 16, block: int = 16) -> None:
+    """在图像左上角用黑白方块编码帧序号（经过视频压缩后仍可读出），用于测量帧延迟"""
+    for bit in range(bits):
+        value = 255 if (index >> bit) & 1 else 0
+        frame[:block, bit * block:(bit + 1) * block] = value
+
+
+def read_index(frame: np.ndarray, bits: int = 16, block: int = 16) -> int:
+    """读出 stamp_index 写入的帧序号"""
+    index = 0
+    for bit in range(bits):
+        inner = frame[block // 4:block * 3 // 4, bit * block + block // 4:(bit + 1) * block - block // 4]
+        if inner.mean() > 127:
+            index |= 1 << bit
+    return index
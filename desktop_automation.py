@@ -4,25 +4,64 @@
 提供pyautogui、opencv、win32gui的封装函数
 """
 
-import pyautogui
-import cv2
 import numpy as np
-import win32gui
-import win32con
-import win32process
 import time
 import os
 from typing import Tuple, Optional, List
+from screen_capture import CaptureBackend, get_default_backend
+from template_cache import TemplateCache, shared_template_cache
+from tracing import FIND, INPUT, traced
+from screen_change import AdaptivePoller, wait_until_stable
+from template_matcher import (LocationPrior, MultiScaleMatcher, TemplateMatch, convert_frame,
+                              match_template, match_template_all, match_template_pyramid,
+                              resolve_color_mode, template_variant)
+
+try:
+    import pyautogui
+except Exception:  # 无显示器环境下导入会失败，此时只能使用自定义截图后端
+    pyautogui = None
+
+try:
+    import win32gui
+    import win32con
+    import win32process
+except ImportError:  # 非Windows系统
+    win32gui = win32con = win32process = None
 
 # 设置pyautogui安全模式
-pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.1
+if pyautogui:
+    pyautogui.FAILSAFE = True
+    pyautogui.PAUSE = 0.1
 
 class DesktopAutomation:
     """桌面自动化工具类"""
     
-    def __init__(self):
-        self.screen_width, self.screen_height = pyautogui.size()
+    def __init__(self, template_cache: Optional[TemplateCache] = None,
+                 pyramid_levels: int = 0, pyramid_candidates: int = 3,
+                 location_prior: Optional[LocationPrior] = None,
+                 capture_backend: Optional[CaptureBackend] = None,
+                 color_mode: str = 'bgr',
+                 template_reference_size: Optional[Tuple[int, int]] = None):
+        """
+        Args:
+            template_cache: 模板图像缓存，默认使用进程内共享缓存
+            pyramid_levels: 默认金字塔匹配层数，0 表示全分辨率全图匹配
+            pyramid_candidates: 金字塔匹配保留的粗匹配候选数量
+            location_prior: 位置先验，默认每个实例单独记录各模板上次出现的位置
+            capture_backend: 截图后端，默认自动选择（Linux/X11下使用共享内存截图）
+            color_mode: 默认匹配颜色模式 ('bgr', 'gray', 'b', 'g', 'r')，
+                        可被 set_template_color_mode() 为单个模板指定的模式或调用参数覆盖
+            template_reference_size: 截取模板时的屏幕尺寸，指定后启用多尺度匹配
+                                     （此时 find_image_on_screen 不使用位置先验和金字塔匹配）
+        """
+        self.capture_backend = capture_backend or get_default_backend()
+        self.screen_width, self.screen_height = self.capture_backend.size()
+        self.template_cache = template_cache or shared_template_cache
+        self.pyramid_levels = pyramid_levels
+        self.pyramid_candidates = pyramid_candidates
+        self.location_prior = location_prior or LocationPrior()
+        self.color_mode = color_mode
+        self.scale_matcher = MultiScaleMatcher(template_reference_size) if template_reference_size else None
     
     # ==================== PyAutoGUI 桌面自动化 ====================
     
@@ -35,14 +74,11 @@ class DesktopAutomation:
         Args:
             region: 截图区域 (x, y, width, height)
         Returns:
-            截图的numpy数组
+            截图的numpy数组（BGR）
         """
-        if region:
-            screenshot = pyautogui.screenshot(region=region)
-        else:
-            screenshot = pyautogui.screenshot()
-        return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+        return self.capture_backend.grab_bgr(region)
     
+    @traced(INPUT)
     def click_at(self, x: int, y: int, button: str = 'left', clicks: int = 1) -> None:
         """在指定位置点击
         Args:
@@ -52,14 +88,17 @@ class DesktopAutomation:
         """
         pyautogui.click(x, y, button=button, clicks=clicks)
     
+    @traced(INPUT)
     def drag_to(self, start_x: int, start_y: int, end_x: int, end_y: int, duration: float = 0.5) -> None:
         """拖拽操作"""
         pyautogui.drag(end_x - start_x, end_y - start_y, duration=duration)
     
+    @traced(INPUT)
     def type_text(self, text: str, interval: float = 0.01) -> None:
         """输入文本"""
         pyautogui.typewrite(text, interval=interval)
     
+    @traced(INPUT)
     def press_key(self, key: str) -> None:
         """按键操作"""
         pyautogui.press(key)
@@ -77,36 +116,64 @@ class DesktopAutomation:
     
     # ==================== OpenCV 图像识别 ====================
     
+    @traced(FIND)
     def find_image_on_screen(self, template_path: str, confidence: float = 0.8, 
-                           region: Optional[Tuple[int, int, int, int]] = None) -> Optional[Tuple[int, int, int, int]]:
+                           region: Optional[Tuple[int, int, int, int]] = None,
+                           pyramid_levels: Optional[int] = None,
+                           screen: Optional[np.ndarray] = None,
+                           color_mode: Optional[str] = None) -> Optional[Tuple[int, int, int, int]]:
         """在屏幕上查找图像
         Args:
             template_path: 模板图像路径
             confidence: 匹配置信度
             region: 搜索区域
+            pyramid_levels: 金字塔匹配层数，None 时使用实例默认值，0 表示全图匹配
+            screen: 已截取的屏幕图像（与region对应，BGR/BGRA），为None时重新截图
+            color_mode: 匹配颜色模式，None 时按模板指定的模式或实例默认值
         Returns:
             找到的图像位置 (x, y, width, height) 或 None
         """
-        if not os.path.exists(template_path):
-            print(f"模板图像不存在: {template_path}")
-            return None
-        
-        # 读取模板图像
-        template = cv2.imread(template_path)
+        # 读取模板图像（已缓存时不再解码）
+        color_mode = resolve_color_mode(template_path, color_mode, self.color_mode)
+        template = self.template_cache.get(template_path, color_mode)
         if template is None:
-            print(f"无法读取模板图像: {template_path}")
+            if not os.path.exists(template_path):
+                print(f"模板图像不存在: {template_path}")
+            else:
+                print(f"无法读取模板图像: {template_path}")
             return None
         
-        # 截取屏幕
-        screen = self.take_screenshot(region)
+        # 截取屏幕并转换为匹配所用的颜色模式
+        if screen is None:
+            screen = self.capture_backend.grab(region)
+        screen = convert_frame(screen, color_mode)
         
-        # 模板匹配
-        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        if self.scale_matcher:
+            # 多尺度匹配：按屏幕尺寸预测模板尺度
+            screen_size = self.capture_backend.size()
+            found = self.scale_matcher.match(screen, template_path, screen_size, confidence,
+                                             color_mode, frame_size=screen_size)
+            if found:
+                x, y, w, h = found
+                if region:
+                    x += region[0]
+                    y += region[1]
+                return (x, y, w, h)
+            return None
         
-        if max_val >= confidence:
-            h, w = template.shape[:2]
-            x, y = max_loc
+        # 模板匹配：先在上次出现的位置附近搜索，未命中再全图搜索
+        if pyramid_levels is None:
+            pyramid_levels = self.pyramid_levels
+        if pyramid_levels > 0:
+            coarse = self.template_cache.get(template_path, template_variant(color_mode, pyramid_levels))
+            fallback = lambda frame, tmpl, threshold: match_template_pyramid(
+                frame, tmpl, threshold, pyramid_levels, self.pyramid_candidates, coarse_template=coarse)
+        else:
+            fallback = match_template
+        found = self.location_prior.match(screen, template, (template_path, region), confidence, fallback)
+        
+        if found:
+            x, y, w, h = found
             if region:
                 x += region[0]
                 y += region[1]
@@ -114,42 +181,56 @@ class DesktopAutomation:
         
         return None
     
+    @traced(FIND)
     def find_all_images_on_screen(self, template_path: str, confidence: float = 0.8,
-                                 region: Optional[Tuple[int, int, int, int]] = None) -> List[Tuple[int, int, int, int]]:
-        """查找屏幕上的所有匹配图像"""
-        if not os.path.exists(template_path):
-            return []
-        
-        template = cv2.imread(template_path)
+                                 region: Optional[Tuple[int, int, int, int]] = None,
+                                 max_results: int = 100, nms: str = 'iou',
+                                 overlap: float = 0.3,
+                                 color_mode: Optional[str] = None) -> List[TemplateMatch]:
+        """查找屏幕上的所有匹配图像
+        Args:
+            template_path: 模板图像路径
+            confidence: 匹配置信度
+            region: 搜索区域
+            max_results: 最多返回的结果数量
+            nms: 重叠结果抑制方式 ('iou' 或 'distance')
+            overlap: nms='iou' 时允许的最大重叠率
+            color_mode: 匹配颜色模式，None 时按模板指定的模式或实例默认值
+        Returns:
+            按置信度从高到低排列的匹配结果，可解包为 (x, y, width, height)
+        """
+        color_mode = resolve_color_mode(template_path, color_mode, self.color_mode)
+        template = self.template_cache.get(template_path, color_mode)
         if template is None:
             return []
         
-        screen = self.take_screenshot(region)
-        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-        
-        locations = np.where(result >= confidence)
-        matches = []
-        h, w = template.shape[:2]
+        screen = convert_frame(self.capture_backend.grab(region), color_mode)
+        matches = match_template_all(screen, template, confidence, max_results, nms, overlap)
         
-        for pt in zip(*locations[::-1]):
-            x, y = pt
-            if region:
-                x += region[0]
-                y += region[1]
-            matches.append((x, y, w, h))
+        if region:
+            for match in matches:
+                match.x += region[0]
+                match.y += region[1]
         
         return matches
     
     def wait_for_image(self, template_path: str, timeout: float = 10, 
-                      confidence: float = 0.8, check_interval: float = 0.5) -> Optional[Tuple[int, int, int, int]]:
-        """等待图像出现"""
-        start_time = time.time()
+                      confidence: float = 0.8, check_interval: float = 0.5,
+                      color_mode: Optional[str] = None) -> Optional[Tuple[int, int, int, int]]:
+        """等待图像出现
+        画面未变化时跳过模板匹配；轮询间隔以check_interval为初始值，画面变化时缩短、静止时放宽
+        """
+        deadline = time.time() + timeout
+        poller = AdaptivePoller(check_interval)
         
-        while time.time() - start_time < timeout:
-            result = self.find_image_on_screen(template_path, confidence)
-            if result:
-                return result
-            time.sleep(check_interval)
+        while time.time() < deadline:
+            screen = self.capture_backend.grab()
+            if poller.should_check(screen):
+                result = self.find_image_on_screen(template_path, confidence, screen=screen,
+                                                   color_mode=color_mode)
+                if result:
+                    return result
+            poller.sleep(deadline)
         
         return None
     
@@ -165,6 +246,14 @@ class DesktopAutomation:
             return True
         return False
     
+    def get_template_cache_stats(self) -> dict:
+        """获取模板缓存统计（命中/未命中、节省的解码时间等）"""
+        return self.template_cache.stats()
+    
+    def get_location_prior_stats(self) -> dict:
+        """获取各模板的区域命中/回退全图搜索次数"""
+        return self.location_prior.stats()
+    
     # ==================== Win32GUI 窗口操作 ====================
     
     def find_window_by_title(self, title: str) -> Optional[int]:
@@ -241,8 +330,16 @@ class DesktopAutomation:
         """聚焦窗口并点击图像"""
         hwnd = self.find_window_by_title(window_title)
         if hwnd:
+            # 窗口已在前台时画面不会切换，无需等待
+            was_foreground = win32gui.GetForegroundWindow() == hwnd
+            left, top, right, bottom = self.get_window_rect(hwnd)
+            before = None if was_foreground else self.capture_backend.grab((left, top, right - left, bottom - top))
             self.activate_window(hwnd)
-            time.sleep(0.5)  # 等待窗口激活
+            if not was_foreground:
+                # 等待窗口激活后重绘完成，最多0.5秒
+                left, top, right, bottom = self.get_window_rect(hwnd)
+                wait_until_stable((left, top, right - left, bottom - top), 0.5,
+                                  grab=self.capture_backend.grab, flow="激活窗口", before=before)
             return self.click_image(template_path, confidence)
         return False
     
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+模拟 ADB 服务器
+实现与真实 ADB 服务器相同的帧格式（host:version、host:devices、host:connect、host:transport、
+shell:、exec:、sync:），用于在没有设备和 adb 的环境下测试 ADBClient 及上层脚本
+"""
+
+import socket
+import socketserver
+import struct
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from adb_client import ADBClient, SYNC_CHUNK
+
+
+class FakeDevice:
+    """模拟设备：内存文件系统 + 可替换的命令处理函数"""
+
+    def __init__(self, serial: str, state: str = 'device', files: Optional[Dict[str, bytes]] = None,
+                 handlers: Optional[Dict[str, Callable[[str], Union[bytes, Iterable[bytes]]]]] = None):
+        """
+        Args:
+            serial: 设备序列号
+            state: 设备状态，'device' 以外的状态无法切换到该设备
+            files: 设备文件 {路径: 内容}
+            handlers: 命令处理函数 {命令名: 函数(完整命令) -> 输出}，未注册的命令交给本地 sh 执行；
+                      函数可返回字节块的迭代器，用于模拟持续输出的数据流（如 screenrecord）
+        """
+        self.serial = serial
+        self.state = state
+        self.files = dict(files or {})
+        self.handlers = dict(handlers or {})
+        self.commands: List[str] = []
+        self.lock = threading.Lock()
+
+    def run(self, command: str) -> Union[bytes, Iterable[bytes]]:
+        """执行一条命令并返回输出"""
+        with self.lock:
+            self.commands.append(command)
+        name = command.split()[0] if command.split() else ''
+        handler = self.handlers.get(name)
+        if handler is not None:
+            return handler(command)
+        result = subprocess.run(['sh', '-c', command], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return result.stdout
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """处理一个客户端连接"""
+
+    def handle(self):
+        server: FakeADBServer = self.server.owner
+        sock = self.request
+        device: Optional[FakeDevice] = None
+        try:
+            while True:
+                request = _read_request(sock)
+                if request is None:
+                    return
+                server.requests.append(request)
+                if request.startswith('host:transport'):
+                    device = server._select(request)
+                    if device is None:
+                        _fail(sock, 'device not found')
+                        return
+                    sock.sendall(b'OKAY')
+                    continue
+                if request.startswith('host:'):
+                    server._host_service(sock, request[len('host:'):])
+                    return
+                if device is None:
+                    _fail(sock, 'no device selected')
+                    return
+                if request.startswith(('shell:', 'exec:')):
+                    sock.sendall(b'OKAY')
+                    command = request.split(':', 1)[1]
+                    if command in ('', 'sh'):
+                        _interactive_shell(sock)
+                    else:
+                        output = device.run(command)
+                        if isinstance(output, bytes):
+                            sock.sendall(output)
+                        else:
+                            for chunk in output:
+                                sock.sendall(chunk)
+                    return
+                if request == 'sync:':
+                    sock.sendall(b'OKAY')
+                    _sync_loop(sock, device)
+                    return
+                _fail(sock, f'unknown service: {request}')
+                return
+        except (ConnectionError, OSError):
+            return
+
+
+def _read_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _read_request(sock: socket.socket) -> Optional[str]:
+    header = _read_exact(sock, 4)
+    if header is None:
+        return None
+    payload = _read_exact(sock, int(header, 16))
+    return None if payload is None else payload.decode('utf-8')
+
+
+def _block(text: str) -> bytes:
+    payload = text.encode('utf-8')
+    return b'%04x' % len(payload) + payload
+
+
+def _fail(sock: socket.socket, message: str) -> None:
+    sock.sendall(b'FAIL' + _block(message))
+
+
+def _interactive_shell(sock: socket.socket) -> None:
+    """无命令的 shell 服务：将连接转接到本地 sh"""
+    process = subprocess.Popen(['sh'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, bufsize=0)
+
+    def pump_input():
+        try:
+            while True:
+                data = sock.recv(SYNC_CHUNK)
+                if not data:
+                    break
+                process.stdin.write(data)
+        except OSError:
+            pass
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+    threading.Thread(target=pump_input, daemon=True).start()
+    try:
+        for data in iter(lambda: process.stdout.read(SYNC_CHUNK), b''):
+            sock.sendall(data)
+    finally:
+        process.kill()
+        process.wait()
+
+
+def _sync_loop(sock: socket.socket, device: FakeDevice) -> None:
+    while True:
+        header = _read_exact(sock, 8)
+        if header is None:
+            return
+        request_id, length = header[:4], struct.unpack('<I', header[4:])[0]
+        if request_id == b'QUIT':
+            return
+        path = _read_exact(sock, length).decode('utf-8')
+        if request_id == b'STAT':
+            data = device.files.get(path)
+            if data is None:
+                sock.sendall(b'STAT' + struct.pack('<III', 0, 0, 0))
+            else:
+                sock.sendall(b'STAT' + struct.pack('<III', 0o100644, len(data), int(time.time())))
+        elif request_id == b'RECV':
+            data = device.files.get(path)
+            if data is None:
+                message = b'No such file or directory'
+                sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+                continue
+            for offset in range(0, len(data), SYNC_CHUNK):
+                chunk = data[offset:offset + SYNC_CHUNK]
+                sock.sendall(b'DATA' + struct.pack('<I', len(chunk)) + chunk)
+            sock.sendall(b'DONE' + struct.pack('<I', 0))
+        elif request_id == b'SEND':
+            remote_path = path.rsplit(',', 1)[0]
+            chunks = []
+            while True:
+                chunk_header = _read_exact(sock, 8)
+                if chunk_header is None:
+                    return
+                chunk_id, chunk_length = chunk_header[:4], struct.unpack('<I', chunk_header[4:])[0]
+                if chunk_id == b'DONE':
+                    break
+                chunks.append(_read_exact(sock, chunk_length))
+            device.files[remote_path] = b''.join(chunks)
+            sock.sendall(b'OKAY' + struct.pack('<I', 0))
+        else:
+            message = f'unknown sync request {request_id!r}'.encode('utf-8')
+            sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+            return
+
+
+class FakeADBServer:
+    """模拟 ADB 服务器（后台线程运行）
+
+    用法:
+        with FakeADBServer() as server:
+            server.add_device(FakeDevice('emulator-5554'))
+            client = server.client()
+            client.devices()
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, version: int = 41):
+        self.version = version
+        self.devices: Dict[str, FakeDevice] = {}
+        # host:connect 可连接的地址 -> 连接后出现的设备
+        self.network_devices: Dict[str, FakeDevice] = {}
+        self.requests: List[str] = []
+        self._server = socketserver.ThreadingTCPServer((host, port), _Handler, bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.owner = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def add_device(self, device: FakeDevice) -> FakeDevice:
+        self.devices[device.serial] = device
+        return device
+
+    def add_network_device(self, address: str, device: Optional[FakeDevice] = None) -> FakeDevice:
+        """注册可通过 host:connect 连接的网络设备"""
+        device = device or FakeDevice(address)
+        self.network_devices[address] = device
+        return device
+
+    def client(self, **kwargs) -> ADBClient:
+        host, port = self.address
+        return ADBClient(host, port, **kwargs)
+
+    def start(self) -> 'FakeADBServer':
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _select(self, request: str) -> Optional[FakeDevice]:
+        if request == 'host:transport-any':
+            ready = [d for d in self.devices.values() if d.state == 'device']
+            return ready[0] if len(ready) == 1 else None
+        device = self.devices.get(request.split(':', 2)[2])
+        return device if device is not None and device.state == 'device' else None
+
+    def _host_service(self, sock: socket.socket, service: str) -> None:
+        if service == 'version':
+            sock.sendall(b'OKAY' + _block(f'{self.version:04x}'))
+        elif service == 'devices':
+            listing = ''.join(f'{d.serial}\t{d.state}\n' for d in self.devices.values())
+            sock.sendall(b'OKAY' + _block(listing))
+        elif service.startswith('connect:'):
+            address = service[len('connect:'):]
+            if address in self.devices:
+                message = f'already connected to {address}'
+            elif address in self.network_devices:
+                self.devices[address] = self.network_devices[address]
+                message = f'connected to {address}'
+            else:
+                message = f'failed to connect to {address}'
+            sock.sendall(b'OKAY' + _block(message))
+        elif service.startswith('disconnect:'):
+            address = service[len('disconnect:'):]
+            self.devices.pop(address, None)
+            sock.sendall(b'OKAY' + _block(f'disconnected {address}'))
+        else:
+            _fail(sock, f'unknown host service: {service}')
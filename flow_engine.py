@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+状态机流程引擎
+把“依次尝试多条备选路径、每条等满超时”的导航写成声明式状态机：每个状态列出若干候选跳转，
+每一轮只截一帧，在这一帧上并行评估当前状态的全部候选，按声明顺序触发第一个命中的跳转。
+某条路径不存在时不再需要等它超时，命中哪个走哪个；慢的自定义探测（如控件树 dump）不拖慢每一轮，
+本轮未完成的探测留到下一轮，画面未变化时才使用其结果。
+每次跳转的耗时、轮数和截图/匹配/动作的时间都会记录下来，用于分析流程瓶颈。
+跳转后的 delay 默认作为等待画面稳定的上限，界面提前稳定时立即进入下一状态
+"""
+
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from screen_change import CHANGE_THRESHOLD, frame_signature, signature_change, wait_until_stable
+from template_matcher import LocationPrior, MatchSession, MultiScaleMatcher, get_match_executor
+
+Position = Tuple[int, int]
+
+
+class Transition:
+    """候选跳转：模板（或自定义探测函数）在当前帧命中时执行动作并进入目标状态"""
+
+    def __init__(self, template: Optional[str], target: str,
+                 probe: Optional[Callable[[np.ndarray], Optional[Position]]] = None,
+                 action: Optional[Callable[[Position], Any]] = None,
+                 confidence: float = 0.8, color_mode: Optional[str] = None,
+                 delay: float = 0.0, name: Optional[str] = None):
+        """
+        Args:
+            template: 模板图像路径，文件不存在时该跳转不参与评估
+            target: 目标状态
+            probe: 自定义探测函数 (frame) -> 坐标或None，提供时代替模板匹配（如控件树查找）
+            action: 命中后执行的动作 (坐标) -> Any，默认点击命中位置
+            confidence: 模板匹配置信度
+            color_mode: 匹配颜色模式，None 时按模板指定的模式
+            delay: 动作完成后等待界面切换的最长秒数
+            name: 跳转名称，默认取模板文件名
+        """
+        if template is None and probe is None:
+            raise ValueError("跳转需要模板或探测函数")
+        self.template = template
+        self.target = target
+        self.probe = probe
+        self.action = action
+        self.confidence = confidence
+        self.color_mode = color_mode
+        self.delay = delay
+        self.name = name or (os.path.basename(template) if template else getattr(probe, '__name__', 'probe'))
+
+    def available(self) -> bool:
+        return self.probe is not None or os.path.exists(self.template)
+
+    def __repr__(self):
+        return f"Transition({self.name!r} -> {self.target!r})"
+
+
+class Flow:
+    """流程定义
+
+    用法:
+        flow = (Flow('进入蚂蚁森林', 'home', ['forest'])
+                .add('home', Transition('images/ant_forest_icon.png', 'forest', delay=3),
+                             Transition('images/more_button.png', 'more', delay=2))
+                .add('more', Transition('images/ant_forest_icon.png', 'forest', delay=3)))
+    """
+
+    def __init__(self, name: str, start: str, goals: Iterable[str], state_timeout: float = 10.0):
+        """
+        Args:
+            name: 流程名称
+            start: 初始状态
+            goals: 终止状态，进入任一终止状态即成功
+            state_timeout: 单个状态内没有候选命中时的最长等待（秒）
+        """
+        self.name = name
+        self.start = start
+        self.goals = set(goals)
+        self.state_timeout = state_timeout
+        self.states: Dict[str, List[Transition]] = {}
+
+    def add(self, state: str, *transitions: Transition) -> 'Flow':
+        """为状态追加候选跳转，声明顺序即优先级"""
+        self.states.setdefault(state, []).extend(transitions)
+        return self
+
+
+class FlowStep:
+    """一次跳转的记录"""
+
+    __slots__ = ('state', 'transition', 'target', 'position', 'waited', 'ticks', 'action_seconds')
+
+    def __init__(self, state: str, transition: str, target: str, position: Position,
+                 waited: float, ticks: int, action_seconds: float):
+        self.state = state
+        self.transition = transition
+        self.target = target
+        self.position = position
+        self.waited = waited
+        self.ticks = ticks
+        self.action_seconds = action_seconds
+
+    def __repr__(self):
+        return (f"FlowStep({self.state} --{self.transition}--> {self.target}, "
+                f"waited={self.waited:.2f}s, ticks={self.ticks})")
+
+
+class FlowResult:
+    """流程执行结果与耗时统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.success = False
+        self.final_state: Optional[str] = None
+        self.reason = ''
+        self.steps: List[FlowStep] = []
+        self.ticks = 0
+        self.capture_seconds = 0.0
+        self.match_seconds = 0.0
+        self.action_seconds = 0.0
+        self.settle_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def stats(self) -> dict:
+        return {
+            'success': self.success,
+            'final_state': self.final_state,
+            'steps': len(self.steps),
+            'ticks': self.ticks,
+            'capture_seconds': self.capture_seconds,
+            'match_seconds': self.match_seconds,
+            'action_seconds': self.action_seconds,
+            'settle_seconds': self.settle_seconds,
+            'saved_seconds': self.saved_seconds,
+            'total_seconds': self.total_seconds,
+        }
+
+    def report(self) -> str:
+        """生成可读的流程报告"""
+        status = '成功' if self.success else f'失败（{self.reason}）'
+        lines = [f"流程 {self.name}: {status}，共 {len(self.steps)} 步 {self.ticks} 轮，"
+                 f"耗时 {self.total_seconds:.2f}s（截图 {self.capture_seconds:.2f}s，"
+                 f"匹配 {self.match_seconds:.2f}s，动作 {self.action_seconds:.2f}s，"
+                 f"等待稳定 {self.settle_seconds:.2f}s，比固定等待节省 {self.saved_seconds:.2f}s）"]
+        for step in self.steps:
+            lines.append(f"  {step.state} --{step.transition}--> {step.target} "
+                         f"等待 {step.waited:.2f}s / {step.ticks} 轮，坐标 {step.position}")
+        return '\n'.join(lines)
+
+
+class FlowEngine:
+    """流程执行器"""
+
+    def __init__(self, capture: Callable[[], Optional[np.ndarray]], tap: Callable[[int, int], Any],
+                 location_prior: Optional[LocationPrior] = None,
+                 scale_matcher: Optional[MultiScaleMatcher] = None,
+                 executor: Optional[ThreadPoolExecutor] = None,
+                 offset: Position = (0, 0), interval: float = 0.2, settle: bool = True):
+        """
+        Args:
+            capture: 截图函数，返回 BGR 图像，失败时返回 None
+            tap: 点击函数 (x, y)，用于没有自定义动作的跳转
+            location_prior: 位置先验，优先在模板上次命中的位置附近搜索
+            scale_matcher: 多尺度匹配器
+            executor: 并行评估候选用的线程池，默认使用模板匹配共享线程池
+            offset: 截图左上角在屏幕上的坐标
+            interval: 没有候选命中时两轮之间的间隔（秒）
+            settle: 跳转后等待画面稳定（以 delay 为上限），为 False 时固定等待 delay 秒
+        """
+        self.capture = capture
+        self.tap = tap
+        self.location_prior = location_prior
+        self.scale_matcher = scale_matcher
+        self.executor = executor
+        self.offset = offset
+        self.interval = interval
+        self.settle = settle
+        # 上一轮尚未完成的自定义探测及提交时的帧签名，下一轮沿用而不重复提交
+        self._pending: Dict[Transition, Tuple[Future, Optional[np.ndarray]]] = {}
+        # 自定义探测多为 I/O 等待（控件树 dump 等），单独的线程池避免占住模板匹配的工作线程
+        self._probe_executor: Optional[ThreadPoolExecutor] = None
+
+    def _evaluate(self, frame: np.ndarray,
+                  candidates: List[Transition]) -> Optional[Tuple[Transition, Position]]:
+        """在同一帧上评估全部候选，返回声明顺序中第一个命中的跳转及其坐标
+
+        模板候选总是在本帧上评估，命中的跳转之前声明的模板候选都会等到结果，保证声明顺序即优先级。
+        自定义探测不等待：本轮未完成时跳过，留到下一轮继续使用；结果只在画面相对提交时
+        没有变化时才采用，否则重新探测，避免点击已经过时的位置。
+        """
+        session = MatchSession(frame, self.offset, location_prior=self.location_prior,
+                               scale_matcher=self.scale_matcher)
+
+        def evaluate(transition: Transition) -> Optional[Position]:
+            try:
+                if transition.probe is not None:
+                    return transition.probe(frame)
+                found = session.match(transition.template, transition.confidence, transition.color_mode)
+            except Exception as e:
+                print(f"评估跳转 {transition.name} 出错: {e}")
+                return None
+            if found is None:
+                return None
+            x, y, w, h = found
+            return (x + w // 2, y + h // 2)
+
+        if len(candidates) == 1 and candidates[0].probe is None:
+            position = evaluate(candidates[0])
+            return (candidates[0], position) if position is not None else None
+
+        executor = self.executor or get_match_executor()
+        signature = None
+        if any(t.probe is not None for t in candidates):
+            signature = frame_signature(frame)
+            if self._probe_executor is None:
+                self._probe_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='probe')
+
+        def fresh(submitted: Optional[np.ndarray]) -> bool:
+            return submitted is None or signature_change(submitted, signature) <= CHANGE_THRESHOLD
+
+        entries = []
+        for transition in candidates:
+            if transition.probe is None:
+                entries.append((executor.submit(evaluate, transition), None))
+                continue
+            entry = self._pending.pop(transition, None)
+            # 画面已变化的已完成探测作废，在本帧上重新探测
+            if entry is None or (entry[0].done() and not fresh(entry[1])):
+                entry = (self._probe_executor.submit(evaluate, transition), signature)
+            entries.append(entry)
+
+        matched = None
+        for transition, (future, submitted) in zip(candidates, entries):
+            if transition.probe is None:
+                position = future.result()
+            elif future.done() and fresh(submitted):
+                position = future.result()
+            else:
+                continue
+            if position is not None:
+                matched = (transition, position)
+                break
+
+        for transition, (future, submitted) in zip(candidates, entries):
+            if future.done():
+                continue
+            if transition.probe is not None:
+                self._pending[transition] = (future, submitted)
+            else:
+                # 优先级低于命中跳转的模板匹配不再需要
+                future.cancel()
+        return matched
+
+    def run(self, flow: Flow, timeout: Optional[float] = None) -> FlowResult:
+        """执行流程直到进入终止状态、某状态超时或总超时
+        Args:
+            flow: 流程定义
+            timeout: 总超时（秒），None 表示只受单状态超时限制
+        """
+        result = FlowResult(flow.name)
+        started = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        state = flow.start
+        self._pending.clear()
+        state_started = time.monotonic()
+        state_ticks = 0
+        while state not in flow.goals:
+            candidates = [t for t in flow.states.get(state, []) if t.available()]
+            if not candidates:
+                result.reason = f"状态 {state} 没有可用的跳转"
+                break
+            now = time.monotonic()
+            if now - state_started >= flow.state_timeout:
+                result.reason = f"状态 {state} 超时"
+                break
+            if deadline is not None and now >= deadline:
+                result.reason = "流程超时"
+                break
+
+            tick_start = time.perf_counter()
+            frame = self.capture()
+            capture_end = time.perf_counter()
+            result.capture_seconds += capture_end - tick_start
+            matched = self._evaluate(frame, candidates) if frame is not None else None
+            result.match_seconds += time.perf_counter() - capture_end
+            result.ticks += 1
+            state_ticks += 1
+            if matched is None:
+                time.sleep(self.interval)
+                continue
+
+            transition, position = matched
+            action_start = time.perf_counter()
+            if transition.action is not None:
+                transition.action(position)
+            else:
+                self.tap(position[0], position[1])
+            action_seconds = time.perf_counter() - action_start
+            result.action_seconds += action_seconds
+            result.steps.append(FlowStep(state, transition.name, transition.target, position,
+                                         time.monotonic() - state_started, state_ticks, action_seconds))
+            if transition.delay > 0:
+                settle_start = time.perf_counter()
+                if self.settle:
+                    wait_until_stable(None, transition.delay, grab=lambda region: self.capture(),
+                                      flow=flow.name, before=frame)
+                else:
+                    time.sleep(transition.delay)
+                waited = time.perf_counter() - settle_start
+                result.settle_seconds += waited
+                result.saved_seconds += max(0.0, transition.delay - waited)
+            state = transition.target
+            # 旧状态遗留的评估结果已过时，后台任务完成后直接丢弃
+            self._pending.clear()
+            state_started = time.monotonic()
+            state_ticks = 0
+
+        result.final_state = state
+        result.success = state in flow.goals
+        result.total_seconds = time.perf_counter() - started
+        return result
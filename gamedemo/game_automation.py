@@ -4,32 +4,59 @@ Game Automation Script
 自动化登录PC游戏并执行打怪任务
 """
 
-import pyautogui
-import cv2
 import numpy as np
-import win32gui
-import win32con
 import time
 import os
+import sys
 import logging
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List, Dict
+
+# 共享模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from template_cache import shared_template_cache
+from template_matcher import (LocationPrior, MatchSession, MultiScaleMatcher, convert_frame,
+                              resolve_color_mode)
+from screen_change import AdaptivePoller, wait_until_stable
+from screen_capture import CaptureBackend, get_default_backend
+from tracing import CAPTURE, FIND, INPUT, traced
+from watcher import WatchEvent, WatcherService
+
+try:
+    import pyautogui
+except Exception:  # 无显示器环境下导入会失败，此时只能使用自定义截图后端
+    pyautogui = None
+
+try:
+    import win32gui
+    import win32con
+except ImportError:  # 非Windows系统
+    win32gui = win32con = None
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # 全局配置
-pyautogui.FAILSAFE = True  # 鼠标移动到左上角停止
-pyautogui.PAUSE = 0.1  # 操作间隔
+if pyautogui:
+    pyautogui.FAILSAFE = True  # 鼠标移动到左上角停止
+    pyautogui.PAUSE = 0.1  # 操作间隔
 
 
 class GameAutomation:
     """游戏自动化主类"""
     
-    def __init__(self, game_window_title: str = "Game"):
+    def __init__(self, game_window_title: str = "Game", capture_backend: Optional[CaptureBackend] = None,
+                 color_mode: str = 'bgr', template_reference_size: Optional[Tuple[int, int]] = None):
         self.game_window_title = game_window_title
+        # 默认匹配颜色模式 ('bgr', 'gray', 'b', 'g', 'r')
+        self.color_mode = color_mode
+        # 指定截取模板时的窗口尺寸后启用多尺度匹配，窗口缩放后模板仍能匹配
+        self.scale_matcher = MultiScaleMatcher(template_reference_size) if template_reference_size else None
         self.game_hwnd = None
+        self.capture_backend = capture_backend or get_default_backend()
         self.templates_dir = "templates"
+        # 记录各模板上次出现的位置，优先在附近搜索
+        self.location_prior = LocationPrior()
         
         # 创建模板图片目录
         os.makedirs(self.templates_dir, exist_ok=True)
@@ -50,9 +77,18 @@ class GameAutomation:
     def activate_window(self, hwnd: int) -> bool:
         """激活窗口"""
         try:
+            # 窗口已在前台时画面不会切换，无需等待
+            was_foreground = win32gui.GetForegroundWindow() == hwnd
+            left, top, right, bottom = self.get_window_rect(hwnd)
+            region = (left, top, right - left, bottom - top)
+            before = None if was_foreground else self.capture_backend.grab(region)
             win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
             win32gui.SetForegroundWindow(hwnd)
-            time.sleep(0.5)
+            if not was_foreground:
+                # 窗口重绘完成即返回，最多等待0.5秒
+                left, top, right, bottom = self.get_window_rect(hwnd)
+                wait_until_stable((left, top, right - left, bottom - top), 0.5,
+                                  grab=self.capture_backend.grab, flow="激活窗口", before=before)
             return True
         except Exception as e:
             logger.error(f"激活窗口失败: {e}")
@@ -62,20 +98,75 @@ class GameAutomation:
         """获取窗口坐标"""
         return win32gui.GetWindowRect(hwnd)
     
-    def screenshot_window(self, hwnd: int) -> np.ndarray:
-        """截取窗口截图"""
-        rect = self.get_window_rect(hwnd)
-        screenshot = pyautogui.screenshot(region=rect)
-        return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+    @traced(CAPTURE)
+    def screenshot_window(self, hwnd: int, rect: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+        """截取窗口截图
+        Args:
+            hwnd: 窗口句柄
+            rect: 已获取的窗口坐标，为None时重新获取
+        """
+        if rect is None:
+            rect = self.get_window_rect(hwnd)
+        left, top, right, bottom = rect
+        return self.capture_backend.grab_bgr((left, top, right - left, bottom - top))
     
+    def capture_frame(self) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """截取一帧游戏画面
+        Returns:
+            (截图, 截图左上角的屏幕坐标)
+        """
+        if self.game_hwnd:
+            rect = self.get_window_rect(self.game_hwnd)
+            return self.screenshot_window(self.game_hwnd, rect), (rect[0], rect[1])
+        return self.capture_backend.grab_bgr(), (0, 0)
+    
+    def create_match_session(self) -> MatchSession:
+        """截取一帧并创建匹配会话，同一帧可匹配多个模板"""
+        screenshot, offset = self.capture_frame()
+        return MatchSession(screenshot, offset, location_prior=self.location_prior,
+                            color_mode=self.color_mode, scale_matcher=self.scale_matcher)
+    
+    def create_watcher_service(self, interval: float = 0.2) -> WatcherService:
+        """创建在游戏画面上运行的监视服务，多个条件共用一次截图"""
+        return WatcherService(self.capture_frame, interval, color_mode=self.color_mode,
+                              location_prior=self.location_prior, scale_matcher=self.scale_matcher)
+    
+    def find_templates(self, template_paths: List[str], threshold: float = 0.8,
+                       color_mode: Optional[str] = None) -> Dict[str, Optional[Tuple[int, int]]]:
+        """在同一帧截图中并行查找多个模板
+        Args:
+            template_paths: 模板图片路径列表
+            threshold: 匹配阈值
+            color_mode: 匹配颜色模式，None 时按模板指定的模式或实例默认值
+        Returns:
+            {模板路径: 中心点屏幕坐标或None}
+        """
+        for template_path in template_paths:
+            if not os.path.exists(template_path):
+                logger.error(f"模板文件不存在: {template_path}")
+        
+        session = self.create_match_session()
+        results = session.match_many(template_paths, threshold, color_mode)
+        positions = {}
+        for template_path, found in results.items():
+            if found:
+                x, y, w, h = found
+                positions[template_path] = (x + w // 2, y + h // 2)
+            else:
+                positions[template_path] = None
+        return positions
+    
+    @traced(FIND)
     def find_template(self, template_path: str, threshold: float = 0.8, 
-                     screenshot: Optional[np.ndarray] = None) -> Optional[Tuple[int, int]]:
+                     screenshot: Optional[np.ndarray] = None,
+                     color_mode: Optional[str] = None) -> Optional[Tuple[int, int]]:
         """在屏幕上查找模板图片"""
         if not os.path.exists(template_path):
             logger.error(f"模板文件不存在: {template_path}")
             return None
         
-        template = cv2.imread(template_path, cv2.IMREAD_COLOR)
+        color_mode = resolve_color_mode(template_path, color_mode, self.color_mode)
+        template = shared_template_cache.get(template_path, color_mode)
         if template is None:
             logger.error(f"无法读取模板文件: {template_path}")
             return None
@@ -84,15 +175,20 @@ class GameAutomation:
             if self.game_hwnd:
                 screenshot = self.screenshot_window(self.game_hwnd)
             else:
-                screenshot = cv2.cvtColor(np.array(pyautogui.screenshot()), cv2.COLOR_RGB2BGR)
+                screenshot = self.capture_backend.grab_bgr()
+        screenshot = convert_frame(screenshot, color_mode)
         
-        result = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if self.scale_matcher:
+            # 窗口截图尺寸即窗口尺寸，据此预测模板尺度
+            target = (screenshot.shape[1], screenshot.shape[0])
+            found = self.scale_matcher.match(screenshot, template_path, target, threshold, color_mode)
+        else:
+            found = self.location_prior.match(screenshot, template, template_path, threshold)
         
-        if max_val >= threshold:
-            h, w = template.shape[:2]
-            center_x = max_loc[0] + w // 2
-            center_y = max_loc[1] + h // 2
+        if found:
+            x, y, w, h = found
+            center_x = x + w // 2
+            center_y = y + h // 2
             
             # 如果是窗口截图，需要转换为屏幕坐标
             if self.game_hwnd:
@@ -117,14 +213,17 @@ class GameAutomation:
     
     def wait_for_template(self, template_path: str, timeout: int = 30, 
                          threshold: float = 0.8) -> bool:
-        """等待模板出现"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if self.find_template(template_path, threshold):
+        """等待模板出现（画面未变化时跳过匹配，轮询间隔随画面变化自适应调整）"""
+        deadline = time.time() + timeout
+        poller = AdaptivePoller(1.0)
+        while time.time() < deadline:
+            screenshot, _ = self.capture_frame()
+            if poller.should_check(screenshot) and self.find_template(template_path, threshold, screenshot):
                 return True
-            time.sleep(1)
+            poller.sleep(deadline)
         return False
     
+    @traced(INPUT)
     def safe_click(self, x: int, y: int, clicks: int = 1, button: str = 'left'):
         """安全点击，避免误操作"""
         try:
@@ -133,6 +232,7 @@ class GameAutomation:
         except Exception as e:
             logger.error(f"点击失败: {e}")
     
+    @traced(INPUT)
     def safe_type(self, text: str, interval: float = 0.01):
         """安全输入文本"""
         try:
@@ -196,8 +296,10 @@ class GameAutomation:
             f"{self.templates_dir}/monster3.png"
         ]
         
+        # 一次截图匹配全部怪物模板，按列表顺序取第一个命中的
+        positions = self.find_templates(monster_templates, threshold=0.7)
         for template in monster_templates:
-            position = self.find_template(template, threshold=0.7)
+            position = positions[template]
             if position:
                 logger.info(f"发现怪物: {template}")
                 return position
@@ -221,46 +323,67 @@ class GameAutomation:
             logger.error(f"攻击失败: {e}")
             return False
     
-    def check_character_health(self) -> bool:
-        """检查角色血量"""
-        # 检查血量是否过低
-        if self.find_template(f"{self.templates_dir}/low_health.png", threshold=0.8):
-            logger.warning("血量过低，使用回血道具")
-            pyautogui.press('r')  # 假设r是回血快捷键
-            time.sleep(3)
-            return False
-        return True
+    def _on_low_health(self, event: WatchEvent) -> None:
+        """血量过低时使用回血道具（在监视服务的回调线程中执行）"""
+        logger.warning("血量过低，使用回血道具")
+        pyautogui.press('r')  # 假设r是回血快捷键
     
-    def auto_hunt_monsters(self, duration: int = 3600) -> None:
-        """自动打怪"""
+    def auto_hunt_monsters(self, duration: int = 3600, frame_timeout: float = 10.0) -> None:
+        """自动打怪
+        血量和怪物由同一个监视服务检查，每帧只截图一次
+        Args:
+            duration: 持续时间（秒）
+            frame_timeout: 监视服务超过该秒数没有评估到新画面时停止打怪
+        """
         start_time = time.time()
+        hunt_started = time.monotonic()
         logger.info(f"开始自动打怪，持续时间: {duration}秒")
         
-        while time.time() - start_time < duration:
-            try:
-                # 检查角色状态
-                if not self.check_character_health():
-                    continue
-                
-                # 查找怪物
-                monster_pos = self.find_monster()
-                if monster_pos:
-                    self.attack_monster(monster_pos)
-                    time.sleep(1)
-                else:
-                    # 没有怪物，移动角色
-                    self.move_character_randomly()
-                    time.sleep(2)
-                
-                # 避免过度占用CPU
-                time.sleep(0.5)
-                
-            except KeyboardInterrupt:
-                logger.info("用户中断打怪")
-                break
-            except Exception as e:
-                logger.error(f"打怪过程中出错: {e}")
-                time.sleep(5)
+        service = self.create_watcher_service()
+        # 血量持续过低时每3秒再使用一次回血道具
+        low_health = service.on_appear(f"{self.templates_dir}/low_health.png", self._on_low_health,
+                                       threshold=0.8, repeat=3.0)
+        monsters = [service.watch(f"{self.templates_dir}/monster{index}.png", threshold=0.7)
+                    for index in range(1, 4)]
+        
+        with service:
+            while time.time() - start_time < duration:
+                try:
+                    # 截图持续失败时订阅状态不会更新（从未截到画面时一直为 None）
+                    last_update = low_health.updated or hunt_started
+                    if time.monotonic() - last_update > frame_timeout:
+                        logger.error(f"{frame_timeout}秒内没有获取到游戏画面，停止自动打怪: {service.stats()}")
+                        break
+                    if low_health.visible is None:
+                        time.sleep(0.5)
+                        continue
+                    
+                    # 检查角色状态，回血期间不攻击
+                    if low_health.visible:
+                        time.sleep(0.5)
+                        continue
+                    
+                    # 查找怪物，按列表顺序取第一个可见的
+                    monster = next((watcher for watcher in monsters if watcher.visible), None)
+                    if monster:
+                        logger.info(f"发现怪物: {monster.template}")
+                        self.attack_monster(monster.position)
+                        time.sleep(1)
+                    else:
+                        # 没有怪物，移动角色
+                        self.move_character_randomly()
+                        time.sleep(2)
+                    
+                    # 避免过度占用CPU
+                    time.sleep(0.5)
+                    
+                except KeyboardInterrupt:
+                    logger.info("用户中断打怪")
+                    break
+                except Exception as e:
+                    logger.error(f"打怪过程中出错: {e}")
+                    time.sleep(5)
+        logger.info(f"监视统计: {service.stats()}")
     
     def move_character_randomly(self) -> None:
         """随机移动角色"""
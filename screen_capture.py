@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+屏幕截图后端
+统一的截图接口，提供以下实现：
+- XShmBackend: Linux/X11 共享内存截图，持有显示连接和共享内存段，直接返回BGRA视图，无中间拷贝
+- PyAutoGUIBackend: 基于 pyautogui.screenshot() 的通用实现（Windows/macOS）
+- FakeCaptureBackend: 按脚本返回预设帧的内存后端，用于无显示器环境下的测试和基准测试
+以及后台截图线程 CaptureThread：按目标帧率截图写入预分配的环形缓冲区，
+使用方可非阻塞地取最新帧，或等待比指定时间戳更新的帧
+"""
+
+import ctypes
+import ctypes.util
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from tracing import CAPTURE, traced
+
+
+Region = Tuple[int, int, int, int]
+
+
+class CaptureBackend:
+    """截图后端基类"""
+
+    # grab() 返回图像的通道数：3 表示BGR，4 表示BGRA
+    channels = 3
+
+    def size(self) -> Tuple[int, int]:
+        """获取屏幕尺寸 (width, height)"""
+        raise NotImplementedError
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        """截取屏幕
+        Args:
+            region: 截图区域 (x, y, width, height)，为None时截取全屏
+        Returns:
+            BGR 或 BGRA 图像（见 channels），可能直接引用后端持有的图像（如模拟后端的预设帧），调用方不应修改
+        """
+        raise NotImplementedError
+
+    def grab_bgr(self, region: Optional[Region] = None) -> np.ndarray:
+        """截取屏幕并返回独立的BGR图像"""
+        frame = self.grab(region)
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+        return frame.copy()
+
+    def grab_gray(self, region: Optional[Region] = None) -> np.ndarray:
+        """截取屏幕并返回灰度图像"""
+        frame = self.grab(region)
+        if frame.ndim == 2:
+            return frame.copy()
+        code = cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(frame, code)
+
+    def close(self) -> None:
+        """释放后端持有的资源"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PyAutoGUIBackend(CaptureBackend):
+    """pyautogui 截图后端（截图 -> PIL -> numpy -> BGR）"""
+
+    channels = 3
+
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def size(self) -> Tuple[int, int]:
+        width, height = self._pyautogui.size()
+        return width, height
+
+    @traced(CAPTURE)
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        if region:
+            screenshot = self._pyautogui.screenshot(region=region)
+        else:
+            screenshot = self._pyautogui.screenshot()
+        return cv2.cvtColor(np.asarray(screenshot), cv2.COLOR_RGB2BGR)
+
+    def grab_bgr(self, region: Optional[Region] = None) -> np.ndarray:
+        # grab() 已经返回新分配的BGR图像，无需再拷贝
+        return self.grab(region)
+
+
+# ==================== X11 共享内存截图 ====================
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [('shmseg', ctypes.c_ulong), ('shmid', ctypes.c_int),
+                ('shmaddr', ctypes.c_void_p), ('readOnly', ctypes.c_int)]
+
+
+class _XImage(ctypes.Structure):
+    # 仅声明用到的前几个字段
+    _fields_ = [('width', ctypes.c_int), ('height', ctypes.c_int), ('xoffset', ctypes.c_int),
+                ('format', ctypes.c_int), ('data', ctypes.c_void_p), ('byte_order', ctypes.c_int),
+                ('bitmap_unit', ctypes.c_int), ('bitmap_bit_order', ctypes.c_int),
+                ('bitmap_pad', ctypes.c_int), ('depth', ctypes.c_int),
+                ('bytes_per_line', ctypes.c_int), ('bits_per_pixel', ctypes.c_int)]
+
+
+_ZPIXMAP = 2
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+_ALL_PLANES = ctypes.c_ulong(-1).value
+
+
+def _load_library(name: str) -> ctypes.CDLL:
+    path = ctypes.util.find_library(name)
+    if path is None:
+        raise OSError(f"未找到动态库: {name}")
+    return ctypes.CDLL(path)
+
+
+class _ShmImage:
+    """一块与固定尺寸XImage绑定的共享内存"""
+
+    __slots__ = ('ximage', 'shminfo', 'array')
+
+    def __init__(self, ximage, shminfo: _XShmSegmentInfo, array: np.ndarray):
+        self.ximage = ximage
+        self.shminfo = shminfo
+        self.array = array
+
+
+class XShmBackend(CaptureBackend):
+    """Linux/X11 共享内存截图后端
+    显示连接和共享内存段在实例生命周期内保持打开，每次截图只调用一次 XShmGetImage。
+    共享内存会被下一次截图覆盖，并可能在淘汰或 close() 时被解除映射，因此拷贝和颜色转换
+    都在锁内直接从共享内存完成，返回的始终是独立的图像，不会把共享内存的视图交给调用方
+    """
+
+    channels = 4
+
+    def __init__(self, display: Optional[str] = None, max_segments: int = 4):
+        """
+        Args:
+            display: X显示名，默认读取 DISPLAY 环境变量
+            max_segments: 最多保留的共享内存段数量（每种截图区域尺寸一个）
+        """
+        self._xlib = _load_library('X11')
+        self._xext = _load_library('Xext')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._declare_functions()
+
+        name = (display or os.environ.get('DISPLAY', '')).encode() or None
+        self._display = self._xlib.XOpenDisplay(name)
+        if not self._display:
+            raise OSError(f"无法打开X显示: {display or os.environ.get('DISPLAY')}")
+        if not self._xext.XShmQueryExtension(self._display):
+            self._xlib.XCloseDisplay(self._display)
+            self._display = None
+            raise OSError("X服务器不支持MIT-SHM扩展")
+
+        screen = self._xlib.XDefaultScreen(self._display)
+        self._root = self._xlib.XRootWindow(self._display, screen)
+        self._visual = self._xlib.XDefaultVisual(self._display, screen)
+        self._depth = self._xlib.XDefaultDepth(self._display, screen)
+        self._width = self._xlib.XDisplayWidth(self._display, screen)
+        self._height = self._xlib.XDisplayHeight(self._display, screen)
+        self._segments: "OrderedDict[Tuple[int, int], _ShmImage]" = OrderedDict()
+        self._max_segments = max_segments
+        self._lock = threading.Lock()
+
+    def _declare_functions(self) -> None:
+        xlib, xext, libc = self._xlib, self._xext, self._libc
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        xlib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDefaultVisual.restype = ctypes.c_void_p
+        xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                         ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo),
+                                         ctypes.c_uint, ctypes.c_uint]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage),
+                                      ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def size(self) -> Tuple[int, int]:
+        return self._width, self._height
+
+    def _create_segment(self, width: int, height: int) -> _ShmImage:
+        """创建指定尺寸的共享内存XImage"""
+        shminfo = _XShmSegmentInfo()
+        ximage = self._xext.XShmCreateImage(self._display, self._visual, self._depth, _ZPIXMAP,
+                                            None, ctypes.byref(shminfo), width, height)
+        if not ximage:
+            raise OSError("XShmCreateImage 失败")
+        image = ximage.contents
+        if image.bits_per_pixel != 32:
+            self._xlib.XDestroyImage(ximage)
+            raise OSError(f"不支持的像素格式: {image.bits_per_pixel} bpp")
+
+        nbytes = image.bytes_per_line * height
+        shminfo.shmid = self._libc.shmget(_IPC_PRIVATE, nbytes, _IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            self._xlib.XDestroyImage(ximage)
+            raise OSError(ctypes.get_errno(), "shmget 失败")
+        address = self._libc.shmat(shminfo.shmid, None, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            self._libc.shmctl(shminfo.shmid, _IPC_RMID, None)
+            self._xlib.XDestroyImage(ximage)
+            raise OSError(ctypes.get_errno(), "shmat 失败")
+        shminfo.shmaddr = image.data = address
+        shminfo.readOnly = 0
+        self._xext.XShmAttach(self._display, ctypes.byref(shminfo))
+        self._xlib.XSync(self._display, 0)
+        # X服务器已挂接，标记删除后进程退出时系统会自动回收共享内存段
+        self._libc.shmctl(shminfo.shmid, _IPC_RMID, None)
+
+        buffer = (ctypes.c_ubyte * nbytes).from_address(address)
+        rows = np.ctypeslib.as_array(buffer).reshape(height, image.bytes_per_line)
+        array = rows[:, :width * 4].reshape(height, width, 4)
+        return _ShmImage(ximage, shminfo, array)
+
+    def _release_segment(self, segment: _ShmImage) -> None:
+        self._xext.XShmDetach(self._display, ctypes.byref(segment.shminfo))
+        self._xlib.XDestroyImage(segment.ximage)
+        self._libc.shmdt(ctypes.c_void_p(segment.shminfo.shmaddr))
+
+    def _grab_segment(self, region: Optional[Region],
+                      convert: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """截图到共享内存，并在持有锁时用 convert 生成独立的结果图像"""
+        if region:
+            # 超出屏幕范围会触发X错误导致进程退出，先裁剪到屏幕内
+            x = min(max(0, int(region[0])), self._width - 1)
+            y = min(max(0, int(region[1])), self._height - 1)
+            width = max(1, min(int(region[2]), self._width - x))
+            height = max(1, min(int(region[3]), self._height - y))
+        else:
+            x, y, width, height = 0, 0, self._width, self._height
+
+        with self._lock:
+            if self._display is None:
+                raise RuntimeError("截图后端已关闭")
+            segment = self._segments.get((width, height))
+            if segment is None:
+                segment = self._create_segment(width, height)
+                self._segments[(width, height)] = segment
+                while len(self._segments) > self._max_segments:
+                    _, oldest = self._segments.popitem(last=False)
+                    self._release_segment(oldest)
+            else:
+                self._segments.move_to_end((width, height))
+            if not self._xext.XShmGetImage(self._display, self._root, segment.ximage, x, y, _ALL_PLANES):
+                raise OSError("XShmGetImage 失败")
+            return convert(segment.array)
+
+    @traced(CAPTURE)
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        """返回BGRA图像的独立副本"""
+        return self._grab_segment(region, np.copy)
+
+    @traced(CAPTURE)
+    def grab_bgr(self, region: Optional[Region] = None) -> np.ndarray:
+        # 直接从共享内存转换，不经过中间的BGRA副本
+        return self._grab_segment(region, lambda array: cv2.cvtColor(array, cv2.COLOR_BGRA2BGR))
+
+    @traced(CAPTURE)
+    def grab_gray(self, region: Optional[Region] = None) -> np.ndarray:
+        return self._grab_segment(region, lambda array: cv2.cvtColor(array, cv2.COLOR_BGRA2GRAY))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._display is None:
+                return
+            for segment in self._segments.values():
+                self._release_segment(segment)
+            self._segments.clear()
+            self._xlib.XCloseDisplay(self._display)
+            self._display = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# ==================== 测试用内存后端 ====================
+
+class FakeCaptureBackend(CaptureBackend):
+    """按顺序返回预设帧的截图后端
+    帧用完后：loop=True 时从头循环，否则一直返回最后一帧
+    """
+
+    def __init__(self, frames: Iterable[np.ndarray], loop: bool = False):
+        self.frames: List[np.ndarray] = list(frames)
+        if not self.frames:
+            raise ValueError("至少需要提供一帧")
+        self.loop = loop
+        self.index = 0
+        self.grab_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def channels(self) -> int:
+        frame = self.frames[0]
+        return 1 if frame.ndim == 2 else frame.shape[2]
+
+    def size(self) -> Tuple[int, int]:
+        height, width = self.frames[0].shape[:2]
+        return width, height
+
+    def push(self, frame: np.ndarray) -> None:
+        """追加一帧"""
+        with self._lock:
+            self.frames.append(frame)
+
+    def set_frame(self, frame: np.ndarray) -> None:
+        """替换为单一固定帧"""
+        with self._lock:
+            self.frames = [frame]
+            self.index = 0
+
+    @traced(CAPTURE)
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        with self._lock:
+            if self.index >= len(self.frames):
+                self.index = 0 if self.loop else len(self.frames) - 1
+            frame = self.frames[self.index]
+            self.index += 1
+            self.grab_count += 1
+        if region:
+            x, y, width, height = region
+            return frame[y:y + height, x:x + width]
+        return frame
+
+
+# ==================== 后台截图 ====================
+
+class FrameRingBuffer:
+    """预分配的帧环形缓冲区（单生产者，多消费者）
+    生产者写入的槽位永远不是当前最新帧所在的槽位，因此读取最新帧时不会与写入冲突
+    """
+
+    def __init__(self, slots: int = 3):
+        """
+        Args:
+            slots: 槽位数量（至少2个）
+        """
+        if slots < 2:
+            raise ValueError("环形缓冲区至少需要2个槽位")
+        self._slots: List[Optional[np.ndarray]] = [None] * slots
+        self._timestamps = [0.0] * slots
+        self._count = 0
+        self._cond = threading.Condition()
+
+    @property
+    def count(self) -> int:
+        """已写入的帧总数"""
+        return self._count
+
+    def next_slot(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """获取下一个可写槽位（尺寸变化时才重新分配）"""
+        index = self._count % len(self._slots)
+        slot = self._slots[index]
+        if slot is None or slot.shape != tuple(shape) or slot.dtype != dtype:
+            slot = np.empty(shape, dtype=dtype)
+            self._slots[index] = slot
+        return slot
+
+    def publish(self, timestamp: float) -> None:
+        """发布 next_slot() 返回的槽位中刚写好的帧"""
+        with self._cond:
+            self._timestamps[self._count % len(self._slots)] = timestamp
+            self._count += 1
+            self._cond.notify_all()
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None) -> None:
+        """拷贝一帧到缓冲区"""
+        np.copyto(self.next_slot(frame.shape, frame.dtype), frame)
+        self.publish(time.monotonic() if timestamp is None else timestamp)
+
+    def _latest_locked(self, copy: bool) -> Optional[Tuple[np.ndarray, float]]:
+        if self._count == 0:
+            return None
+        index = (self._count - 1) % len(self._slots)
+        frame = self._slots[index]
+        return (frame.copy() if copy else frame), self._timestamps[index]
+
+    def latest(self, copy: bool = False) -> Optional[Tuple[np.ndarray, float]]:
+        """非阻塞获取最新帧
+        Args:
+            copy: 是否返回拷贝；不拷贝时返回的数组会在若干帧之后被覆盖
+        Returns:
+            (帧, 时间戳)，尚无帧时返回 None
+        """
+        with self._cond:
+            return self._latest_locked(copy)
+
+    def wait_newer(self, timestamp: float, timeout: Optional[float] = None,
+                   copy: bool = False) -> Optional[Tuple[np.ndarray, float]]:
+        """等待时间戳晚于 timestamp 的帧
+        Args:
+            timestamp: 已处理帧的时间戳（time.monotonic()），传0表示任意帧
+            timeout: 超时时间（秒），None 表示一直等待
+            copy: 是否返回拷贝
+        Returns:
+            (帧, 时间戳)，超时返回 None
+        """
+        def ready():
+            return self._count > 0 and self._timestamps[(self._count - 1) % len(self._slots)] > timestamp
+
+        with self._cond:
+            if not self._cond.wait_for(ready, timeout):
+                return None
+            return self._latest_locked(copy)
+
+
+class CaptureThread:
+    """后台截图线程：按目标帧率持续截图到环形缓冲区"""
+
+    def __init__(self, backend: Optional[CaptureBackend] = None, fps: float = 10.0,
+                 region: Optional[Region] = None, slots: int = 3):
+        """
+        Args:
+            backend: 截图后端，默认使用默认后端
+            fps: 目标帧率
+            region: 截图区域 (x, y, width, height)，为None时截取全屏
+            slots: 环形缓冲区槽位数
+        """
+        self.backend = backend or get_default_backend()
+        self.fps = fps
+        self.region = region
+        self.buffer = FrameRingBuffer(slots)
+        self.errors = 0
+        self.capture_seconds = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'CaptureThread':
+        """启动截图线程"""
+        if not self.running:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='capture', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """停止截图线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _capture_once(self) -> None:
+        start = time.perf_counter()
+        frame = self.backend.grab(self.region)
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            # 直接转换到预分配的槽位中，不产生额外拷贝
+            slot = self.buffer.next_slot(frame.shape[:2] + (3,), frame.dtype)
+            cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=slot)
+        else:
+            np.copyto(self.buffer.next_slot(frame.shape, frame.dtype), frame)
+        self.buffer.publish(time.monotonic())
+        self.capture_seconds += time.perf_counter() - start
+
+    def _run(self) -> None:
+        period = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self._capture_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"后台截图出错: {e}")
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                # 截图跟不上目标帧率，不追赶
+                next_time = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def latest(self, copy: bool = False) -> Optional[Tuple[np.ndarray, float]]:
+        """非阻塞获取最新帧（BGR），见 FrameRingBuffer.latest"""
+        return self.buffer.latest(copy)
+
+    def wait_newer(self, timestamp: float, timeout: Optional[float] = None,
+                   copy: bool = False) -> Optional[Tuple[np.ndarray, float]]:
+        """等待比 timestamp 更新的帧（BGR），见 FrameRingBuffer.wait_newer"""
+        return self.buffer.wait_newer(timestamp, timeout, copy)
+
+    def stats(self) -> dict:
+        """获取截图帧数、出错次数与平均截图耗时"""
+        frames = self.buffer.count
+        return {
+            'frames': frames,
+            'errors': self.errors,
+            'avg_capture_seconds': self.capture_seconds / frames if frames else 0.0,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+# ==================== 默认后端 ====================
+
+_default_backend: Optional[CaptureBackend] = None
+_default_lock = threading.Lock()
+
+
+def get_default_backend() -> CaptureBackend:
+    """获取默认截图后端（首次调用时创建）
+    Linux下有X显示时优先使用共享内存后端，否则使用pyautogui后端
+    """
+    global _default_backend
+    with _default_lock:
+        if _default_backend is None:
+            if sys.platform.startswith('linux') and os.environ.get('DISPLAY'):
+                try:
+                    _default_backend = XShmBackend()
+                except OSError as e:
+                    print(f"共享内存截图不可用，改用pyautogui: {e}")
+            if _default_backend is None:
+                _default_backend = PyAutoGUIBackend()
+        return _default_backend
+
+
+def set_default_backend(backend: Optional[CaptureBackend]) -> None:
+    """设置默认截图后端（传入None时恢复自动选择）"""
+    global _default_backend
+    with _default_lock:
+        _default_backend = backend
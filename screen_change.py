@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+屏幕变化检测
+计算低成本的帧签名（缩小后的灰度图），用于在画面未变化时跳过模板匹配，
+根据画面变化情况自适应调整轮询间隔，以及在操作后等待画面稳定（代替固定等待）
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from screen_capture import get_default_backend
+
+Region = Tuple[int, int, int, int]
+
+# 签名中任一格子的灰度差超过该值视为画面发生变化（0~255）
+CHANGE_THRESHOLD = 8.0
+
+
+def frame_signature(frame: np.ndarray, size: Tuple[int, int] = (64, 36)) -> np.ndarray:
+    """计算帧签名
+    Args:
+        frame: BGR、BGRA 或灰度图像
+        size: 签名尺寸 (width, height)
+    Returns:
+        缩小后的灰度图（uint8）
+    """
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        code = cv2.COLOR_BGRA2GRAY if small.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        small = cv2.cvtColor(small, code)
+    return small
+
+
+def signature_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """两个帧签名的平均绝对差（0~255）"""
+    if a.shape != b.shape:
+        return 255.0
+    return float(cv2.absdiff(a, b).mean())
+
+
+def signature_change(a: np.ndarray, b: np.ndarray) -> float:
+    """两个帧签名中差异最大的格子的灰度差（0~255）
+    平均差会被大面积未变化的区域稀释（1080p 上出现一个按钮的平均差不到 1），
+    按格子取最大值时，只要变化覆盖了一个签名格子的相当一部分就能检测到
+    """
+    if a.shape != b.shape:
+        return 255.0
+    return float(cv2.absdiff(a, b).max())
+
+
+class AdaptivePoller:
+    """自适应轮询器
+    画面变化时缩短轮询间隔，画面静止时逐步放宽间隔，并告知调用方本帧是否需要重新匹配。
+    变化是相对上一次实际匹配时的画面判断的（而不是上一次采样），缓慢的渐变累积到阈值后同样会触发；
+    距上次匹配超过 max_interval 时无论画面是否变化都强制匹配一次
+    """
+
+    def __init__(self, interval: float = 0.5, min_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, change_threshold: float = CHANGE_THRESHOLD,
+                 backoff: float = 1.5):
+        """
+        Args:
+            interval: 初始轮询间隔（秒）
+            min_interval: 最短间隔，默认为初始间隔的1/4
+            max_interval: 最长间隔，默认为初始间隔的4倍；也是两次实际匹配之间的最长间隔
+            change_threshold: 签名任一格子的灰度差超过该值视为画面发生变化
+            backoff: 画面静止时每次间隔放大的倍数
+        """
+        self.interval = interval
+        self.min_interval = min_interval if min_interval is not None else interval / 4
+        self.max_interval = max_interval if max_interval is not None else interval * 4
+        self.change_threshold = change_threshold
+        self.backoff = backoff
+        # 上一次实际匹配时的签名和时间
+        self._last_signature: Optional[np.ndarray] = None
+        self._last_check = 0.0
+        self.checked = 0
+        self.skipped = 0
+        self.forced = 0
+
+    def should_check(self, frame: np.ndarray) -> bool:
+        """判断本帧是否需要重新匹配，并据此调整轮询间隔
+        Returns:
+            首帧、画面相对上次匹配发生变化或距上次匹配超过 max_interval 时返回 True
+        """
+        signature = frame_signature(frame)
+        now = time.monotonic()
+        if self._last_signature is None:
+            changed = True
+        else:
+            changed = signature_change(signature, self._last_signature) > self.change_threshold
+
+        if changed:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        if changed or now - self._last_check >= self.max_interval:
+            if not changed:
+                self.forced += 1
+            self.checked += 1
+            self._last_signature = signature
+            self._last_check = now
+            return True
+        self.skipped += 1
+        return False
+
+    def sleep(self, deadline: Optional[float] = None) -> None:
+        """按当前间隔等待，不超过截止时间（time.time() 时间戳）"""
+        delay = self.interval
+        if deadline is not None:
+            delay = min(delay, deadline - time.time())
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SettleReport:
+    """记录各流程中“等待画面稳定”相对原固定等待节省的时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 流程名 -> [等待次数, 稳定次数, 固定等待总时长, 实际等待总时长]
+        self.flows: Dict[str, list] = {}
+
+    def record(self, flow: str, max_wait: float, waited: float, stable: bool) -> None:
+        with self._lock:
+            entry = self.flows.setdefault(flow, [0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += int(stable)
+            entry[2] += max_wait
+            entry[3] += min(waited, max_wait)
+
+    def saved_seconds(self, flow: Optional[str] = None) -> float:
+        """节省的总时间（秒），flow 为 None 时统计全部流程"""
+        with self._lock:
+            entries = self.flows.values() if flow is None else [self.flows.get(flow, [0, 0, 0.0, 0.0])]
+            return sum(entry[2] - entry[3] for entry in entries)
+
+    def summary(self) -> str:
+        """生成各流程的节省时间报告"""
+        with self._lock:
+            lines = ["等待画面稳定统计:"]
+            for flow, (waits, stable, fixed, waited) in self.flows.items():
+                lines.append(f"  {flow}: {waits} 次等待（{stable} 次提前稳定），固定等待 {fixed:.2f}s，"
+                             f"实际 {waited:.2f}s，节省 {fixed - waited:.2f}s")
+            return '\n'.join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.flows.clear()
+
+
+# 默认统计对象
+settle_report = SettleReport()
+
+
+def wait_until_stable(roi: Optional[Region] = None, max_wait: float = 3.0,
+                      grab: Optional[Callable[[Optional[Region]], Optional[np.ndarray]]] = None,
+                      threshold: float = CHANGE_THRESHOLD, stable_frames: int = 2, interval: float = 0.05,
+                      min_wait: float = 0.1, flow: str = 'default',
+                      report: Optional[SettleReport] = None, before: Optional[np.ndarray] = None,
+                      require_change: bool = True) -> bool:
+    """等待区域内画面完成切换并停止变化，代替操作后的固定等待
+    先确认画面相对操作前发生过变化（与 before 比较，或相邻两帧之间出现变化），
+    之后连续 stable_frames 次相邻两帧的签名都没有变化时立即返回；
+    界面还没开始响应时不会提前返回，没有观察到变化就一直等到 max_wait（与原固定等待相同）
+    Args:
+        roi: 检测区域 (x, y, width, height)，None 表示整个屏幕
+        max_wait: 最长等待（秒），通常取原来的固定等待时长
+        grab: 截图函数 (区域) -> 图像，默认使用默认截图后端
+        threshold: 签名任一格子的灰度差超过该值视为画面发生变化
+        stable_frames: 变化后需要连续稳定的次数
+        interval: 两次截图之间的间隔（秒）
+        min_wait: 最短等待，给界面开始响应留出时间
+        flow: 计入统计的流程名
+        report: 统计对象，默认使用 settle_report
+        before: 操作前同一区域的截图，画面在第一次截图前就已切换完成时也能识别出变化
+        require_change: 为 False 时不要求观察到变化，画面一开始就稳定也立即返回
+    Returns:
+        是否在 max_wait 内完成切换并稳定
+    """
+    if grab is None:
+        grab = get_default_backend().grab
+    start = time.monotonic()
+    deadline = start + max_wait
+    if min_wait > 0:
+        time.sleep(min(min_wait, max_wait))
+    before_signature = frame_signature(before) if before is not None and before.size else None
+    changed = not require_change
+    last_signature: Optional[np.ndarray] = None
+    stable_count = 0
+    stable = False
+    while True:
+        frame = grab(roi)
+        if frame is not None and frame.size:
+            signature = frame_signature(frame)
+            if (not changed and before_signature is not None and
+                    signature_change(signature, before_signature) > threshold):
+                changed = True
+            if last_signature is not None:
+                if signature_change(signature, last_signature) > threshold:
+                    changed = True
+                    stable_count = 0
+                elif changed:
+                    stable_count += 1
+                    if stable_count >= stable_frames:
+                        stable = True
+                        break
+            last_signature = signature
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+    (report or settle_report).record(flow, max_wait, time.monotonic() - start, stable)
+    return stable
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+模板图像缓存
+按 (路径, 修改时间) 缓存已解码的模板图像及其派生形式（灰度、浮点等），
+在内存上限内按 LRU 淘汰，并统计命中/未命中以及节省的解码时间
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import cv2
+import numpy as np
+
+from tracing import DECODE, span
+
+
+def pyramid_downscale(image: np.ndarray, levels: int) -> np.ndarray:
+    """将图像缩小 2**levels 倍（用于金字塔匹配）"""
+    if levels <= 0:
+        return image
+    factor = 1 << levels
+    h, w = image.shape[:2]
+    size = (max(1, w // factor), max(1, h // factor))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def scale_variant(scale: float) -> str:
+    """缩放形式名，如 scale_variant(0.75) -> 'x0.750'"""
+    return f'x{scale:.3f}'
+
+
+def _scale_image(image: np.ndarray, scale: float) -> np.ndarray:
+    h, w = image.shape[:2]
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    return cv2.resize(image, size, interpolation=interpolation)
+
+
+# 派生形式构建函数：输入原始BGR模板，输出派生图像
+# 形式名可用 '/' 串联，如 'gray/pyr2' 表示先转灰度再缩小4倍
+VARIANT_BUILDERS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'gray': lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY),
+    'b': lambda image: np.ascontiguousarray(image[:, :, 0]),
+    'g': lambda image: np.ascontiguousarray(image[:, :, 1]),
+    'r': lambda image: np.ascontiguousarray(image[:, :, 2]),
+    'float32': lambda image: image.astype(np.float32),
+}
+for _level in range(1, 5):
+    VARIANT_BUILDERS[f'pyr{_level}'] = lambda image, _level=_level: pyramid_downscale(image, _level)
+
+
+class _TemplateEntry:
+    """单个模板的缓存条目"""
+
+    __slots__ = ('mtime_ns', 'size', 'variants', 'nbytes')
+
+    def __init__(self, mtime_ns: int, size: int, image: np.ndarray):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.variants: Dict[str, np.ndarray] = {'bgr': image}
+        self.nbytes = image.nbytes
+
+
+class TemplateCache:
+    """模板图像缓存类（线程安全）"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: 缓存占用内存上限（字节），超出后按最近最少使用淘汰
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _TemplateEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """清零统计计数"""
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.decode_seconds = 0.0
+
+    def get(self, template_path: str, variant: str = 'bgr') -> Optional[np.ndarray]:
+        """获取模板图像
+        Args:
+            template_path: 模板图像路径
+            variant: 图像形式 ('bgr', 'gray', 'b'/'g'/'r', 'float32', 'pyr1'~'pyr4', 缩放形式 'x0.750'
+                     或 VARIANT_BUILDERS 中注册的其他名称，可用 '/' 串联如 'gray/pyr2')
+        Returns:
+            模板图像，文件不存在或无法读取时返回 None
+        """
+        key = os.path.abspath(template_path)
+        try:
+            st = os.stat(key)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            else:
+                if entry is not None:
+                    # 文件已被修改，丢弃旧条目
+                    self.reloads += 1
+                    self._remove(key)
+                self.misses += 1
+                entry = self._load(key, st)
+                if entry is None:
+                    return None
+
+            image = entry.variants.get(variant)
+            if image is None:
+                image = self._build_variant(entry, variant)
+            self._evict(keep=key)
+            return image
+
+    def _load(self, key: str, st: os.stat_result) -> Optional[_TemplateEntry]:
+        """解码模板文件并加入缓存"""
+        start = time.perf_counter()
+        with span(DECODE):
+            image = cv2.imread(key, cv2.IMREAD_COLOR)
+        self.decode_seconds += time.perf_counter() - start
+        if image is None:
+            return None
+        entry = _TemplateEntry(st.st_mtime_ns, st.st_size, image)
+        self._entries[key] = entry
+        self._total_bytes += entry.nbytes
+        return entry
+
+    def _build_variant(self, entry: _TemplateEntry, variant: str) -> np.ndarray:
+        """构建并缓存派生形式（串联形式会先构建其前缀形式）"""
+        parent, _, name = variant.rpartition('/')
+        builder = VARIANT_BUILDERS.get(name)
+        if builder is None and name.startswith('x'):
+            try:
+                scale = float(name[1:])
+            except ValueError:
+                scale = 0.0
+            if scale > 0:
+                builder = lambda image: _scale_image(image, scale)
+        if builder is None:
+            raise ValueError(f"未知的模板形式: {variant}")
+        parent = parent or 'bgr'
+        source = entry.variants.get(parent)
+        if source is None:
+            source = self._build_variant(entry, parent)
+        image = builder(source)
+        entry.variants[variant] = image
+        entry.nbytes += image.nbytes
+        self._total_bytes += image.nbytes
+        return image
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.nbytes
+
+    def _evict(self, keep: str) -> None:
+        """淘汰最久未使用的条目直到不超过内存上限（保留刚访问的条目）"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, template_path: Optional[str] = None) -> None:
+        """使缓存失效
+        Args:
+            template_path: 指定模板路径，为 None 时清空全部缓存
+        """
+        with self._lock:
+            if template_path is None:
+                self._entries.clear()
+                self._total_bytes = 0
+                return
+            key = os.path.abspath(template_path)
+            if key in self._entries:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, float]:
+        """获取缓存统计
+        Returns:
+            包含命中数、未命中数、淘汰数、占用内存以及估算节省解码时间的字典
+        """
+        with self._lock:
+            avg_decode = self.decode_seconds / self.misses if self.misses else 0.0
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'decode_seconds': self.decode_seconds,
+                'saved_seconds': self.hits * avg_decode,
+            }
+
+
+# 进程内共享的默认缓存
+shared_template_cache = TemplateCache()
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+模板匹配工具
+对同一帧截图批量匹配多个模板：只截图一次，模板在线程池中并行匹配
+（cv2.matchTemplate 执行期间会释放GIL）
+
+颜色模式：
+- 'bgr': 三通道彩色匹配（默认，最准确）
+- 'gray': 灰度匹配，计算量约为彩色的1/3
+- 'b' / 'g' / 'r': 单通道匹配，适合颜色特征集中在某一通道的模板
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from template_cache import TemplateCache, pyramid_downscale, scale_variant, shared_template_cache
+from tracing import FIND, MATCH, span, traced
+
+
+COLOR_MODES = ('bgr', 'gray', 'b', 'g', 'r')
+_CHANNEL_INDEX = {'b': 0, 'g': 1, 'r': 2}
+
+# 按模板指定的颜色模式 {模板绝对路径: 颜色模式}
+_template_color_modes: Dict[str, str] = {}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_match_executor() -> ThreadPoolExecutor:
+    """获取模板匹配共享线程池（首次调用时创建）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = min(8, os.cpu_count() or 1)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='match')
+        return _executor
+
+
+def set_template_color_mode(template_path: str, color_mode: Optional[str]) -> None:
+    """为模板指定默认颜色模式（None 表示取消指定）"""
+    key = os.path.abspath(template_path)
+    if color_mode is None:
+        _template_color_modes.pop(key, None)
+        return
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"未知的颜色模式: {color_mode}")
+    _template_color_modes[key] = color_mode
+
+
+def resolve_color_mode(template_path: str, color_mode: Optional[str] = None,
+                       default: str = 'bgr') -> str:
+    """确定本次匹配使用的颜色模式：调用参数 > 模板指定 > 默认值"""
+    if color_mode is None:
+        color_mode = _template_color_modes.get(os.path.abspath(template_path), default)
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"未知的颜色模式: {color_mode}")
+    return color_mode
+
+
+def convert_frame(frame: np.ndarray, color_mode: str) -> np.ndarray:
+    """将BGR(A)截图转换为指定颜色模式"""
+    if frame.ndim == 2:
+        if color_mode != 'gray':
+            raise ValueError(f"灰度截图不能转换为颜色模式: {color_mode}")
+        return frame
+    if color_mode == 'bgr':
+        return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR) if frame.shape[2] == 4 else frame
+    if color_mode == 'gray':
+        code = cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(frame, code)
+    if color_mode in _CHANNEL_INDEX:
+        return cv2.extractChannel(frame, _CHANNEL_INDEX[color_mode])
+    raise ValueError(f"未知的颜色模式: {color_mode}")
+
+
+class FrameViews:
+    """同一帧截图的各颜色模式视图，每种模式只转换一次（线程安全）"""
+
+    def __init__(self, frame: np.ndarray):
+        self.frame = frame
+        self._views: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def get(self, color_mode: str) -> np.ndarray:
+        view = self._views.get(color_mode)
+        if view is None:
+            with self._lock:
+                view = self._views.get(color_mode)
+                if view is None:
+                    view = convert_frame(self.frame, color_mode)
+                    self._views[color_mode] = view
+        return view
+
+
+def _correlate(frame: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """cv2.matchTemplate（TM_CCOEFF_NORMED），耗时计入追踪的 match 阶段"""
+    with span(MATCH):
+        return cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+
+
+def template_variant(color_mode: str, pyramid_levels: int = 0) -> str:
+    """颜色模式与金字塔层数对应的模板缓存形式名"""
+    if pyramid_levels > 0:
+        return f'{color_mode}/pyr{min(pyramid_levels, 4)}'
+    return color_mode
+
+
+def match_template(frame: np.ndarray, template: np.ndarray,
+                   threshold: float = 0.8) -> Optional[Tuple[int, int, int, int]]:
+    """在图像中查找模板
+    Args:
+        frame: 待搜索图像
+        template: 模板图像
+        threshold: 匹配置信度
+    Returns:
+        匹配位置 (x, y, width, height)，未找到返回 None
+    """
+    h, w = template.shape[:2]
+    if h > frame.shape[0] or w > frame.shape[1]:
+        return None
+    result = _correlate(frame, template)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    if max_val >= threshold:
+        return (max_loc[0], max_loc[1], w, h)
+    return None
+
+
+class TemplateMatch:
+    """模板匹配结果，可像 (x, y, width, height) 元组一样解包"""
+
+    __slots__ = ('x', 'y', 'w', 'h', 'score')
+
+    def __init__(self, x: int, y: int, w: int, h: int, score: float):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.score = score
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.w, self.h))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TemplateMatch):
+            return tuple(self) == tuple(other)
+        if isinstance(other, tuple):
+            return tuple(self) == other
+        return NotImplemented
+
+    # 坐标可就地平移（如加上识别区域偏移），因此不可哈希
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"TemplateMatch(x={self.x}, y={self.y}, w={self.w}, h={self.h}, score={self.score:.3f})"
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return (self.x + self.w // 2, self.y + self.h // 2)
+
+
+def find_peaks(result: np.ndarray, threshold: float, template_size: Tuple[int, int],
+               max_results: int = 100, nms: str = 'iou', overlap: float = 0.3,
+               min_distance: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """从 matchTemplate 结果中提取峰值并做非极大值抑制（全部以NumPy向量运算完成）
+    Args:
+        result: cv2.matchTemplate 输出的得分图
+        threshold: 得分阈值
+        template_size: 模板尺寸 (width, height)
+        max_results: 最多返回的结果数量
+        nms: 抑制方式 'iou'（按重叠率）或 'distance'（按中心距离）
+        overlap: nms='iou' 时，与已保留结果重叠率超过该值的候选被抑制
+        min_distance: nms='distance' 时的最小间距，默认取模板短边的一半
+    Returns:
+        (xs, ys, scores) 三个数组，按得分从高到低排列
+    """
+    w, h = template_size
+    # 先用局部极大值过滤，把同一目标周围成片的命中压缩成少数几个点
+    kernel = np.ones((max(3, h // 2 | 1), max(3, w // 2 | 1)), np.uint8)
+    local_max = cv2.dilate(result, kernel)
+    ys, xs = np.nonzero((result >= threshold) & (result >= local_max))
+    scores = result[ys, xs]
+    order = np.argsort(-scores, kind='stable')
+    xs, ys, scores = xs[order], ys[order], scores[order]
+
+    if min_distance is None:
+        min_distance = min(w, h) / 2
+    keep = []
+    alive = np.ones(len(xs), dtype=bool)
+    index = 0
+    while len(keep) < max_results:
+        remaining = np.flatnonzero(alive[index:])
+        if len(remaining) == 0:
+            break
+        index += remaining[0]
+        keep.append(index)
+        alive[index] = False
+        dx = np.abs(xs[index + 1:] - xs[index])
+        dy = np.abs(ys[index + 1:] - ys[index])
+        if nms == 'iou':
+            inter = np.clip(w - dx, 0, None) * np.clip(h - dy, 0, None)
+            suppressed = inter / (2 * w * h - inter) > overlap
+        elif nms == 'distance':
+            suppressed = np.hypot(dx, dy) < min_distance
+        else:
+            raise ValueError(f"未知的抑制方式: {nms}")
+        alive[index + 1:] &= ~suppressed
+        index += 1
+
+    keep = np.asarray(keep, dtype=np.intp)
+    return xs[keep], ys[keep], scores[keep]
+
+
+def match_template_all(frame: np.ndarray, template: np.ndarray, threshold: float = 0.8,
+                       max_results: int = 100, nms: str = 'iou',
+                       overlap: float = 0.3) -> List[TemplateMatch]:
+    """查找图像中模板的所有匹配位置（已去除重叠结果）
+    Returns:
+        按得分从高到低排列的匹配结果列表
+    """
+    h, w = template.shape[:2]
+    if h > frame.shape[0] or w > frame.shape[1]:
+        return []
+    result = _correlate(frame, template)
+    xs, ys, scores = find_peaks(result, threshold, (w, h), max_results, nms, overlap)
+    return [TemplateMatch(int(x), int(y), w, h, float(score))
+            for x, y, score in zip(xs, ys, scores)]
+
+
+def _top_candidates(result: np.ndarray, count: int,
+                    suppress: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """从匹配结果中取得分最高的若干个互不重叠的位置"""
+    result = result.copy()
+    sw, sh = suppress
+    candidates = []
+    for _ in range(count):
+        _, max_val, _, (x, y) = cv2.minMaxLoc(result)
+        if max_val <= -1.0:
+            break
+        candidates.append((x, y))
+        result[max(0, y - sh):y + sh + 1, max(0, x - sw):x + sw + 1] = -1.0
+    return candidates
+
+
+def match_template_pyramid(frame: np.ndarray, template: np.ndarray, threshold: float = 0.8,
+                           levels: int = 2, candidates: int = 3,
+                           coarse_template: Optional[np.ndarray] = None,
+                           min_template_size: int = 8) -> Optional[Tuple[int, int, int, int]]:
+    """由粗到细的金字塔模板匹配
+    先在缩小 2**levels 倍的图像上匹配，再在原分辨率下仅对若干候选位置附近的小窗口精确匹配
+    Args:
+        frame: 待搜索图像
+        template: 模板图像
+        threshold: 匹配置信度（用于原分辨率的精确匹配）
+        levels: 金字塔层数，0 表示退化为全图匹配
+        candidates: 保留的粗匹配候选数量
+        coarse_template: 预先缩小好的模板（通常来自模板缓存），为None时现场缩小
+        min_template_size: 缩小后模板的最小边长，模板过小时自动减少层数
+    Returns:
+        匹配位置 (x, y, width, height)，未找到返回 None
+    """
+    h, w = template.shape[:2]
+    if h > frame.shape[0] or w > frame.shape[1]:
+        return None
+
+    # 缩小后的模板太小会丢失特征，减少层数
+    while levels > 0 and min(w, h) >> levels < min_template_size:
+        levels -= 1
+    if levels <= 0:
+        return match_template(frame, template, threshold)
+
+    factor = 1 << levels
+    if coarse_template is None or coarse_template.shape[:2] != (h // factor, w // factor):
+        coarse_template = pyramid_downscale(template, levels)
+    coarse_frame = pyramid_downscale(frame, levels)
+    coarse_result = _correlate(coarse_frame, coarse_template)
+    ch, cw = coarse_template.shape[:2]
+
+    best_val, best_loc = -1.0, None
+    margin = 2 * factor
+    frame_h, frame_w = frame.shape[:2]
+    for cx, cy in _top_candidates(coarse_result, candidates, (cw // 2, ch // 2)):
+        x0 = max(0, cx * factor - margin)
+        y0 = max(0, cy * factor - margin)
+        x1 = min(frame_w, cx * factor + w + margin)
+        y1 = min(frame_h, cy * factor + h + margin)
+        if x1 - x0 < w or y1 - y0 < h:
+            continue
+        result = _correlate(frame[y0:y1, x0:x1], template)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val > best_val:
+            best_val, best_loc = max_val, (max_loc[0] + x0, max_loc[1] + y0)
+
+    if best_loc is not None and best_val >= threshold:
+        return (best_loc[0], best_loc[1], w, h)
+    return None
+
+
+class LocationPrior:
+    """记录每个模板上次命中的位置，优先在其附近的区域搜索，未命中时再全图搜索"""
+
+    def __init__(self, padding: int = 32):
+        """
+        Args:
+            padding: 上次命中区域向外扩展的像素数
+        """
+        self.padding = padding
+        self._last_hits: Dict[Hashable, Tuple[int, int, int, int]] = {}
+        self._counters: Dict[Hashable, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def match(self, frame: np.ndarray, template: np.ndarray, key: Hashable, threshold: float = 0.8,
+              fallback: Optional[Callable[[np.ndarray, np.ndarray, float],
+                                          Optional[Tuple[int, int, int, int]]]] = None
+              ) -> Optional[Tuple[int, int, int, int]]:
+        """先在上次命中位置附近搜索，未命中再全图搜索
+        Args:
+            frame: 待搜索图像
+            template: 模板图像
+            key: 模板标识（通常为模板路径；坐标系不同的搜索应使用不同的key）
+            threshold: 匹配置信度
+            fallback: 全图搜索函数，默认 match_template
+        Returns:
+            匹配位置 (x, y, width, height)，未找到返回 None
+        """
+        fallback = fallback or match_template
+        frame_h, frame_w = frame.shape[:2]
+        with self._lock:
+            last = self._last_hits.get(key)
+            counters = self._counters.setdefault(
+                key, {'roi_hits': 0, 'fallbacks': 0, 'misses': 0,
+                      'searched_pixels': 0, 'frame_pixels': 0})
+            counters['frame_pixels'] += frame_w * frame_h
+
+        if last is not None:
+            x, y, w, h = last
+            x0, y0 = max(0, x - self.padding), max(0, y - self.padding)
+            x1, y1 = min(frame_w, x + w + self.padding), min(frame_h, y + h + self.padding)
+            found = match_template(frame[y0:y1, x0:x1], template, threshold)
+            with self._lock:
+                counters['searched_pixels'] += max(0, x1 - x0) * max(0, y1 - y0)
+            if found is not None:
+                found = (found[0] + x0, found[1] + y0, found[2], found[3])
+                with self._lock:
+                    counters['roi_hits'] += 1
+                    self._last_hits[key] = found
+                return found
+
+        found = fallback(frame, template, threshold)
+        with self._lock:
+            counters['searched_pixels'] += frame_w * frame_h
+            if last is not None:
+                counters['fallbacks'] += 1
+            if found is None:
+                counters['misses'] += 1
+            else:
+                self._last_hits[key] = found
+        return found
+
+    def forget(self, key: Optional[Hashable] = None) -> None:
+        """清除记录的位置，key为None时清除全部"""
+        with self._lock:
+            if key is None:
+                self._last_hits.clear()
+            else:
+                self._last_hits.pop(key, None)
+
+    def stats(self) -> Dict[Hashable, Dict[str, float]]:
+        """获取每个模板的区域命中/回退次数以及实际搜索面积占比"""
+        with self._lock:
+            report = {}
+            for key, counters in self._counters.items():
+                item = dict(counters)
+                item['area_ratio'] = (counters['searched_pixels'] / counters['frame_pixels']
+                                      if counters['frame_pixels'] else 0.0)
+                report[key] = item
+            return report
+
+
+class MultiScaleMatcher:
+    """多尺度模板匹配
+    每个模板的各尺度版本只在模板缓存中构建一次；优先尝试预测的尺度
+    （该目标上次成功的尺度，否则按当前窗口尺寸与模板截取时的参考尺寸之比推算），
+    命中时只需匹配一个尺度。默认只尝试预测尺度及其相邻尺度，未命中（轮询等待中最常见的情况）
+    也只需几个尺度；同一目标连续多次未命中后做一次全尺度扫描，防止预测尺度过时后再也找不到
+    """
+
+    DEFAULT_SCALES = (0.5, 0.625, 0.75, 0.875, 1.0, 1.25, 1.5, 1.75, 2.0)
+
+    def __init__(self, reference_size: Optional[Tuple[int, int]] = None,
+                 scales: Iterable[float] = DEFAULT_SCALES,
+                 template_cache: Optional[TemplateCache] = None,
+                 max_scales: Optional[int] = 3, full_sweep_every: int = 10):
+        """
+        Args:
+            reference_size: 截取模板时窗口/屏幕的尺寸 (width, height)
+            scales: 候选尺度列表
+            template_cache: 模板缓存，默认使用共享缓存
+            max_scales: 每次查找最多尝试的尺度数（预测尺度及其相邻尺度），None 表示尝试全部尺度
+            full_sweep_every: 同一目标连续未命中该次数后，下一次查找尝试全部尺度，0 表示从不
+        """
+        self.reference_size = reference_size
+        self.scales = sorted(set(scales) | {1.0})
+        self.template_cache = template_cache or shared_template_cache
+        self.max_scales = max_scales
+        self.full_sweep_every = full_sweep_every
+        self._last_scale: Dict[Hashable, float] = {}
+        self._misses: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.scales_tried = 0
+
+    def _snap(self, scale: float) -> float:
+        return min(self.scales, key=lambda candidate: abs(candidate - scale))
+
+    def predict_scale(self, target: Hashable, frame_size: Optional[Tuple[int, int]] = None) -> float:
+        """预测目标当前的尺度
+        Args:
+            target: 目标标识（窗口句柄、设备序列号等）
+            frame_size: 目标当前的尺寸 (width, height)
+        """
+        with self._lock:
+            last = self._last_scale.get(target)
+        if last is not None:
+            return last
+        if self.reference_size and frame_size:
+            ratio = min(frame_size[0] / self.reference_size[0], frame_size[1] / self.reference_size[1])
+            return self._snap(ratio)
+        return 1.0
+
+    def scale_order(self, target: Hashable, frame_size: Optional[Tuple[int, int]] = None,
+                    full: bool = False) -> List[float]:
+        """按与预测尺度的接近程度排列的候选尺度
+        Args:
+            full: 返回全部尺度，不受 max_scales 限制
+        """
+        predicted = self.predict_scale(target, frame_size)
+        order = sorted(self.scales, key=lambda scale: abs(scale - predicted))
+        return order[:self.max_scales] if self.max_scales and not full else order
+
+    def match(self, frame: np.ndarray, template_path: str, target: Hashable, threshold: float = 0.8,
+              color_mode: str = 'bgr', frame_size: Optional[Tuple[int, int]] = None
+              ) -> Optional[Tuple[int, int, int, int]]:
+        """多尺度查找模板
+        Args:
+            frame: 已转换为 color_mode 的截图
+            template_path: 模板路径
+            target: 目标标识，用于记录上次成功的尺度
+            threshold: 匹配置信度
+            color_mode: 颜色模式
+            frame_size: 用于预测尺度的目标尺寸，默认取截图尺寸
+        Returns:
+            匹配位置 (x, y, width, height)（宽高为缩放后的模板尺寸），未找到返回 None
+        """
+        if frame_size is None:
+            frame_size = (frame.shape[1], frame.shape[0])
+        key = (target, template_path)
+        with self._lock:
+            self.lookups += 1
+            misses = self._misses.get(key, 0)
+        full = bool(self.full_sweep_every) and misses >= self.full_sweep_every
+        for scale in self.scale_order(target, frame_size, full):
+            variant = color_mode if scale == 1.0 else f'{color_mode}/{scale_variant(scale)}'
+            template = self.template_cache.get(template_path, variant)
+            if template is None:
+                return None
+            with self._lock:
+                self.scales_tried += 1
+            found = match_template(frame, template, threshold)
+            if found is not None:
+                with self._lock:
+                    self._last_scale[target] = scale
+                    self._misses.pop(key, None)
+                return found
+        with self._lock:
+            # 全尺度扫描后重新计数
+            self._misses[key] = 0 if full else misses + 1
+        return None
+
+    def forget(self, target: Optional[Hashable] = None) -> None:
+        """清除记录的尺度，target为None时清除全部"""
+        with self._lock:
+            if target is None:
+                self._last_scale.clear()
+                self._misses.clear()
+            else:
+                self._last_scale.pop(target, None)
+                for key in [key for key in self._misses if key[0] == target]:
+                    del self._misses[key]
+
+    def stats(self) -> Dict[str, float]:
+        """查找次数与平均每次尝试的尺度数"""
+        return {
+            'lookups': self.lookups,
+            'scales_tried': self.scales_tried,
+            'avg_scales_per_lookup': self.scales_tried / self.lookups if self.lookups else 0.0,
+        }
+
+
+class MatchSession:
+    """单帧多模板匹配会话"""
+
+    def __init__(self, frame: np.ndarray, offset: Tuple[int, int] = (0, 0),
+                 template_cache: Optional[TemplateCache] = None,
+                 executor: Optional[ThreadPoolExecutor] = None,
+                 location_prior: Optional[LocationPrior] = None,
+                 color_mode: str = 'bgr',
+                 scale_matcher: Optional[MultiScaleMatcher] = None,
+                 target: Hashable = None):
+        """
+        Args:
+            frame: 本次会话使用的截图（BGR）
+            offset: 截图左上角在屏幕上的坐标，结果会加上该偏移
+            template_cache: 模板缓存，默认使用共享缓存
+            executor: 线程池，默认使用共享线程池
+            location_prior: 位置先验，提供时优先在模板上次命中的位置附近搜索
+            color_mode: 默认颜色模式（模板单独指定或调用时指定的模式优先）
+            scale_matcher: 多尺度匹配器，提供时按预测尺度匹配（不使用位置先验）
+            target: 多尺度匹配的目标标识，默认取截图尺寸
+        """
+        self.frame = frame
+        self.views = FrameViews(frame)
+        self.color_mode = color_mode
+        self.offset = offset
+        self.template_cache = template_cache or shared_template_cache
+        self.executor = executor
+        self.location_prior = location_prior
+        self.scale_matcher = scale_matcher
+        self.target = target if target is not None else (frame.shape[1], frame.shape[0])
+
+    @traced(FIND)
+    def match(self, template_path: str, threshold: float = 0.8,
+              color_mode: Optional[str] = None) -> Optional[Tuple[int, int, int, int]]:
+        """匹配单个模板
+        Returns:
+            屏幕坐标下的匹配位置 (x, y, width, height)，未找到返回 None
+        """
+        color_mode = resolve_color_mode(template_path, color_mode, self.color_mode)
+        if self.scale_matcher is not None:
+            found = self.scale_matcher.match(self.views.get(color_mode), template_path,
+                                             self.target, threshold, color_mode)
+            if found is None:
+                return None
+            x, y, w, h = found
+            return (x + self.offset[0], y + self.offset[1], w, h)
+        template = self.template_cache.get(template_path, color_mode)
+        if template is None:
+            return None
+        frame = self.views.get(color_mode)
+        if self.location_prior is not None:
+            found = self.location_prior.match(frame, template, template_path, threshold)
+        else:
+            found = match_template(frame, template, threshold)
+        if found is None:
+            return None
+        x, y, w, h = found
+        return (x + self.offset[0], y + self.offset[1], w, h)
+
+    def match_many(self, template_paths: Iterable[str], threshold: float = 0.8,
+                   color_mode: Optional[str] = None) -> Dict[str, Optional[Tuple[int, int, int, int]]]:
+        """并行匹配多个模板
+        Args:
+            template_paths: 模板路径列表
+            threshold: 匹配置信度
+            color_mode: 颜色模式，None 时按模板指定或会话默认值
+        Returns:
+            {模板路径: 匹配位置或None}，顺序与输入一致
+        """
+        paths = list(template_paths)
+        if len(paths) <= 1:
+            return {path: self.match(path, threshold, color_mode) for path in paths}
+        executor = self.executor or get_match_executor()
+        futures = [executor.submit(self.match, path, threshold, color_mode) for path in paths]
+        return {path: future.result() for path, future in zip(paths, futures)}
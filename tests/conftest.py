@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 共享模块位于仓库根目录，ldplayer_manager 位于 ADB_Demo
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'ADB_Demo'))
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+import pytest
+
+from adb_async import AsyncADBClient
+from adb_client import ADBError
+from fake_adb_server import FakeADBServer, FakeDevice
+
+
+def _slow_output(command):
+    # 总耗时超过客户端超时，但每块输出之间的间隔都小于超时
+    for index in range(6):
+        time.sleep(0.1)
+        yield b'line %d\n' % index
+
+
+def _stalled_output(command):
+    yield b'first\n'
+    time.sleep(0.5)
+    yield b'second\n'
+
+
+def test_run_service_timeout_applies_per_read():
+    with FakeADBServer() as server:
+        server.add_device(FakeDevice('emulator-5554', handlers={'slow': _slow_output, 'stall': _stalled_output}))
+        client = AsyncADBClient(*server.address, timeout=0.3)
+
+        output = asyncio.run(client.run_service('emulator-5554', 'shell:slow'))
+        assert output == b''.join(b'line %d\n' % index for index in range(6))
+        with pytest.raises(ADBError):
+            asyncio.run(client.run_service('emulator-5554', 'shell:stall'))
@@ -0,0 +1,75 @@
+import pytest
+
+from adb_client import ADBError
+from fake_adb_server import FakeADBServer, FakeDevice
+
+
+@pytest.fixture
+def server():
+    with FakeADBServer() as server:
+        yield server
+
+
+def test_host_services(server):
+    server.add_device(FakeDevice('emulator-5554'))
+    server.add_device(FakeDevice('emulator-5556', state='offline'))
+    server.add_network_device('127.0.0.1:5555')
+    client = server.client()
+
+    assert client.server_version() == 41
+    assert client.devices() == [('emulator-5554', 'device'), ('emulator-5556', 'offline')]
+    assert client.connect('127.0.0.1:5555') == 'connected to 127.0.0.1:5555'
+    assert client.connect('127.0.0.1:5555') == 'already connected to 127.0.0.1:5555'
+    assert client.connect('127.0.0.1:5999') == 'failed to connect to 127.0.0.1:5999'
+    assert ('127.0.0.1:5555', 'device') in client.devices()
+    client.disconnect('127.0.0.1:5555')
+    assert ('127.0.0.1:5555', 'device') not in client.devices()
+
+
+def test_transport_selects_device(server):
+    first = server.add_device(FakeDevice('first', handlers={'getprop': lambda command: b'first\n'}))
+    server.add_device(FakeDevice('second', handlers={'getprop': lambda command: b'second\n'}))
+    client = server.client()
+
+    assert client.shell('second', 'getprop ro.serialno') == 'second\n'
+    assert first.commands == []
+    # 多台设备时 transport-any 无法确定设备
+    with pytest.raises(ADBError):
+        client.shell(None, 'getprop ro.serialno')
+    with pytest.raises(ADBError):
+        client.shell('missing', 'getprop ro.serialno')
+
+
+def test_shell_and_exec_out(server):
+    payload = bytes(range(256)) * 64
+    device = server.add_device(FakeDevice('emulator-5554', handlers={
+        'screencap': lambda command: payload,
+        'wm': lambda command: b'Physical size: 720x1280\r\n',
+    }))
+    client = server.client()
+
+    # 唯一设备时可以不指定序列号
+    assert client.exec_out(None, 'screencap') == payload
+    # shell 输出的 CRLF 转换为 LF
+    assert client.shell('emulator-5554', 'wm size') == 'Physical size: 720x1280\n'
+    assert list(client.shell_lines('emulator-5554', 'wm size')) == ['Physical size: 720x1280']
+    assert device.commands == ['screencap', 'wm size', 'wm size']
+
+
+def test_sync_round_trip(server):
+    device = server.add_device(FakeDevice('emulator-5554', files={'/sdcard/a.txt': b'hello'}))
+    client = server.client()
+    data = b'\x00\x01' * 100_000
+
+    with client:
+        assert client.pull('emulator-5554', '/sdcard/a.txt') == b'hello'
+        client.push('emulator-5554', data, '/sdcard/b.bin')
+        assert device.files['/sdcard/b.bin'] == data
+        mode, size, _ = client.stat('emulator-5554', '/sdcard/b.bin')
+        assert size == len(data) and mode & 0o777 == 0o644
+        # sync 连接按设备复用
+        assert server.requests.count('sync:') == 1
+        # 不存在的文件：stat 返回全零，pull 报错
+        assert client.stat('emulator-5554', '/sdcard/missing') == (0, 0, 0)
+        with pytest.raises(ADBError):
+            client.pull('emulator-5554', '/sdcard/missing')
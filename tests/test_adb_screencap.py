@@ -0,0 +1,55 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from adb_screencap import RawFrame, ScreencapFormatError, decode_screencap, encode_screencap, parse_screencap
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('pixel_format', [1, 5])
+@pytest.mark.parametrize('dataspace', [0, None])
+def test_parse_round_trip(image, pixel_format, dataspace):
+    data = encode_screencap(image, pixel_format, dataspace)
+    pixels, parsed_format = parse_screencap(data)
+    assert parsed_format == pixel_format
+    assert pixels.shape == (48, 64, 4)
+    np.testing.assert_array_equal(decode_screencap(data), image)
+
+
+def test_parse_rejects_bad_data(image):
+    data = encode_screencap(image)
+    with pytest.raises(ScreencapFormatError):
+        parse_screencap(data[:8])
+    with pytest.raises(ScreencapFormatError):
+        parse_screencap(data[:-10])
+    with pytest.raises(ScreencapFormatError):
+        parse_screencap(struct.pack('<III', 64, 48, 99) + data[12:])
+
+
+@pytest.mark.parametrize('pixel_format', [1, 5])
+def test_raw_frame_convert(image, pixel_format):
+    frame = RawFrame.from_bytes(encode_screencap(image, pixel_format))
+    assert frame.size == (64, 48)
+    assert frame.shape == image.shape
+    np.testing.assert_array_equal(frame.to_bgr(), image)
+    np.testing.assert_array_equal(frame.to_gray(), cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    for index, channel in enumerate('bgr'):
+        np.testing.assert_array_equal(frame.convert(channel), image[:, :, index])
+    with pytest.raises(ValueError):
+        frame.convert('hsv')
+
+
+def test_raw_frame_region(image):
+    frame = RawFrame.from_bytes(encode_screencap(image))
+    np.testing.assert_array_equal(frame.to_bgr((10, 5, 20, 15)), image[5:20, 10:30])
+    # 超出画面的部分被裁掉
+    np.testing.assert_array_equal(frame.convert('g', (50, 40, 100, 100)), image[40:, 50:, 1])
+    # 区域只是原始数据上的视图
+    assert frame.roi((10, 5, 20, 15)).base is not None
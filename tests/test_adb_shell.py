@@ -0,0 +1,52 @@
+import pytest
+
+from adb_shell import ADBShellError, ADBShellSession, ADBShellTimeout
+from fake_adb_server import FakeADBServer, FakeDevice
+
+
+@pytest.fixture
+def session():
+    # 本地 sh 与设备 shell 的输入输出协议相同
+    with ADBShellSession(command=['sh'], timeout=5) as session:
+        yield session
+
+
+def test_exit_code_and_output(session):
+    assert session.run('echo hello; echo world') == (0, 'hello\nworld')
+    assert session.run('exit_code() { return 3; }; exit_code') == (3, '')
+    # stderr 合并到输出中
+    code, output = session.run('echo oops >&2; false')
+    assert code == 1 and output == 'oops'
+
+
+def test_output_without_trailing_newline(session):
+    # 标记接在输出同一行时也能拆分
+    assert session.run("printf 'no newline'") == (0, 'no newline')
+    assert session.run('true') == (0, '')
+
+
+def test_session_is_reused(session):
+    for index in range(20):
+        assert session.run(f'echo {index}') == (0, str(index))
+    assert session.stats() == {'commands': 20, 'restarts': 0, 'alive': True}
+
+
+def test_restart_after_exit_and_timeout(session):
+    assert session.run('echo $$')[0] == 0
+    # 会话中的 exit 结束进程，下一条命令自动重建会话
+    with pytest.raises(ADBShellError):
+        session.run('exit 0')
+    assert session.run('echo again') == (0, 'again')
+    with pytest.raises(ADBShellTimeout):
+        session.run('sleep 5', timeout=0.2)
+    assert session.run('echo recovered') == (0, 'recovered')
+    assert session.restarts == 2
+
+
+def test_session_over_adb_server():
+    with FakeADBServer() as server:
+        server.add_device(FakeDevice('emulator-5554'))
+        with ADBShellSession(device='emulator-5554', client=server.client(), timeout=5) as session:
+            assert session.run('echo first') == (0, 'first')
+            assert session.run('echo second; false') == (1, 'second')
+        assert server.requests.count('shell:sh') == 1
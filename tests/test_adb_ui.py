@@ -0,0 +1,52 @@
+import pytest
+
+from adb_ui import UIDumpError, parse_ui_dump
+
+DUMP = (b'<?xml version=\'1.0\' encoding=\'UTF-8\' standalone=\'yes\' ?>'
+        b'<hierarchy rotation="0">'
+        b'<node text="" resource-id="" class="android.widget.FrameLayout" package="com.eg.android.AlipayGphone" '
+        b'content-desc="" clickable="false" enabled="true" bounds="[0,0][720,1280]">'
+        b'<node text="\xe8\x9a\x82\xe8\x9a\x81\xe6\xa3\xae\xe6\x9e\x97" '
+        b'resource-id="com.eg.android.AlipayGphone:id/app_text" class="android.widget.TextView" '
+        b'package="com.eg.android.AlipayGphone" content-desc="" clickable="true" enabled="true" '
+        b'bounds="[100,200][300,260]" />'
+        b'<node text="\xe6\x9b\xb4\xe5\xa4\x9a" resource-id="com.eg.android.AlipayGphone:id/app_text" '
+        b'class="android.widget.TextView" package="com.eg.android.AlipayGphone" content-desc="more" '
+        b'clickable="true" enabled="true" bounds="[400,200][500,260]" />'
+        b'<node text="hidden" resource-id="" class="android.widget.TextView" package="com.eg.android.AlipayGphone" '
+        b'content-desc="" clickable="false" enabled="true" bounds="[0,0][0,0]" />'
+        b'</node></hierarchy>')
+
+
+def chunked(data: bytes, size: int):
+    return (data[offset:offset + size] for offset in range(0, len(data), size))
+
+
+@pytest.mark.parametrize('size', [1, 7, 64, len(DUMP)])
+def test_parse_in_chunks(size):
+    # 开头和结尾夹带提示文字，标记可能被数据块切断
+    data = b'UI hierchary dumped to: /dev/tty\n' + DUMP + b'\nUI hierchary dumped to: /dev/tty\n'
+    index = parse_ui_dump(chunked(data, size))
+    assert len(index) == 4
+    (node,) = index.find(text='蚂蚁森林')
+    assert node.center == (200, 230)
+    assert node.clickable
+
+
+def test_find():
+    index = parse_ui_dump([DUMP])
+    assert [node.text for node in index.find(resource_id='app_text')] == ['蚂蚁森林', '更多']
+    assert len(index.find(resource_id='com.eg.android.AlipayGphone:id/app_text')) == 2
+    assert [node.text for node in index.find(text='更多', desc='more')] == ['更多']
+    assert index.find(text='更多', desc='other') == []
+    assert [node.text for node in index.find(text='森林', contains=True)] == ['蚂蚁森林']
+    # 零尺寸控件不可见
+    assert index.find(text='hidden') == []
+    assert index.find() == []
+
+
+def test_incomplete_dump():
+    with pytest.raises(UIDumpError):
+        parse_ui_dump([DUMP[:-20]])
+    with pytest.raises(UIDumpError):
+        parse_ui_dump([b'ERROR: could not get idle state.'])
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import template_matcher
+from flow_engine import Flow, FlowEngine, Transition
+
+
+@pytest.fixture
+def screen(tmp_path):
+    """画面中同时出现两个按钮，返回 (画面, 按钮A模板路径, 按钮B模板路径)"""
+    rng = np.random.default_rng(0)
+    frame = np.full((240, 320, 3), 60, np.uint8)
+    paths = []
+    for name, (x, y) in (('a', (20, 30)), ('b', (200, 150))):
+        template = rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+        frame[y:y + 24, x:x + 32] = template
+        path = str(tmp_path / f'{name}.png')
+        cv2.imwrite(path, template)
+        paths.append(path)
+    return frame, paths[0], paths[1]
+
+
+def slow_match(monkeypatch, template_path, seconds):
+    """让指定模板的匹配变慢，模拟线程调度先后不同"""
+    match = template_matcher.MatchSession.match
+
+    def delayed(self, path, *args, **kwargs):
+        if path == template_path:
+            time.sleep(seconds)
+        return match(self, path, *args, **kwargs)
+    monkeypatch.setattr(template_matcher.MatchSession, 'match', delayed)
+
+
+def test_declaration_order_wins(monkeypatch, screen):
+    frame, a, b = screen
+    slow_match(monkeypatch, a, 0.2)
+    engine = FlowEngine(lambda: frame, lambda x, y: None)
+    # A 先声明，即使更晚完成也优先
+    transition, position = engine._evaluate(frame, [Transition(a, 'A'), Transition(b, 'B')])
+    assert transition.target == 'A' and position == (36, 42)
+    transition, position = engine._evaluate(frame, [Transition(b, 'B'), Transition(a, 'A')])
+    assert transition.target == 'B' and position == (216, 162)
+
+
+def test_slow_probe_is_deferred(screen):
+    frame, a, _ = screen
+    release = threading.Event()
+    calls = []
+
+    def probe(probe_frame):
+        calls.append(probe_frame)
+        release.wait(5)
+        return (1, 1)
+
+    engine = FlowEngine(lambda: frame, lambda x, y: None)
+    candidates = [Transition(None, 'ui', probe=probe), Transition(a, 'A')]
+    started = time.monotonic()
+    assert engine._evaluate(frame, candidates)[0].target == 'A'
+    assert time.monotonic() - started < 2
+    # 探测仍在运行时不重复提交
+    assert engine._evaluate(frame, candidates)[0].target == 'A'
+    assert len(calls) == 1
+    release.set()
+    time.sleep(0.1)
+    # 画面未变化，探测结果可用，按声明顺序优先
+    assert engine._evaluate(frame, candidates) == (candidates[0], (1, 1))
+
+
+def test_stale_probe_result_is_discarded(screen):
+    frame, a, _ = screen
+    moved = frame.copy()
+    moved[100:140, 100:200] = 255
+    results = iter([(1, 1), None])
+    release = threading.Event()
+
+    def probe(probe_frame):
+        release.wait(5)
+        return next(results)
+
+    engine = FlowEngine(lambda: frame, lambda x, y: None)
+    candidates = [Transition(None, 'ui', probe=probe), Transition(a, 'A')]
+    assert engine._evaluate(frame, candidates)[0].target == 'A'
+    release.set()
+    time.sleep(0.1)
+    # 探测基于旧画面命中，画面已变化，重新探测后不再命中
+    assert engine._evaluate(moved, candidates)[0].target == 'A'
+    time.sleep(0.1)
+    assert engine._evaluate(moved, candidates)[0].target == 'A'
+
+
+def test_run_reaches_goal(screen):
+    frame, a, b = screen
+    taps = []
+    flow = (Flow('测试', 'start', ['done'], state_timeout=2)
+            .add('start', Transition(str(a) + '.missing', 'never'), Transition(a, 'middle'))
+            .add('middle', Transition(b, 'done')))
+    engine = FlowEngine(lambda: frame, lambda x, y: taps.append((x, y)), settle=False)
+    result = engine.run(flow)
+    assert result.success and result.final_state == 'done'
+    assert taps == [(36, 42), (216, 162)]
+    assert [step.target for step in result.steps] == ['middle', 'done']
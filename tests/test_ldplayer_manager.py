@@ -0,0 +1,66 @@
+from ldplayer_manager import _parse_update_times, parse_package_dump
+
+DUMP = """\
+Packages:
+  Package [com.android.settings] (5f2b1c0):
+    userId=1000
+    versionCode=29 minSdk=29 targetSdk=29
+    versionName=10
+    flags=[ SYSTEM HAS_CODE PERSISTENT ]
+    firstInstallTime=2008-12-31 16:00:00
+    lastUpdateTime=2008-12-31 16:00:00
+    User 0: ceDataInode=0 installed=true hidden=false
+  Package [com.eg.android.AlipayGphone] (a81c3f2):
+    userId=10086
+    versionCode=1049 minSdk=21 targetSdk=28
+    versionName=10.2.53.7000
+    pkgFlags=[ HAS_CODE ALLOW_CLEAR_USER_DATA ]
+    firstInstallTime=2023-05-01 10:00:00
+    lastUpdateTime=2023-06-01 12:30:00
+
+Hidden system packages:
+  Package [com.android.settings] (1d0e8a4):
+    versionCode=28 minSdk=28 targetSdk=28
+    versionName=9
+"""
+
+
+def test_parse_package_dump():
+    records = list(parse_package_dump(DUMP.splitlines()))
+    assert [record['package_name'] for record in records] == ['com.android.settings',
+                                                             'com.eg.android.AlipayGphone']
+    settings, alipay = records
+    # 隐藏的系统包不覆盖第一次出现的信息
+    assert settings['version_name'] == '10' and settings['version_code'] == '29'
+    assert settings['system'] and not alipay['system']
+    assert alipay == {
+        'package_name': 'com.eg.android.AlipayGphone',
+        'app_name': 'com.eg.android.AlipayGphone',
+        'version_name': '10.2.53.7000',
+        'version_code': '1049',
+        'first_install_time': '2023-05-01 10:00:00',
+        'last_update_time': '2023-06-01 12:30:00',
+        'system': False,
+    }
+
+
+def test_parse_package_dump_streams_records():
+    # 每个包在下一个包标题出现时立即返回，不必等整个输出读完
+    consumed = []
+
+    def lines():
+        for line in DUMP.splitlines():
+            consumed.append(line)
+            yield line
+
+    first = next(parse_package_dump(lines()))
+    assert first['package_name'] == 'com.android.settings'
+    assert consumed[-1].startswith('  Package [com.eg.android.AlipayGphone]')
+
+
+def test_parse_update_times():
+    lines = [line for line in DUMP.splitlines() if 'Package [' in line or 'lastUpdateTime=' in line]
+    assert _parse_update_times(lines) == {
+        'com.android.settings': '2008-12-31 16:00:00',
+        'com.eg.android.AlipayGphone': '2023-06-01 12:30:00',
+    }
@@ -0,0 +1,45 @@
+import sys
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+import screen_capture
+from screen_capture import PyAutoGUIBackend, get_default_backend, set_default_backend
+
+
+@pytest.fixture
+def pyautogui(monkeypatch):
+    """模拟 pyautogui：屏幕为 RGB 渐变图，记录每次截图的区域"""
+    rng = np.random.default_rng(0)
+    screen = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    stub = types.SimpleNamespace(regions=[], screen=screen)
+
+    def screenshot(region=None):
+        stub.regions.append(region)
+        if region is None:
+            return screen.copy()
+        x, y, w, h = region
+        return screen[y:y + h, x:x + w].copy()
+
+    stub.screenshot = screenshot
+    stub.size = lambda: (160, 120)
+    monkeypatch.setitem(sys.modules, 'pyautogui', stub)
+    # 没有 X 显示时默认后端使用 pyautogui
+    monkeypatch.delenv('DISPLAY', raising=False)
+    monkeypatch.setattr(screen_capture, '_default_backend', None)
+    yield stub
+    set_default_backend(None)
+
+
+def test_default_backend_uses_pyautogui(pyautogui):
+    backend = get_default_backend()
+    assert isinstance(backend, PyAutoGUIBackend)
+    assert backend.size() == (160, 120)
+    bgr = cv2.cvtColor(pyautogui.screen, cv2.COLOR_RGB2BGR)
+    np.testing.assert_array_equal(backend.grab(), bgr)
+    np.testing.assert_array_equal(backend.grab((10, 20, 30, 40)), bgr[20:60, 10:40])
+    np.testing.assert_array_equal(backend.grab_bgr((10, 20, 30, 40)), bgr[20:60, 10:40])
+    np.testing.assert_array_equal(backend.grab_gray(), cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY))
+    assert pyautogui.regions == [None, (10, 20, 30, 40), (10, 20, 30, 40), None]
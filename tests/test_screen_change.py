@@ -0,0 +1,105 @@
+import time
+
+import numpy as np
+import pytest
+
+from screen_change import AdaptivePoller, SettleReport, frame_signature, signature_change, wait_until_stable
+
+
+def screen(button: bool = False, level: int = 100) -> np.ndarray:
+    """1080p 灰色画面，可在右下角显示一个小按钮"""
+    frame = np.full((1080, 1920, 3), level, np.uint8)
+    if button:
+        frame[900:960, 1700:1820] = 230
+    return frame
+
+
+def frames(*sequence: np.ndarray):
+    """按顺序返回画面的截图函数，序列结束后一直返回最后一帧"""
+    state = {'index': 0}
+
+    def grab(region):
+        frame = sequence[min(state['index'], len(sequence) - 1)]
+        state['index'] += 1
+        return frame
+    return grab
+
+
+def test_signature_change_detects_small_button():
+    before, after = frame_signature(screen()), frame_signature(screen(button=True))
+    # 按钮只占画面的 0.3%，平均差会被稀释，按格子取最大值仍能检测到
+    assert float(np.abs(after.astype(int) - before).mean()) < 1
+    assert signature_change(before, after) > 100
+    assert signature_change(before, frame_signature(screen())) == 0
+
+
+def test_poller_checks_small_and_accumulated_changes():
+    poller = AdaptivePoller(0.5, max_interval=60)
+    assert poller.should_check(screen())
+    assert not poller.should_check(screen())
+    assert poller.should_check(screen(button=True))
+    # 每次只变化 2 个灰度级，相对上一次匹配的画面累积超过阈值后触发
+    results = [poller.should_check(screen(button=True, level=100 + 2 * step)) for step in range(1, 11)]
+    assert [step for step, checked in enumerate(results, 1) if checked] == [5, 10]
+    assert poller.checked == 4 and poller.forced == 0
+
+
+def test_poller_forces_check_after_max_interval():
+    poller = AdaptivePoller(0.01, max_interval=0.05)
+    assert poller.should_check(screen())
+    assert not poller.should_check(screen())
+    time.sleep(0.06)
+    assert poller.should_check(screen())
+    assert poller.forced == 1 and poller.skipped == 1
+
+
+def test_poller_interval_adapts():
+    poller = AdaptivePoller(0.4, min_interval=0.1, max_interval=60)
+    poller.should_check(screen())
+    assert poller.interval == pytest.approx(0.2)
+    poller.should_check(screen())
+    assert poller.interval == pytest.approx(0.3)
+
+
+def test_wait_returns_after_delayed_transition():
+    report = SettleReport()
+    # 前几帧界面还没有响应，不能当作已经稳定
+    grab = frames(*[screen()] * 6, screen(button=True))
+    assert wait_until_stable(None, 2, grab=grab, interval=0.01, min_wait=0, report=report)
+    assert 0.05 <= report.flows['default'][3] < 1
+    assert report.flows['default'][:2] == [1, 1]
+
+
+def test_wait_times_out_without_change():
+    report = SettleReport()
+    started = time.monotonic()
+    assert not wait_until_stable(None, 0.3, grab=frames(screen()), interval=0.01, report=report, flow='idle')
+    assert time.monotonic() - started >= 0.3
+    assert report.saved_seconds('idle') == pytest.approx(0, abs=1e-6)
+
+
+def test_wait_uses_before_frame():
+    # 第一次截图前切换已经完成，与操作前的画面比较仍能识别出变化
+    grab = frames(screen(button=True))
+    started = time.monotonic()
+    assert wait_until_stable(None, 2, grab=grab, interval=0.01, min_wait=0,
+                             before=screen(), report=SettleReport())
+    assert time.monotonic() - started < 0.5
+
+
+def test_wait_without_required_change():
+    assert wait_until_stable(None, 2, grab=frames(screen()), interval=0.01, min_wait=0,
+                             require_change=False, report=SettleReport())
+
+
+def test_wait_restarts_count_while_changing():
+    grab = frames(screen(), screen(button=True), screen(level=150), screen(button=True, level=150))
+    calls = []
+
+    def counting(region):
+        calls.append(region)
+        return grab(region)
+    assert wait_until_stable((0, 0, 10, 10), 2, grab=counting, interval=0.01, min_wait=0,
+                             report=SettleReport())
+    # 变化停止后还需要连续两次没有变化
+    assert len(calls) == 6 and calls[0] == (0, 0, 10, 10)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from template_matcher import TemplateMatch, find_peaks, match_template_all
+
+# 模板 40x40 时局部极大值窗口半径为 10，以下峰值彼此都不在对方的窗口内
+PEAKS = [((10, 10), 0.95), ((22, 10), 0.90), ((60, 10), 0.85), ((10, 60), 0.80), ((60, 60), 0.50)]
+
+
+@pytest.fixture
+def result():
+    result = np.zeros((100, 100), np.float32)
+    for (x, y), score in PEAKS:
+        result[y, x] = score
+    return result
+
+
+def test_iou_suppression(result):
+    xs, ys, scores = find_peaks(result, 0.7, (40, 40))
+    # (22, 10) 与 (10, 10) 的重叠率超过 0.3 被抑制，(60, 60) 低于阈值
+    assert list(zip(xs, ys)) == [(10, 10), (60, 10), (10, 60)]
+    np.testing.assert_allclose(scores, [0.95, 0.85, 0.80])
+    xs, ys, _ = find_peaks(result, 0.7, (40, 40), overlap=0.6)
+    assert list(zip(xs, ys)) == [(10, 10), (22, 10), (60, 10), (10, 60)]
+
+
+def test_distance_suppression(result):
+    xs, ys, _ = find_peaks(result, 0.7, (40, 40), nms='distance')
+    assert list(zip(xs, ys)) == [(10, 10), (60, 10), (10, 60)]
+    xs, ys, _ = find_peaks(result, 0.7, (40, 40), nms='distance', min_distance=60)
+    assert list(zip(xs, ys)) == [(10, 10)]
+
+
+def test_local_maximum_and_limits(result):
+    # 紧挨峰值的较低得分被局部极大值过滤掉
+    result[11, 11] = 0.94
+    xs, ys, _ = find_peaks(result, 0.7, (40, 40), max_results=2)
+    assert list(zip(xs, ys)) == [(10, 10), (60, 10)]
+    assert len(find_peaks(result, 0.99, (40, 40))[0]) == 0
+    with pytest.raises(ValueError):
+        find_peaks(result, 0.7, (40, 40), nms='box')
+
+
+def test_match_template_all():
+    rng = np.random.default_rng(0)
+    template = rng.integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    frame = np.full((200, 300, 3), 40, np.uint8)
+    positions = [(10, 20), (150, 30), (200, 150)]
+    for x, y in positions:
+        frame[y:y + 20, x:x + 30] = template
+    found = match_template_all(frame, template, 0.9)
+    assert sorted((match.x, match.y) for match in found) == sorted(positions)
+    assert all(match.score > 0.99 and (match.w, match.h) == (30, 20) for match in found)
+
+
+def test_template_match_compares_like_tuple():
+    match = TemplateMatch(1, 2, 3, 4, 0.9)
+    assert match == (1, 2, 3, 4)
+    assert match == TemplateMatch(1, 2, 3, 4, 0.5)
+    assert match != (1, 2, 3, 5)
+    assert match != [1, 2, 3, 4]
+    assert match.center == (2, 4)
+    with pytest.raises(TypeError):
+        hash(match)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+热点路径耗时追踪
+按阶段（截图、模板解码、模板匹配、查找、点击输入、ADB命令、等待）记录每次调用的耗时，
+维护各阶段的对数分桶直方图，并可将一次运行导出为 Chrome trace-event JSON
+（在 chrome://tracing 或 https://ui.perfetto.dev 中打开）。
+
+未启用时 span() 直接返回共享的空上下文、traced() 包装的函数只多一次全局变量判断，开销可忽略。
+设置环境变量 AUTOMATION_TRACE=trace.json 时在导入时自动启用，进程退出时导出并打印统计
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# 阶段名
+CAPTURE = 'capture'
+DECODE = 'decode'
+MATCH = 'match'
+FIND = 'find'
+INPUT = 'input'
+COMMAND = 'command'
+SLEEP = 'sleep'
+
+# 直方图桶数：第 i 个桶的上界为 2^i 微秒，最后一个桶收纳更长的耗时
+HISTOGRAM_BUCKETS = 28
+
+_enabled = False
+_record_events = True
+_max_events = 500_000
+_epoch = 0.0
+_lock = threading.Lock()
+_histograms: Dict[str, 'PhaseHistogram'] = {}
+_events: List[tuple] = []
+_dropped_events = 0
+_original_sleep = time.sleep
+
+
+class PhaseHistogram:
+    """单个阶段的耗时直方图（微秒，按 2 的幂分桶）"""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def percentile(self, q: float) -> float:
+        """估算分位数（秒），取所在桶的上界，不超过最大值"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            cumulative += count
+            if cumulative >= rank:
+                return min(self.max, (1 << index) / 1e6)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_seconds': self.total,
+            'mean_seconds': self.mean,
+            'min_seconds': self.min if self.count else 0.0,
+            'max_seconds': self.max,
+            'p50_seconds': self.percentile(0.5),
+            'p90_seconds': self.percentile(0.9),
+            'p99_seconds': self.percentile(0.99),
+            'buckets_us': {f'<{1 << index}': count for index, count in enumerate(self.buckets) if count},
+        }
+
+
+def _record(phase: str, start: float, end: float, args: Optional[Dict[str, Any]]) -> None:
+    global _dropped_events
+    with _lock:
+        histogram = _histograms.get(phase)
+        if histogram is None:
+            histogram = _histograms[phase] = PhaseHistogram()
+        histogram.add(end - start)
+        if _record_events:
+            if len(_events) < _max_events:
+                _events.append((phase, start, end, threading.get_ident(), args))
+            else:
+                _dropped_events += 1
+
+
+class _Span:
+    __slots__ = ('phase', 'args', 'start')
+
+    def __init__(self, phase: str, args: Optional[Dict[str, Any]]):
+        self.phase = phase
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self.phase, self.start, time.perf_counter(), self.args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(phase: str, **args):
+    """记录代码块耗时的上下文管理器，未启用时返回共享的空上下文
+    用法:
+        with tracing.span(tracing.CAPTURE, backend='xshm'):
+            frame = backend.grab()
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(phase, args or None)
+
+
+def traced(phase: str):
+    """记录函数耗时的装饰器，事件参数中记录函数名"""
+    def decorate(func: Callable) -> Callable:
+        args = {'func': func.__qualname__}
+
+        @functools.wraps(func)
+        def wrapper(*a, **kw):
+            if not _enabled:
+                return func(*a, **kw)
+            start = time.perf_counter()
+            try:
+                return func(*a, **kw)
+            finally:
+                _record(phase, start, time.perf_counter(), args)
+        return wrapper
+    return decorate
+
+
+def _traced_sleep(seconds: float) -> None:
+    start = time.perf_counter()
+    try:
+        _original_sleep(seconds)
+    finally:
+        _record(SLEEP, start, time.perf_counter(), None)
+
+
+def enable(record_events: bool = True, trace_sleep: bool = True, max_events: int = 500_000) -> None:
+    """启用追踪
+    Args:
+        record_events: 是否保留每次调用的事件（用于导出 Chrome trace），否则只更新直方图
+        trace_sleep: 是否记录所有 time.sleep 调用（启用期间替换 time.sleep）
+        max_events: 最多保留的事件数，超出后只更新直方图
+    """
+    global _enabled, _record_events, _max_events, _epoch
+    with _lock:
+        if not _enabled:
+            _epoch = time.perf_counter()
+        _record_events = record_events
+        _max_events = max_events
+        _enabled = True
+    time.sleep = _traced_sleep if trace_sleep else _original_sleep
+
+
+def disable() -> None:
+    """停止追踪，已记录的数据保留到 reset()"""
+    global _enabled
+    _enabled = False
+    time.sleep = _original_sleep
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """清空直方图和事件"""
+    global _dropped_events, _epoch
+    with _lock:
+        _histograms.clear()
+        _events.clear()
+        _dropped_events = 0
+        _epoch = time.perf_counter()
+
+
+def histograms() -> Dict[str, dict]:
+    """各阶段的耗时统计 {阶段: 统计}"""
+    with _lock:
+        return {phase: histogram.to_dict() for phase, histogram in _histograms.items()}
+
+
+def summary() -> str:
+    """生成各阶段耗时统计表"""
+    with _lock:
+        items = sorted(_histograms.items(), key=lambda item: item[1].total, reverse=True)
+        lines = [f"{'阶段':<10}{'次数':>8}{'总计(s)':>10}{'平均(ms)':>10}{'P50(ms)':>10}"
+                 f"{'P90(ms)':>10}{'P99(ms)':>10}{'最大(ms)':>10}"]
+        for phase, histogram in items:
+            lines.append(f"{phase:<12}{histogram.count:>8}{histogram.total:>10.3f}"
+                         f"{histogram.mean * 1e3:>10.2f}{histogram.percentile(0.5) * 1e3:>10.2f}"
+                         f"{histogram.percentile(0.9) * 1e3:>10.2f}{histogram.percentile(0.99) * 1e3:>10.2f}"
+                         f"{histogram.max * 1e3:>10.2f}")
+        if _dropped_events:
+            lines.append(f"（超出事件上限，{_dropped_events} 个事件未保留）")
+        return '\n'.join(lines)
+
+
+def chrome_trace() -> dict:
+    """生成 Chrome trace-event 格式的数据"""
+    pid = os.getpid()
+    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+    with _lock:
+        events = list(_events)
+        epoch = _epoch
+    trace_events = []
+    for tid in sorted({event[3] for event in events}):
+        trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                             'args': {'name': thread_names.get(tid, str(tid))}})
+    for phase, start, end, tid, args in events:
+        event = {'name': args['func'] if args and 'func' in args else phase, 'cat': phase, 'ph': 'X',
+                 'ts': (start - epoch) * 1e6, 'dur': (end - start) * 1e6, 'pid': pid, 'tid': tid}
+        if args:
+            event['args'] = args
+        trace_events.append(event)
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms',
+            'otherData': {'histograms': histograms()}}
+
+
+def export_chrome_trace(path: str) -> int:
+    """将记录的事件导出为 Chrome trace JSON 文件
+    Returns:
+        导出的事件数
+    """
+    data = chrome_trace()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    return len(data['traceEvents'])
+
+
+def _export_at_exit(path: str) -> None:
+    disable()
+    count = export_chrome_trace(path)
+    print(summary())
+    print(f"已导出 {count} 个追踪事件: {path}")
+
+
+_trace_path = os.environ.get('AUTOMATION_TRACE')
+if _trace_path:
+    enable()
+    atexit.register(_export_at_exit, _trace_path)
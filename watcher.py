@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+多模板监视服务
+代码通过 on_appear / on_disappear 订阅模板出现或消失，每个订阅可单独指定识别区域和阈值。
+后台只有一个截图循环：每帧截图一次，在同一帧上评估全部启用的订阅，状态变化时把回调交给
+线程池执行。监视 N 个条件只需一次截图，而不是每个条件各截一次
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from template_cache import TemplateCache, shared_template_cache
+from template_matcher import (FrameViews, LocationPrior, MultiScaleMatcher, get_match_executor,
+                              match_template, resolve_color_mode)
+
+Region = Tuple[int, int, int, int]
+Position = Tuple[int, int]
+# 截图函数：返回 (BGR 图像, 图像左上角的屏幕坐标)
+FrameSource = Callable[[], Tuple[Optional[np.ndarray], Position]]
+
+APPEAR = 'appear'
+DISAPPEAR = 'disappear'
+
+
+class WatchEvent:
+    """监视事件"""
+
+    __slots__ = ('watcher', 'kind', 'position', 'timestamp')
+
+    def __init__(self, watcher: 'Watcher', kind: str, position: Optional[Position], timestamp: float):
+        self.watcher = watcher
+        self.kind = kind
+        self.position = position
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"WatchEvent({self.watcher.name!r}, {self.kind}, {self.position})"
+
+
+class Watcher:
+    """一个监视订阅，记录模板在最近一帧中是否可见及其位置"""
+
+    def __init__(self, template: str, on_appear: Optional[Callable[[WatchEvent], None]] = None,
+                 on_disappear: Optional[Callable[[WatchEvent], None]] = None,
+                 region: Optional[Region] = None, threshold: float = 0.8,
+                 color_mode: Optional[str] = None, repeat: Optional[float] = None,
+                 name: Optional[str] = None):
+        """
+        Args:
+            template: 模板图像路径
+            on_appear: 模板出现时的回调
+            on_disappear: 模板消失时的回调
+            region: 识别区域 (x, y, width, height)，相对截图左上角；None 表示整帧
+            threshold: 匹配阈值
+            color_mode: 匹配颜色模式，None 时按模板指定的模式或服务默认值
+            repeat: 模板持续可见时每隔多少秒再次触发 on_appear，None 表示只在出现时触发一次
+            name: 订阅名称，默认取模板路径
+        """
+        self.template = template
+        self.on_appear = on_appear
+        self.on_disappear = on_disappear
+        self.region = region
+        self.threshold = threshold
+        self.color_mode = color_mode
+        self.repeat = repeat
+        self.name = name or template
+        self.active = True
+        # None 表示尚未评估
+        self.visible: Optional[bool] = None
+        self.position: Optional[Position] = None
+        self.updated = 0.0
+        self.events = 0
+        self._last_fired = 0.0
+        # 同一订阅的回调按顺序执行
+        self._callback_lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Watcher({self.name!r}, visible={self.visible})"
+
+
+class WatcherService:
+    """监视服务
+
+    用法:
+        service = WatcherService(game.capture_frame)
+        service.on_appear('templates/low_health.png', lambda event: heal(), region=(0, 0, 300, 80))
+        service.on_disappear('templates/boss.png', lambda event: print('boss 已消失'))
+        with service:
+            ...
+    """
+
+    def __init__(self, source: FrameSource, interval: float = 0.2, workers: int = 2,
+                 color_mode: str = 'bgr', template_cache: Optional[TemplateCache] = None,
+                 location_prior: Optional[LocationPrior] = None,
+                 scale_matcher: Optional[MultiScaleMatcher] = None):
+        """
+        Args:
+            source: 截图函数，返回 (BGR 图像, 图像左上角的屏幕坐标)
+            interval: 两次截图之间的间隔（秒）
+            workers: 执行回调的线程数
+            color_mode: 默认匹配颜色模式
+            template_cache: 模板缓存，默认使用共享缓存
+            location_prior: 位置先验，提供时优先在模板上次命中的位置附近搜索
+            scale_matcher: 多尺度匹配器，提供时按预测尺度匹配（不使用位置先验）
+        """
+        self.source = source
+        self.interval = interval
+        self.color_mode = color_mode
+        self.template_cache = template_cache or shared_template_cache
+        self.location_prior = location_prior
+        self.scale_matcher = scale_matcher
+        self.workers = workers
+        self.callback_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='watcher')
+        self.watchers: List[Watcher] = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.frames = 0
+        self.evaluations = 0
+        self.events = 0
+        self.errors = 0
+        self.capture_seconds = 0.0
+        self.match_seconds = 0.0
+
+    def add(self, watcher: Watcher) -> Watcher:
+        with self._lock:
+            self.watchers.append(watcher)
+        return watcher
+
+    def watch(self, template: str, **kwargs) -> Watcher:
+        """添加不带回调的订阅，只用于读取 visible / position 状态"""
+        return self.add(Watcher(template, **kwargs))
+
+    def on_appear(self, template: str, callback: Callable[[WatchEvent], None], **kwargs) -> Watcher:
+        """模板出现时调用 callback(event)，其余参数见 Watcher"""
+        return self.add(Watcher(template, on_appear=callback, **kwargs))
+
+    def on_disappear(self, template: str, callback: Callable[[WatchEvent], None], **kwargs) -> Watcher:
+        """模板消失时调用 callback(event)，其余参数见 Watcher"""
+        return self.add(Watcher(template, on_disappear=callback, **kwargs))
+
+    def remove(self, watcher: Watcher) -> None:
+        with self._lock:
+            if watcher in self.watchers:
+                self.watchers.remove(watcher)
+
+    def _match(self, views: FrameViews, watcher: Watcher,
+               offset: Position) -> Optional[Position]:
+        color_mode = resolve_color_mode(watcher.template, watcher.color_mode, self.color_mode)
+        frame = views.get(color_mode)
+        height, width = frame.shape[:2]
+        left = top = 0
+        if watcher.region is not None:
+            x, y, w, h = watcher.region
+            left, top = min(max(0, int(x)), width), min(max(0, int(y)), height)
+            right, bottom = max(left, min(width, int(x + w))), max(top, min(height, int(y + h)))
+            # 只取视图，不复制
+            frame = frame[top:bottom, left:right]
+        if self.scale_matcher is not None:
+            # 尺度按整帧尺寸预测，与同一窗口上的其他匹配共用记录
+            found = self.scale_matcher.match(frame, watcher.template, (width, height), watcher.threshold,
+                                             color_mode, frame_size=(width, height))
+        else:
+            template = self.template_cache.get(watcher.template, color_mode)
+            if template is None:
+                return None
+            if self.location_prior is not None:
+                # 识别区域内的坐标与整帧不同，使用不同的key
+                key = watcher.template if watcher.region is None else (watcher.template, tuple(watcher.region))
+                found = self.location_prior.match(frame, template, key, watcher.threshold)
+            else:
+                found = match_template(frame, template, watcher.threshold)
+        if found is None:
+            return None
+        fx, fy, fw, fh = found
+        return (offset[0] + left + fx + fw // 2, offset[1] + top + fy + fh // 2)
+
+    def evaluate(self, frame: np.ndarray, offset: Position = (0, 0)) -> List[WatchEvent]:
+        """在一帧上评估全部启用的订阅并分发回调
+        可在已经截好图的循环中直接调用，无需启动后台线程
+        Returns:
+            本帧产生的事件
+        """
+        with self._lock:
+            watchers = [watcher for watcher in self.watchers if watcher.active]
+        if not watchers:
+            return []
+        start = time.perf_counter()
+        views = FrameViews(frame)
+        if len(watchers) == 1:
+            positions = [self._match(views, watchers[0], offset)]
+        else:
+            executor = get_match_executor()
+            futures = [executor.submit(self._match, views, watcher, offset) for watcher in watchers]
+            positions = [future.result() for future in futures]
+        self.match_seconds += time.perf_counter() - start
+        self.evaluations += 1
+
+        now = time.monotonic()
+        events = []
+        for watcher, position in zip(watchers, positions):
+            visible = position is not None
+            was_visible = watcher.visible
+            watcher.visible, watcher.position, watcher.updated = visible, position, now
+            if visible and (not was_visible or
+                            (watcher.repeat is not None and now - watcher._last_fired >= watcher.repeat)):
+                if watcher.on_appear is not None:
+                    events.append(WatchEvent(watcher, APPEAR, position, now))
+                watcher._last_fired = now
+            elif not visible and was_visible:
+                if watcher.on_disappear is not None:
+                    events.append(WatchEvent(watcher, DISAPPEAR, None, now))
+        for event in events:
+            event.watcher.events += 1
+            self.events += 1
+            self.callback_executor.submit(self._dispatch, event)
+        return events
+
+    def _dispatch(self, event: WatchEvent) -> None:
+        watcher = event.watcher
+        callback = watcher.on_appear if event.kind == APPEAR else watcher.on_disappear
+        with watcher._callback_lock:
+            try:
+                callback(event)
+            except Exception as e:
+                self.errors += 1
+                print(f"监视回调 {watcher.name} ({event.kind}) 出错: {e}")
+
+    def poll(self) -> List[WatchEvent]:
+        """截图一次并评估"""
+        start = time.perf_counter()
+        frame, offset = self.source()
+        self.capture_seconds += time.perf_counter() - start
+        if frame is None:
+            return []
+        self.frames += 1
+        return self.evaluate(frame, offset)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'WatcherService':
+        """启动后台截图循环"""
+        if not self.running:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='watcher-loop', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """停止截图循环，等待已分发的回调执行完毕"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.callback_executor.shutdown(wait=True)
+        # 允许再次启动
+        self.callback_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='watcher')
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.poll()
+            except Exception as e:
+                self.errors += 1
+                print(f"监视截图或匹配出错: {e}")
+            self._stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stats(self) -> Dict[str, float]:
+        """获取截图帧数、评估次数、事件数和平均截图/匹配耗时"""
+        return {
+            'frames': self.frames,
+            'evaluations': self.evaluations,
+            'events': self.events,
+            'errors': self.errors,
+            'watchers': len(self.watchers),
+            'avg_capture_seconds': self.capture_seconds / self.frames if self.frames else 0.0,
+            'avg_match_seconds': self.match_seconds / self.evaluations if self.evaluations else 0.0,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()